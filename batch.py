@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+#
+# dissect many files in parallel, each file's intervals go to its own output file
+#
+# usage: batch.py [options] <file|directory|glob> ...
+#
+#   --workers N       worker processes, default one per cpu
+#   --chunksize N     files handed to a worker at a time, default picked from the corpus size
+#   --format F        text (the raw.py protocol), json or binary (IntervalTable .npz), default text
+#   --output DIR      outputs go to DIR/<input path>.<format>, default ./batch_out
+#   --dissector NAME  use finter.NAME for every file instead of identifying each one
+#   --no-cache        don't use the interval cache
+#
+# eg: ./batch.py --workers 64 --format json ~/corpus '/mnt/dumps/*.bin'
+#
+# workers dissect in their own processes even when daemon.py is running, it
+# would serve them all from one process (threads, one core at a time)
+
+import os
+import sys
+import glob
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import client
+from helpers import dissect_file, pop_option, pop_flag
+
+FORMATS = {'text': '.txt', 'json': '.json', 'binary': '.npz'}
+
+# expand files, directories (recursively) and globs to a list of files
+def collect_inputs(args):
+    result = []
+    for arg in args:
+        if os.path.isdir(arg):
+            for (root, dirs, files) in os.walk(arg):
+                dirs.sort()
+                result.extend(os.path.join(root, f) for f in sorted(files))
+        elif os.path.isfile(arg):
+            result.append(arg)
+        else:
+            matches = sorted(glob.glob(arg, recursive=True))
+            if not matches:
+                print(f'WARNING: nothing matches {arg}', file=sys.stderr)
+            result.extend(collect_inputs(matches))
+    return result
+
+# outputs mirror the input's absolute path under out_dir so names can't collide
+def output_path(out_dir, fpath, fmt):
+    relative = os.path.abspath(fpath).lstrip(os.sep)
+    return os.path.join(out_dir, relative) + FORMATS[fmt]
+
+def write_output(table, path, fmt):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if fmt == 'text':
+        with open(path, 'w') as fp:
+            fp.writelines('[0x%X,0x%X) %s %s\n' % r for r in table.records())
+    elif fmt == 'json':
+        with open(path, 'w') as fp:
+            json.dump([{'begin': b, 'end': e, 'type': t, 'comment': c} for (b, e, t, c) in table.records()], fp)
+    else:
+        table.save(path)
+
+# runs in a worker process, returns (fpath, status, num_intervals, seconds, error) for each file
+def dissect_chunk(fpaths, dissector, fmt, out_dir, cache):
+    results = []
+
+    # see the top, set here since workers needn't be forks of this process
+    client.enabled = False
+
+    for fpath in fpaths:
+        (status, count, error) = ('ok', 0, '')
+        t0 = time.perf_counter()
+
+        try:
+            table = dissect_file(fpath, 0, dissector, as_table=True, cache=cache)
+            if table is None:
+                status = 'unknown'
+            else:
+                write_output(table, output_path(out_dir, fpath, fmt), fmt)
+                count = len(table)
+        except Exception as e:
+            (status, error) = ('failed', f'{type(e).__name__}: {e}')
+
+        results.append((fpath, status, count, time.perf_counter() - t0, error))
+
+    return results
+
+def summarize(results, wall):
+    by_status = {}
+    for r in results:
+        by_status.setdefault(r[1], []).append(r)
+
+    busy = sum(r[3] for r in results)
+
+    print('', file=sys.stderr)
+    print(f'{len(results)} files in {wall:.2f}s ({len(results)/wall:.1f} files/s, {busy:.2f}s of dissection)', file=sys.stderr)
+    for status in ['ok', 'unknown', 'failed']:
+        print(f'{status:>8}: {len(by_status.get(status, []))}', file=sys.stderr)
+
+    slowest = sorted(results, key=lambda r: r[3], reverse=True)[:10]
+    if slowest:
+        print('slowest:', file=sys.stderr)
+        for (fpath, status, count, seconds, error) in slowest:
+            print(f'    {seconds:8.3f}s {count:10d} {fpath}', file=sys.stderr)
+
+    if failed := by_status.get('failed'):
+        print('failures:', file=sys.stderr)
+        for (fpath, status, count, seconds, error) in failed:
+            print(f'    {fpath}: {error}', file=sys.stderr)
+
+if __name__ == '__main__':
+    workers = pop_option('workers', int, os.cpu_count())
+    chunksize = pop_option('chunksize', int)
+    fmt = pop_option('format', str, 'text')
+    out_dir = pop_option('output', str, 'batch_out')
+    dissector = pop_option('dissector', str, '')
+    cache = not pop_flag('no-cache')
+
+    if not fmt in FORMATS:
+        print(f'ERROR: --format must be one of {", ".join(FORMATS)}')
+        sys.exit(-1)
+
+    fpaths = collect_inputs(sys.argv[1:])
+    if not fpaths:
+        print('usage: %s [options] <file|directory|glob> ...' % sys.argv[0])
+        sys.exit(-1)
+
+    # several chunks per worker keeps them all busy when file sizes vary
+    if not chunksize:
+        chunksize = max(1, min(64, len(fpaths) // (workers * 8)))
+    chunks = [fpaths[i:i+chunksize] for i in range(0, len(fpaths), chunksize)]
+
+    results = []
+    t0 = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(dissect_chunk, chunk, dissector, fmt, out_dir, cache) for chunk in chunks]
+
+        # report files as their chunks finish
+        for future in as_completed(futures):
+            for result in future.result():
+                (fpath, status, count, seconds, error) = result
+                print(f'{status:>8} {seconds:8.3f}s {count:10d} {fpath}', flush=True)
+                results.append(result)
+
+    summarize(results, time.perf_counter() - t0)
+    sys.exit(1 if any(r[1] == 'failed' for r in results) else 0)
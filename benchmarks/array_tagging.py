@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+#
+# compare record-at-a-time tagging against tagArray() on ELF symbol and
+# relocation tables, sized like a stripped libc (.dynsym ~40k entries)
+
+import io
+import os
+import sys
+import time
+import struct
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from finter import elf64
+from finter.elf import StringTable, E_MACHINE, SIZEOF_ELF64_SYM
+from finter.helpers import *
+
+# the record-at-a-time versions, as they were before tagArray()
+def old_tag_elf64_sym(fp, index, strTab):
+    base = fp.tell()
+    st_name = uint32(fp, 1)
+    nameStr = strTab[st_name]
+    tagUint32(fp, "st_name", '"%s"' % nameStr)
+    st_info = uint8(fp, 1)
+    tagUint8(fp, "st_info", 'bind:%d(%s) type:%d(%s)' % \
+        (st_info>>4, elf64.symbol_binding_tostr(st_info>>4), st_info&0xF, elf64.symbol_type_tostr(st_info&0xF)))
+    tagUint8(fp, "st_other")
+    tagUint16(fp, "st_shndx")
+    tagUint64(fp, "st_value")
+    tagUint64(fp, "st_size")
+    emit(base, fp.tell(), 'raw', "Elf64_Sym[%d] \"%s\"" % (index, nameStr))
+
+def old_tag_elf64_rela(fp, machine):
+    emit(fp.tell(), fp.tell()+24, 'raw', 'Elf64_Rela')
+    tagUint64(fp, 'r_offset')
+    r_info = uint64(fp, True)
+    r_sym = elf64.ELF64_R_SYM(r_info)
+    r_type = elf64.ELF64_R_TYPE(r_info)
+    r_type_str = ' (' + elf64.RELOC_TYPE_X86_64(r_type).name + ')'
+    tagUint64(fp, 'r_info', f'sym=0x{r_sym:X} type=0x{r_type:X}{r_type_str}')
+    tagInt64(fp, 'r_addend')
+
+def synth_symbols(n):
+    names = b''.join(b'symbol_%d\x00' % i for i in range(n))
+    offsets = [0]
+    for i in range(n-1):
+        offsets.append(offsets[-1] + len(b'symbol_%d\x00' % i))
+    syms = b''.join(struct.pack('<IBBHQQ', offsets[i], 0x12, 0, 13, 0x1000+16*i, 16) for i in range(n))
+    return (syms, names)
+
+def synth_relocs(n):
+    return b''.join(struct.pack('<QQq', 0x4000+8*i, (i << 32) | 7, 0) for i in range(n))
+
+def measure(data, func):
+    records = ListSink()
+    old = setSink(records)
+    try:
+        with tempfile.NamedTemporaryFile() as tmp:
+            tmp.write(data)
+            tmp.flush()
+            with open(tmp.name, 'rb') as fp:
+                fp = reader(fp)
+                t0 = time.perf_counter()
+                func(fp)
+                t = time.perf_counter() - t0
+                assert fp.tell() == len(data)
+        return (t, records.records)
+    finally:
+        setSink(old)
+
+def old_syms(fp, n, strTab):
+    for i in range(n):
+        old_tag_elf64_sym(fp, i, strTab)
+
+def old_relas(fp, n):
+    for i in range(n):
+        old_tag_elf64_rela(fp, E_MACHINE.EM_X86_64.value)
+
+if __name__ == '__main__':
+    n = 40000
+    if sys.argv[1:]:
+        n = int(sys.argv[1])
+
+    setLittleEndian()
+
+    (syms, names) = synth_symbols(n)
+    strTab = StringTable(io.BytesIO(names), len(names))
+    relocs = synth_relocs(n)
+
+    cases = [
+        ('Elf64_Sym', syms,
+            lambda fp: old_syms(fp, n, strTab),
+            lambda fp: elf64.tag_elf64_syms(fp, n, strTab)),
+        ('Elf64_Rela', relocs,
+            lambda fp: old_relas(fp, n),
+            lambda fp: elf64.tag_elf64_rela(fp, n, E_MACHINE.EM_X86_64.value))
+    ]
+
+    print('%-12s %8s %10s %10s %8s' % ('table', 'n', 'old (s)', 'new (s)', 'speedup'))
+    for (name, data, old_func, new_func) in cases:
+        (t_old, old_records) = measure(data, old_func)
+        (t_new, new_records) = measure(data, new_func)
+        assert sorted(old_records) == sorted(new_records), 'intervals differ'
+        print('%-12s %8d %10.3f %10.3f %7.1fx' % (name, n, t_old, t_new, t_old/t_new))
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+#
+# wall time of fresh `raw.py` processes on a tiny file, ie. interpreter
+# startup plus imports plus identification plus dissection
+#
+# usage: cold_start.py <file> [runs]
+
+import os
+import sys
+import time
+import statistics
+import subprocess
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.join(here, '..')
+
+def run_once(fpath):
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(root, 'raw.py'), fpath], stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - t0
+
+# run raw.py in a process that reports which finter modules got imported
+def imported_finter_modules(fpath):
+    script = f"""
+import sys, runpy
+sys.argv = [{os.path.join(root, 'raw.py')!r}, {fpath!r}]
+sys.path.insert(0, {root!r})
+runpy.run_path(sys.argv[0], run_name='__main__')
+print(' '.join(sorted(m for m in sys.modules if m.startswith('finter.'))), file=sys.stderr)
+"""
+    stderr = subprocess.run([sys.executable, '-c', script], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True).stderr
+    return stderr.split()
+
+if __name__ == '__main__':
+    if not sys.argv[1:]:
+        print('usage: %s <file> [runs]' % sys.argv[0])
+        sys.exit(-1)
+
+    fpath = sys.argv[1]
+    runs = int(sys.argv[2]) if sys.argv[2:] else 20
+
+    run_once(fpath) # warm the OS file cache, not Python's
+    times = [run_once(fpath) for i in range(runs)]
+
+    modules = imported_finter_modules(fpath)
+    print(f'raw.py {os.path.basename(fpath)}: median {statistics.median(times)*1000:.1f}ms, min {min(times)*1000:.1f}ms over {runs} runs')
+    print(f'{len(modules)} finter modules imported: {" ".join(modules)}')
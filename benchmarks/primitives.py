@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+#
+# time the tagging primitives in isolation on synthetic buffers
+#
+# usage: primitives.py [--json PATH] [--compare OLD.json] [--min-time SECONDS] [filter]
+#
+# reports operations per second and, per operation, the peak bytes allocated
+# during it (tracemalloc) and the memory blocks still allocated afterwards;
+# CPython has no counter of allocations made and freed, so those two stand in
+#
+# primitives that read run against both readers: "mmap" (MmapReader, what
+# dissect_file() uses on regular files) and "stream" (Reader over BytesIO)
+#
+# --json writes the results with the python version and git revision so runs
+# from different versions can be compared with --compare
+
+import io
+import os
+import sys
+import gc
+import json
+import time
+import random
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from helpers import pop_option
+from finter.helpers import *
+from finter.elf import StringTable, E_MACHINE
+from finter.pe import COMIMAGE_FLAGS
+from finter.networking import ETHER_TYPE
+
+# intervals are discarded, so only the primitive is measured
+class NullSink():
+    def interval(self, begin, end, type_, comment):
+        pass
+
+    def intervals(self, records):
+        pass
+
+    def note(self, text):
+        pass
+
+#------------------------------------------------------------------------------
+# synthetic buffers
+#------------------------------------------------------------------------------
+
+SIZE = 1 << 20
+
+def random_bytes():
+    rng = random.Random(0)
+    return bytes(rng.getrandbits(8) for i in range(SIZE))
+
+def leb128_bytes():
+    return b'\xe5\x8e\x26' * (SIZE // 3)
+
+def c_strings():
+    return b'some_symbol_name\x00' * (SIZE // 17)
+
+def lines():
+    return b'[0x16F,0x171) >H HeaderChecksum=0xE949\n' * (SIZE // 40)
+
+tmpfiles = []
+
+def mmap_reader(data):
+    tmp = tempfile.NamedTemporaryFile()
+    tmp.write(data)
+    tmp.flush()
+    tmpfiles.append(tmp)
+    return reader(open(tmp.name, 'rb'))
+
+def stream_reader(data):
+    return Reader(io.BytesIO(data))
+
+#------------------------------------------------------------------------------
+# cases, each a function(n) doing n operations
+#------------------------------------------------------------------------------
+
+# op(fp) consumes <stride> bytes, rewind when the buffer runs out
+def reading(fp, op, stride):
+    per_pass = SIZE // stride - 1
+    def run(n):
+        while n > 0:
+            fp.seek(0)
+            k = min(n, per_pass)
+            for i in range(k):
+                op(fp)
+            n -= k
+    return run
+
+def reader_cases():
+    result = []
+    buffers = {'random': random_bytes(), 'leb128': leb128_bytes(), 'strings': c_strings(), 'lines': lines()}
+
+    for (kind, make) in [('mmap', mmap_reader), ('stream', stream_reader)]:
+        fps = {name: make(data) for (name, data) in buffers.items()}
+        result += [
+            (f'tagUint8/{kind}', reading(fps['random'], lambda fp: tagUint8(fp, 'field'), 1)),
+            (f'tagUint16/{kind}', reading(fps['random'], lambda fp: tagUint16(fp, 'field'), 2)),
+            (f'tagUint32/{kind}', reading(fps['random'], lambda fp: tagUint32(fp, 'field'), 4)),
+            (f'tagUint64/{kind}', reading(fps['random'], lambda fp: tagUint64(fp, 'field'), 8)),
+            (f'tag/{kind}', reading(fps['random'], lambda fp: tag(fp, 16, 'blob'), 16)),
+            (f'uleb128/{kind}', reading(fps['leb128'], lambda fp: uleb128(fp), 3)),
+            (f'string_null/{kind}', reading(fps['strings'], lambda fp: string_null(fp), 17)),
+            (f'dataUntil/{kind}', reading(fps['lines'], lambda fp: dataUntil(fp, b'\n'), 40)),
+        ]
+
+    return result
+
+def other_cases():
+    data = random_bytes()[0:64]
+    def bitstream(n):
+        for i in range(0, n, 32):
+            bs = BitStream(data)
+            for j in range(min(32, n-i)):
+                bs.stream(16)
+
+    pairs = data[0:2]
+    def bitsplit_(n):
+        for i in range(n):
+            bitsplit(pairs, 1, 3, 4, 8)
+
+    names = b'\x00' + b''.join(b'symbol_%d\x00' % i for i in range(4096))
+    strtab = StringTable(io.BytesIO(names), len(names))
+    offsets = [0]
+    for i in range(4095):
+        offsets.append(names.index(b'\x00', offsets[-1]+1) + 1)
+    def stringtable(n):
+        for i in range(n):
+            strtab[offsets[i & 4095]]
+
+    values = [E_MACHINE.EM_X86_64.value, E_MACHINE.EM_AARCH64.value, 0xFFFF]
+    def enum_name(n):
+        for i in range(n):
+            enum_int_to_name(E_MACHINE, values[i % 3])
+
+    ether = [0x800, 0x86DD, 0x1234]
+    def enum_name_small(n):
+        for i in range(n):
+            enum_int_to_name(ETHER_TYPE, ether[i % 3])
+
+    def flags(n):
+        for i in range(n):
+            flags_string(COMIMAGE_FLAGS, i & 0x1F)
+
+    return [
+        ('BitStream.stream', bitstream),
+        ('bitsplit', bitsplit_),
+        ('StringTable.__getitem__', stringtable),
+        ('enum_int_to_name/E_MACHINE', enum_name),
+        ('enum_int_to_name/ETHER_TYPE', enum_name_small),
+        ('flags_string', flags),
+    ]
+
+#------------------------------------------------------------------------------
+# measurement
+#------------------------------------------------------------------------------
+
+# ops/sec: grow n until a run takes min_time, then the best of 3 runs of that n
+def ops_per_sec(run, min_time):
+    n = 16
+    while True:
+        t0 = time.perf_counter()
+        run(n)
+        t = time.perf_counter() - t0
+        if t >= min_time:
+            break
+        n *= 16 if t == 0 else max(2, min(16, int(min_time / t * 1.2)))
+
+    best = t
+    for i in range(2):
+        t0 = time.perf_counter()
+        run(n)
+        best = min(best, time.perf_counter() - t0)
+    return n / best
+
+# mean peak bytes allocated during one op, and blocks still allocated per op over <n> ops
+def allocations(run, n=4096):
+    run(n) # warm up caches (struct formats, enum lookups) first
+
+    peaks = 0
+    tracemalloc.start()
+    for i in range(256):
+        tracemalloc.reset_peak()
+        (before, _) = tracemalloc.get_traced_memory()
+        run(1)
+        (_, peak) = tracemalloc.get_traced_memory()
+        peaks += peak - before
+    tracemalloc.stop()
+
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    run(n)
+    gc.collect()
+    retained = sys.getallocatedblocks() - blocks
+
+    return (peaks / 256, max(retained, 0) / n)
+
+def git_revision():
+    try:
+        here = os.path.dirname(os.path.abspath(__file__))
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=here,
+            capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+if __name__ == '__main__':
+    json_path = pop_option('json')
+    compare_path = pop_option('compare')
+    min_time = pop_option('min-time', float, 0.2)
+    args = sys.argv[1:]
+    if len(args) > 1 or any(arg.startswith('-') for arg in args):
+        print('usage: %s [--json PATH] [--compare OLD.json] [--min-time SECONDS] [filter]' % sys.argv[0])
+        sys.exit(-1)
+    pattern = args[0] if args else ''
+
+    setSink(NullSink())
+    setLittleEndian()
+
+    old = {}
+    if compare_path:
+        with open(compare_path) as fp:
+            old = {r['name']: r for r in json.load(fp)['results']}
+
+    results = []
+    print('%-30s %14s %14s %14s%s' % ('primitive', 'ops/sec', 'peak B/op', 'kept blk/op', '  vs old' if old else ''))
+    for (name, run) in reader_cases() + other_cases():
+        if not pattern in name:
+            continue
+        rate = ops_per_sec(run, min_time)
+        (peak, retained) = allocations(run)
+        results.append({'name': name, 'ops_per_sec': rate, 'peak_bytes_per_op': peak, 'retained_blocks_per_op': retained})
+
+        versus = ''
+        if name in old:
+            versus = '  %5.2fx' % (rate / old[name]['ops_per_sec'])
+        print('%-30s %14.0f %14.2f %14.4f%s' % (name, rate, peak, retained, versus))
+
+    if json_path:
+        with open(json_path, 'w') as fp:
+            json.dump({'python': platform.python_version(), 'implementation': platform.python_implementation(),
+                'machine': platform.machine(), 'revision': git_revision(), 'time': time.time(),
+                'min_time': min_time, 'results': results}, fp, indent=2)
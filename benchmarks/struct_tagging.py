@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+#
+# compare field-at-a-time tagging against tagStruct() on ELF and PE headers
+#
+# elf64_shdr: the section header table of a file with many sections
+# image_dos_header: the 64 byte MZ header, repeated
+
+import os
+import sys
+import time
+import struct
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from finter import elf64, pe
+from finter.helpers import *
+
+# the field-at-a-time versions, as they were before tagStruct()
+def old_tag_elf64_shdr(fp, index, scnStrTab):
+    base = fp.tell()
+
+    sh_name = tagUint32(fp, "sh_name")
+    sh_type = uint32(fp, 1)
+    tagUint32(fp, "sh_type", '(%s)' % elf64.sh_type_tostr(sh_type))
+    sh_flags = uint64(fp, 1)
+    tagUint64(fp, "sh_flags", '(%s)' % elf64.sh_flags_tostr(sh_flags))
+    sh_addr = tagUint64(fp, "sh_addr")
+    sh_offset = tagUint64(fp, "sh_offset")
+    sh_size = tagUint64(fp, "sh_size")
+    sh_link = tagUint32(fp, "sh_link")
+    sh_info = tagUint32(fp, "sh_info")
+    sh_addralign = tagUint64(fp, "sh_addralign")
+    sh_entsize = tagUint64(fp, "sh_entsize")
+
+    emit(base, fp.tell(), 'raw', 'elf64_shdr "%s" %s (index: %d)' % \
+        (scnStrTab[sh_name], elf64.sh_type_tostr(sh_type), index))
+
+def old_tag_image_dos_header(fp):
+    oHdr = fp.tell()
+    e_magic = tag(fp, 2, "e_magic")
+    for name in ['e_cblp', 'e_cp', 'e_crlc', 'e_cparhdr', 'e_minalloc',
+      'e_maxalloc', 'e_ss', 'e_sp', 'e_csum', 'e_eip', 'e_cs', 'e_lfarlc', 'e_ovno']:
+        tagUint16(fp, name)
+    tag(fp, 8, "e_res")
+    tagUint16(fp, "e_oemid")
+    tagUint16(fp, "e_oeminfo")
+    tag(fp, 20, "e_res2")
+    tagUint32(fp, "e_lfanew")
+    emit(oHdr, fp.tell(), 'raw', "image_dos_header")
+
+def synth_shdrs(n):
+    data = b''
+    for i in range(n):
+        data += struct.pack('<IIQQQQIIQQ', 0, 1, 2, 0x1000*i, 0x1000*i, 0x1000, 0, 0, 16, 0)
+    return data
+
+def synth_dos_headers(n):
+    return (b'MZ' + b'\x90\x00'*13 + b'\x00'*8 + b'\x00'*4 + b'\x00'*20 + struct.pack('<I', 0x80)) * n
+
+def measure(path, n, size, func):
+    records = ListSink()
+    old = setSink(records)
+    try:
+        with open(path, 'rb') as fp:
+            fp = reader(fp)
+            t0 = time.perf_counter()
+            for i in range(n):
+                func(fp, i)
+            t = time.perf_counter() - t0
+            assert fp.tell() == n*size
+        return (t, records.records)
+    finally:
+        setSink(old)
+
+if __name__ == '__main__':
+    n = 20000
+    if sys.argv[1:]:
+        n = int(sys.argv[1])
+
+    strtab = {0: ''}
+    cases = [
+        ('elf64_shdr', synth_shdrs, 0x40,
+            lambda fp, i: old_tag_elf64_shdr(fp, i, strtab),
+            lambda fp, i: elf64.tag_elf64_shdr(fp, i, strtab)),
+        ('image_dos_header', synth_dos_headers, 0x40,
+            lambda fp, i: old_tag_image_dos_header(fp),
+            lambda fp, i: pe.tag_image_dos_header(fp))
+    ]
+
+    print('%-18s %8s %10s %10s %8s' % ('header', 'n', 'old (s)', 'new (s)', 'speedup'))
+    for (name, synth, size, old_func, new_func) in cases:
+        with tempfile.NamedTemporaryFile() as tmp:
+            tmp.write(synth(n))
+            tmp.flush()
+
+            setLittleEndian()
+            (t_old, old_records) = measure(tmp.name, n, size, old_func)
+            (t_new, new_records) = measure(tmp.name, n, size, new_func)
+            assert sorted(old_records) == sorted(new_records), 'intervals differ'
+
+            print('%-18s %8d %10.3f %10.3f %7.1fx' % (name, n, t_old, t_new, t_old/t_new))
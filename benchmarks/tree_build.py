@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+#
+# compare intervals_to_tree() against the old algorithm.build() nesting on
+# synthetic interval sets
+#
+# flat: a file full of equally sized records, like a symbol table
+# deep: records nested several levels, like pcap record/header/field
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import algorithm
+from helpers import Interval, FinterNode, intervals_to_tree, intervals_to_tree_worker, finalize_tree
+
+# n 24-byte records with 3 fields each, children emitted before their parent
+def synth_flat(n):
+    result = []
+    for i in range(n):
+        base = 24*i
+        result.append(Interval(base, base+8, '<Q', f'a={i}'))
+        result.append(Interval(base+8, base+16, '<Q', f'b={i}'))
+        result.append(Interval(base+16, base+24, '<Q', f'c={i}'))
+        result.append(Interval(base, base+24, 'raw', f'record[{i}]'))
+    result.append(Interval(0, 24*n, 'raw', 'file'))
+    return result
+
+# n records, each a chain of <depth> nested intervals plus a leaf on each level
+def synth_deep(n, depth=16):
+    result = []
+    width = 2*depth
+    for i in range(n):
+        base = width*i
+        for d in range(depth):
+            result.append(Interval(base+d, base+width-d, 'raw', f'level{d}'))
+        result.append(Interval(base+depth-1, base+depth, 'raw', 'leaf'))
+    result.append(Interval(0, width*n, 'raw', 'file'))
+    return result
+
+def old_intervals_to_tree(intervals, NodeClass=FinterNode):
+    def relation(x, y):
+        return x.begin <= y.begin and x.end >= y.end
+
+    atree = algorithm.build(intervals, relation)
+    assert len(atree.children) == 1
+    root = intervals_to_tree_worker(atree.children[0], NodeClass)
+    finalize_tree(root, NodeClass)
+    return root
+
+def measure(func, intervals):
+    t0 = time.perf_counter()
+    root = func(intervals)
+    return time.perf_counter() - t0, root
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(10000)
+
+    # the old builder is quadratic, don't let it run for minutes
+    old_limit = 20000
+    if sys.argv[1:]:
+        old_limit = int(sys.argv[1])
+
+    print('%-6s %8s %10s %10s %8s' % ('shape', 'n', 'old (s)', 'new (s)', 'speedup'))
+    for (shape, synth) in [('flat', synth_flat), ('deep', synth_deep)]:
+        for n in [250, 1000, 4000, 16000]:
+            intervals = synth(n)
+            t_new, new_root = measure(intervals_to_tree, intervals)
+
+            if len(intervals) > old_limit:
+                print('%-6s %8d %10s %10.3f %8s' % (shape, len(intervals), '-', t_new, '-'))
+                continue
+
+            t_old, old_root = measure(old_intervals_to_tree, intervals)
+            assert str(old_root) == str(new_root), 'trees differ'
+            print('%-6s %8d %10.3f %10.3f %7.1fx' % (shape, len(intervals), t_old, t_new, t_old/t_new))
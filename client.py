@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+#
+# talking to daemon.py, kept free of heavy imports so the tools can hand their
+# whole run to the daemon before importing anything else
+#
+# - FINTER_SOCKET picks the socket, default $XDG_RUNTIME_DIR/finter.sock, else
+#   finter.sock in a private (0700) directory /tmp/finter-<uid>
+# - FINTER_NO_DAEMON=1 turns it off, and anything the daemon can't answer
+#   happens in this process as usual
+#
+# nothing is sent to a socket unless the process on the other end is this
+# user's, see send()
+
+import os
+import sys
+
+# False in the daemon itself, and while profiling (it measures this process)
+enabled = os.environ.get('FINTER_NO_DAEMON', '') in ('', '0')
+
+# True in the processes the daemon runs tools in
+inside_daemon = False
+
+# environment variables a run needs (the ones finter reads), nothing else is sent
+FORWARDED_ENV = ('HOME', 'XDG_CACHE_HOME')
+
+def is_forwarded(name):
+    return name.startswith('FINTER_') or name in FORWARDED_ENV
+
+def forwarded_environment(env):
+    return {k: v for (k, v) in env.items() if is_forwarded(k)}
+
+def socket_path():
+    if path := os.environ.get('FINTER_SOCKET'):
+        return path
+    if runtime := os.environ.get('XDG_RUNTIME_DIR'):
+        return os.path.join(runtime, 'finter.sock')
+    return os.path.join(private_dir(), 'finter.sock')
+
+# directory for the socket when there's no $XDG_RUNTIME_DIR, /tmp being
+# writable by everyone
+def private_dir():
+    return os.path.join(os.environ.get('TMPDIR', '/tmp'), f'finter-{os.getuid()}')
+
+# whether <path> is a directory only this user can get into (not a symlink)
+def is_private_dir(path):
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return os.path.isdir(path) and not os.path.islink(path) and st.st_uid == os.getuid() and not st.st_mode & 0o077
+
+# uid of the process on the other end of unix socket <s>, None where the
+# platform can't say
+def peer_uid(s):
+    import socket
+    import struct
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    (pid, uid, gid) = struct.unpack('3i', s.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')))
+    return uid
+
+# connect and send <request>, return (socket, file reading it, reply) or None
+def send(request):
+    path = socket_path()
+    if not enabled or not os.path.exists(path):
+        return None
+
+    # someone else's socket (or a directory someone else could have put it in) isn't the daemon
+    directory = os.path.dirname(os.path.abspath(path))
+    if directory == os.path.abspath(private_dir()) and not is_private_dir(directory):
+        return None
+    try:
+        if os.stat(path).st_uid != os.getuid():
+            return None
+    except OSError:
+        return None
+
+    # only paid for when there is a daemon
+    import json
+    import socket
+
+    try:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.connect(path)
+        if peer_uid(s) not in (None, os.getuid()):
+            s.close()
+            return None
+        s.sendall(json.dumps(request).encode() + b'\n')
+        fp = s.makefile('rb')
+        reply = json.loads(fp.readline())
+    except (OSError, ValueError):
+        # not listening (a stale socket), or it went away mid reply
+        return None
+
+    if reply.get('status') == 'stale':
+        print('WARNING: finter changed since the daemon started, restart daemon.py', file=sys.stderr)
+    if reply.get('status') != 'ok':
+        s.close()
+        return None
+    return (s, fp, reply)
+
+# the daemon's dissection of a file, as bytes in <format_> "table" (IntervalTable
+# .npz), "text" (raw.py output) or "binary" (raw.py --binary output), else None
+def dissect(fpath, initial_offset=0, dissector_name='', window=None, cache=True, format_='table'):
+    request = {'command': 'dissect', 'path': os.path.abspath(fpath), 'offset': initial_offset,
+        'dissector': dissector_name or '', 'window': window, 'cache': cache, 'format': format_}
+    if not (answer := send(request)):
+        return None
+
+    (s, fp, reply) = answer
+    with s, fp:
+        try:
+            body = fp.read()
+        except OSError:
+            return None
+    return body if len(body) == reply['size'] else None
+
+# have the daemon run this script with this process's arguments, directory,
+# finter's environment variables, stdin, stdout and stderr, then exit with its
+# exit code; returns if there's no daemon to do it
+def run_remotely():
+    if inside_daemon:
+        return
+
+    request = {'command': 'run', 'script': os.path.abspath(sys.argv[0]), 'argv': sys.argv,
+        'cwd': os.getcwd(), 'env': forwarded_environment(os.environ)}
+    if not (answer := send(request)):
+        return
+
+    import json
+    import socket
+    import signal
+
+    (s, fp, reply) = answer
+    try:
+        socket.send_fds(s, [b'\x00'], [0, 1, 2])
+    except OSError:
+        # eg: a closed stdin, run here instead
+        s.close()
+        return
+
+    # from here on the run is the daemon's, Ctrl-C goes to it
+    while True:
+        try:
+            line = fp.readline()
+            break
+        except KeyboardInterrupt:
+            os.kill(reply['pid'], signal.SIGINT)
+
+    sys.exit(json.loads(line)['exit'] if line else 1)
@@ -0,0 +1,405 @@
+#!/usr/bin/env python
+#
+# keep finter loaded and recent dissections in memory, serving tree.py, oha.py,
+# raw.py and helpers.dissect_file() over a unix domain socket
+#
+# usage: daemon.py [--socket PATH] [--memory BYTES]
+#
+#   --socket PATH     default $FINTER_SOCKET, else $XDG_RUNTIME_DIR/finter.sock, else
+#                     /tmp/finter-<uid>/finter.sock (a directory only this user can enter)
+#   --memory BYTES    bound on the dissections kept in memory, default 1GiB
+#
+# eg: ./daemon.py &
+#     ./tree.py file.bin    # runs in the daemon, see client.py
+#
+# a client sends one JSON line and gets one back, {"status": "ok", ...} or a
+# status of "unknown" (no dissector), "error" or "stale" (finter changed since
+# the daemon started, restart it), then:
+#
+#   {"command": "dissect", "path": "/abs/file.bin", "offset": 0, "dissector": "",
+#    "window": null, "cache": true, "format": "table"}
+#
+#       the reply has "size": <n> and is followed by the n byte dissection,
+#       an IntervalTable .npz ("table"), raw.py output ("text") or raw.py
+#       --binary output ("binary"); recent ones are kept keyed by
+#       (path, mtime, size, offset, dissector, window, format)
+#
+#   {"command": "run", "script": "/abs/tree.py", "argv": [...], "cwd": ..., "env": {...}}
+#
+#       "env" is the client's FINTER_* variables, HOME and XDG_CACHE_HOME (see
+#       client.forwarded_environment()), the rest of the environment is the daemon's
+#
+#       the reply has the "pid" running it, the client then sends its stdin,
+#       stdout and stderr (SCM_RIGHTS) and gets {"exit": <code>} at the end;
+#       the script must be one of RUNNABLE, next to daemon.py
+#
+# dissect requests are served by threads (see the Context in finter/helpers.py),
+# runs by processes forked from a copy of the daemon made before any threads
+# started, so they start with everything imported
+#
+# only processes of the user running the daemon are served
+
+import io
+import os
+import sys
+import json
+import time
+import types
+import atexit
+import socket
+import signal
+import threading
+import traceback
+import collections
+import socketserver
+
+import client
+import finter
+import helpers
+from helpers import dissect_file, resolve_analyze, BinarySink, pop_option
+from finter import registry
+from finter.helpers import Context, TextSink, use_context, reader
+
+# least recently used dissections go first once they total more than <limit> bytes
+class ResultCache():
+    def __init__(self, limit):
+        self.limit = limit
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            if len(body) > self.limit:
+                return
+            self.entries[key] = body
+            self.size += len(body)
+            while self.size > self.limit:
+                (_, old) = self.entries.popitem(last=False)
+                self.size -= len(old)
+
+results = None
+
+#------------------------------------------------------------------------------
+# dissect requests, in each format
+#------------------------------------------------------------------------------
+
+def dissect_as_table(request, analyze):
+    table = dissect_file(request['path'], request['offset'], request['dissector'], as_table=True,
+        window=request['window'], cache=request['cache'])
+    fp = io.BytesIO()
+    table.save(fp)
+    return fp.getvalue()
+
+# what raw.py would print, intervals and notes in the order they're emitted
+def dissect_as_text(request, analyze):
+    out = io.StringIO()
+    old = use_context(Context(TextSink(out)))
+    try:
+        with reader(open(request['path'], 'rb')) as fp:
+            fp.seek(request['offset'])
+            analyze(fp)
+    finally:
+        use_context(old)
+    return out.getvalue().encode('utf-8')
+
+def dissect_as_binary(request, analyze):
+    out = io.BytesIO()
+    sink = BinarySink(out, os.path.getsize(request['path']), analyze.__module__.removeprefix('finter.'))
+    old = use_context(Context(sink))
+    try:
+        with reader(open(request['path'], 'rb')) as fp:
+            fp.seek(request['offset'])
+            analyze(fp)
+    finally:
+        use_context(old)
+    sink.close()
+    return out.getvalue()
+
+FORMATS = {'table': dissect_as_table, 'text': dissect_as_text, 'binary': dissect_as_binary}
+
+# return (reply, body)
+def serve_dissect(request):
+    request = {'path': os.path.realpath(request['path']), 'offset': request.get('offset', 0),
+        'dissector': request.get('dissector', ''), 'cache': request.get('cache', True),
+        'window': tuple(request['window']) if request.get('window') else None,
+        'format': request.get('format', 'table')}
+
+    if not request['format'] in FORMATS:
+        return ({'status': 'error', 'error': f'unknown format {request["format"]}'}, b'')
+
+    if not (analyze := resolve_analyze(request['path'], request['offset'], request['dissector'])):
+        return ({'status': 'unknown'}, b'')
+
+    st = os.stat(request['path'])
+    key = (request['path'], st.st_mtime_ns, st.st_size, request['offset'], analyze.__module__,
+        request['window'], request['format'])
+
+    cached = request['cache'] and (body := results.get(key)) is not None
+    if not cached:
+        body = FORMATS[request['format']](request, analyze)
+        if request['cache']:
+            results.put(key, body)
+
+    return ({'status': 'ok', 'size': len(body), 'dissector': analyze.__module__, 'cached': cached}, body)
+
+#------------------------------------------------------------------------------
+# run requests
+#------------------------------------------------------------------------------
+
+# forks a process for each run, itself forked before the daemon had threads
+class Zygote():
+    def __init__(self):
+        (self.channel, other) = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        if os.fork() == 0:
+            self.channel.close()
+            zygote_loop(other)
+        other.close()
+
+    # give the client's connection to a new process running <request>
+    def hand_off(self, connection, request):
+        socket.send_fds(self.channel, [json.dumps(request).encode()], [connection.fileno()])
+
+def zygote_loop(channel):
+    # runs reap themselves, and Ctrl-C on the daemon's terminal is for the daemon
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    while True:
+        (message, fds, _, _) = socket.recv_fds(channel, 1<<20, 1)
+        if not message:
+            # the daemon is gone
+            os._exit(0)
+        if os.fork() == 0:
+            channel.close()
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            run(socket.socket(fileno=fds[0]), json.loads(message))
+        os.close(fds[0])
+
+# the traceback python would print for <script>, without the frames above it
+def print_exception(e, script):
+    tb = e.__traceback__
+    while tb and tb.tb_frame.f_code.co_filename != script:
+        tb = tb.tb_next
+    traceback.print_exception(type(e), e, tb or e.__traceback__)
+
+# the tools that hand their run to the daemon (see client.run_remotely()),
+# nothing else is run
+RUNNABLE = {os.path.join(os.path.dirname(os.path.realpath(__file__)), name) for name in ['tree.py', 'oha.py', 'raw.py']}
+
+# become the client's process running its script, then exit like it would
+def run(connection, request):
+    try:
+        connection.sendall(json.dumps({'status': 'ok', 'pid': os.getpid()}).encode() + b'\n')
+        (_, fds, _, _) = socket.recv_fds(connection, 1, 3)
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        for (target, fd) in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        # reopened, so buffering follows what they are now (eg: a terminal)
+        sys.stdin = open(0, 'r', closefd=False)
+        sys.stdout = open(1, 'w', encoding=sys.__stdout__.encoding, closefd=False)
+        sys.stderr = open(2, 'w', encoding=sys.__stderr__.encoding, errors='backslashreplace', closefd=False)
+
+        os.chdir(request['cwd'])
+        for name in [name for name in os.environ if client.is_forwarded(name)]:
+            del os.environ[name]
+        os.environ.update(client.forwarded_environment(request['env']))
+        sys.argv = request['argv']
+        sys.path[0] = os.path.dirname(request['script'])
+
+        # the client only asks when the daemon is wanted, dissections go to its cache
+        (client.enabled, client.inside_daemon) = (True, True)
+    except BaseException:
+        os._exit(1)
+
+    code = 1
+
+    # registered first so it runs last, after the script's own (eg: --profile's report)
+    def report_exit():
+        for fp in [sys.stdout, sys.stderr]:
+            try:
+                fp.flush()
+            except OSError:
+                pass
+        connection.sendall(json.dumps({'exit': code}).encode() + b'\n')
+    atexit.register(report_exit)
+
+    # as python runs a script: a fresh __main__, sys.argv as given
+    script = request['script']
+    main = types.ModuleType('__main__')
+    main.__file__ = script
+    sys.modules['__main__'] = main
+    try:
+        with open(script, 'rb') as fp:
+            source = fp.read()
+        exec(compile(source, script, 'exec'), vars(main))
+        code = 0
+    except SystemExit as e:
+        code = e.code
+        if code is None:
+            code = 0
+        elif type(code) is not int:
+            print(code, file=sys.stderr)
+            code = 1
+    except KeyboardInterrupt as e:
+        print_exception(e, script)
+        code = 130
+    except BaseException as e:
+        print_exception(e, script)
+
+    # unwinds out of the zygote's loop, ending this process
+    sys.exit(code)
+
+#------------------------------------------------------------------------------
+# serving
+#------------------------------------------------------------------------------
+
+# (path, mtime, size) of helpers.py and the finter sources, a change means the loaded modules are stale
+def source_state():
+    directory = os.path.dirname(finter.__file__)
+    paths = [helpers.__file__] + [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.py')]
+    result = []
+    for path in sorted(paths):
+        st = os.stat(path)
+        result.append((path, st.st_mtime_ns, st.st_size))
+    return result
+
+loaded_sources = None
+zygote = None
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        t0 = time.perf_counter()
+        (request, body) = (None, b'')
+        try:
+            if client.peer_uid(self.request) not in (None, os.getuid()):
+                return
+            if not (line := self.rfile.readline()):
+                # eg: claim_socket() checking someone is listening
+                return
+            request = json.loads(line)
+            if source_state() != loaded_sources:
+                reply = {'status': 'stale'}
+            elif request.get('command') == 'run' and os.path.realpath(request['script']) not in RUNNABLE:
+                reply = {'status': 'error', 'error': f'not one of the tools the daemon runs: {request["script"]}'}
+            elif request.get('command') == 'run':
+                request['script'] = os.path.realpath(request['script'])
+                zygote.hand_off(self.request, request)
+                self.server.handed_off.add(self.request)
+                reply = None
+            else:
+                (reply, body) = serve_dissect(request)
+        except Exception as e:
+            # the client does the work itself, and gets the traceback there
+            reply = {'status': 'error', 'error': f'{type(e).__name__}: {e}'}
+
+        if reply:
+            try:
+                self.wfile.write(json.dumps(reply).encode() + b'\n')
+                self.wfile.write(body)
+            except OSError:
+                pass # client went away
+
+        if type(request) is dict:
+            (command, what) = (request.get('command'), request.get('path') or ' '.join([request.get('script', '')] + request.get('argv', [])[1:]))
+        else:
+            (command, what) = ('?', '')
+        status = reply['status'] if reply else 'forked'
+        print(f'{command:>8} {status:>8} {time.perf_counter() - t0:8.3f}s {what}', file=sys.stderr, flush=True)
+
+class Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.handed_off = set()
+
+    # connections given to a run belong to its process now, only let go of this process's copy
+    def shutdown_request(self, request):
+        if request in self.handed_off:
+            self.handed_off.discard(request)
+            self.close_request(request)
+        else:
+            super().shutdown_request(request)
+
+# import every dissector now rather than on a client's time
+def preload():
+    for name in registry.names():
+        try:
+            registry.get_module(name)
+        except Exception as e:
+            print(f'WARNING: unable to import {name}: {e}', file=sys.stderr)
+    helpers.finter_source_hash()
+
+# make the private directory the default socket goes in, remove a socket left
+# by a daemon that died, refuse to start if one is live or it isn't ours
+def claim_socket(path):
+    directory = os.path.dirname(os.path.abspath(path))
+    if directory == os.path.abspath(client.private_dir()):
+        try:
+            os.mkdir(directory, 0o700)
+        except FileExistsError:
+            pass
+        if not client.is_private_dir(directory):
+            print(f'ERROR: {directory} isn\'t a directory only this user can access', file=sys.stderr)
+            sys.exit(-1)
+
+    if not os.path.exists(path):
+        return
+    if (uid := os.stat(path).st_uid) != os.getuid():
+        print(f'ERROR: {path} belongs to uid {uid}, not this user', file=sys.stderr)
+        sys.exit(-1)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(path)
+        except OSError:
+            os.unlink(path)
+            return
+    print(f'ERROR: a daemon is already listening on {path}', file=sys.stderr)
+    sys.exit(-1)
+
+if __name__ == '__main__':
+    path = pop_option('socket', str, client.socket_path())
+    results = ResultCache(pop_option('memory', int, 1<<30))
+
+    # this process is the daemon, it doesn't ask itself
+    client.enabled = False
+
+    loaded_sources = source_state()
+    preload()
+    claim_socket(path)
+
+    # before any threads exist
+    zygote = Zygote()
+
+    # only this user may connect
+    umask = os.umask(0o077)
+    try:
+        server = Server(path, Handler)
+    finally:
+        os.umask(umask)
+
+    # kill (SIGTERM) leaves through the finally below too, removing the socket
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    print(f'listening on {path}', file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(path)
@@ -8,22 +8,16 @@
 # What will the clustering algorithm produce?
 
 import sys
-from helpers import dissect_file, intervals_to_tree
+from helpers import dissect_file, intervals_to_tree, tree_leaves
 
 import plotly.figure_factory as ff
 import numpy as np
 
-def leaves(node):
-    if not node.children:
-        return [node]
-
-    return sum([leaves(c) for c in node.children], [])
-
 if __name__ == '__main__':
 
     intervals = dissect_file(sys.argv[1])
     tree = intervals_to_tree(intervals)
-    leaves = leaves(tree)
+    leaves = tree_leaves(tree)
 
     print('%d leaves' % len(leaves))
     X = np.zeros((len(leaves),1))
@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 
 import sys
-from helpers import dissect_file, intervals_to_tree
+from helpers import dissect_file, intervals_to_tree, walk
 
 if __name__ == '__main__':
     tree = dissect_file(sys.argv[1])
@@ -17,24 +17,17 @@ if __name__ == '__main__':
     dot.append('edge [];')
 
     # node list
-    def all_nodes(n):
-        return [n] + sum([all_nodes(c) for c in n.children], [])
-
     dot.append('// nodes')
-    for n in all_nodes(root):
+    for (n, _) in walk(root):
         label = f'[0x{n.begin:X}, 0x{n.end:X})\\l{n.comment}'
         label = label.replace('"', '\\"')
         dot.append(f'{id(n)} [label="{label}"];')
 
-    def all_edges(n):
-        result = [(n, c) for c in n.children]
-        result = result + sum([all_edges(c) for c in n.children], [])
-        return result
-
-    # edge list
+    # edge list, each node's edges to its children, depth first
     dot.append('// edges')
-    for (a, b) in all_edges(root):
-        dot.append(f'{id(a)} -> {id(b)}')
+    for (a, _) in walk(root):
+        for b in a.children:
+            dot.append(f'{id(a)} -> {id(b)}')
 
     dot.append('}')
 
@@ -1,14 +1,23 @@
 #!/usr/bin/env python3
 #
 # dump a given file's tagging as json
+#
+# usage: emit_json.py [--ndjson] [--output PATH] [dissector] <file> [offset]
+#
+#   --ndjson        one json object per line per interval, depth first:
+#                   {"path": [names from the top], "begin", "end", "type", "comment"}
+#                   plus "value" for intervals without children
+#   --output PATH   write to PATH instead of stdout
+#
+# the json is written as the tree is walked rather than built up in memory
+# first, so its size doesn't matter
 
 import re
 import sys
 import json
-import struct
 import binascii
 
-from helpers import dissect_file, intervals_from_text, intervals_to_tree, FinterNode, finter_type_to_struct_fmt, handle_argv_common_utility
+from helpers import dissect_file, intervals_from_text, intervals_to_tree, FinterNode, extract_values, map_file, unique_names, handle_argv_common_utility, pop_option, pop_flag
 
 # we'll augment the default node type with the ability to produce a python
 # data structure serializable to json
@@ -24,67 +33,88 @@ class JsonNode(FinterNode):
         # "data[1128]"                                 "data"
         self.name = re.split('[^a-zA-Z0-9_]', self.comment)[0]
 
-        # needed
-        self.fp = None
-
-    def set_fp(self, fp):
-        self.fp = fp
-        for child in self.children:
-            child.set_fp(fp)
+        # set by extract_values()
+        self.value = None
 
+    # if we have children, return a dict with named children, otherwise our
+    # "value" (the bytes we tag) in serialized form
     def data_structify(self):
-        # if we have child children, do not emit our "value" (the bytes we tag)
-        # instead, return a dict with named children
         if self.children:
-            # get the requested names of each child
-            names = [ch.name for ch in self.children]
-
-            # resolve conflicts by appending a numeric distinguisher
-            suffix = {}
-            for ch in self.children:
-                name = ch.name
-                if names.count(name) > 1:
-                    if name in suffix:
-                        ch.name = f'{ch.name}{suffix[ch.name]}'
-                        suffix[name] += 1
-                    else:
-                        ch.name = f'{ch.name}0'
-                        suffix[name] = 1
-
-            # make the data structure recursively
-            return { ch.name : ch.data_structify() for ch in self.children }
-
-        # we have no children: emit our tagged bytes in serialized form
+            return { name : ch.data_structify() for (name, ch) in zip(unique_names(self.children), self.children) }
+        return json_value(self)
+
+# a leaf's value (see extract_values()) as it goes in the json, bytes in hex
+def json_value(node):
+    if node.type_ == 'none':
+        return 'null'
+    if type(node.value) is memoryview:
+        return binascii.hexlify(node.value).decode('utf-8')
+    return node.value
+
+# write what json.dumps(node.data_structify(), indent=4) would, a piece at a time
+def write_json(node, out, depth=0):
+    if not node.children:
+        out.write(json.dumps(json_value(node)))
+        return
+
+    # each dict being written: [its remaining (name, child) pairs, its depth, whether a pair was written]
+    out.write('{')
+    stack = [[zip(unique_names(node.children), node.children), depth, False]]
+    while stack:
+        frame = stack[-1]
+        (pairs, depth, started) = frame
+        for (name, child) in pairs:
+            out.write((',' if started else '') + '\n' + '    '*(depth+1) + json.dumps(name) + ': ')
+            frame[2] = started = True
+            if child.children:
+                # the child's pairs come next, then this dict's remaining ones
+                out.write('{')
+                stack.append([zip(unique_names(child.children), child.children), depth+1, False])
+                break
+            out.write(json.dumps(json_value(child)))
         else:
-            self.fp.seek(self.begin)
-            data = self.fp.read(self.end - self.begin)
+            out.write('\n' + '    '*depth + '}')
+            stack.pop()
 
-            match self.type_:
-                case 'raw': return binascii.hexlify(data).decode('utf-8')
-                case 'none': return 'null'
-                case _:
-                    fmt = finter_type_to_struct_fmt(self.type_)
-                    return struct.unpack(fmt, data)[0]
+# write a line of json for <node> and each node beneath it, depth first
+def write_ndjson(node, out, path=[]):
+    stack = [(node, path)]
+    while stack:
+        (node, path) = stack.pop()
 
+        record = {'path': path, 'begin': node.begin, 'end': node.end, 'type': node.type_, 'comment': node.comment}
+        if not node.children:
+            record['value'] = json_value(node)
+        out.write(json.dumps(record) + '\n')
+
+        names = unique_names(node.children)
+        stack.extend((child, path + [name]) for (name, child) in zip(reversed(names), reversed(node.children)))
 
 if __name__ == '__main__':
+    ndjson = pop_flag('ndjson')
+    output = pop_option('output')
     dissector, fpath, offset = handle_argv_common_utility()
 
-    intervals = dissect_file(fpath, offset, dissector)
+    intervals = dissect_file(fpath, offset, dissector, as_table=True)
 
     root = intervals_to_tree(intervals, JsonNode)
 
-    sorted_children = sorted(root.children, key=lambda x: x.begin)
-
     # debug?
     if 0:
         graph(root)
         sys.exit(-1)
 
-    breakpoint()
+    if output:
+        out = open(output, 'w', buffering=1<<20)
+    else:
+        out = open(sys.stdout.fileno(), 'w', buffering=1<<20, encoding=sys.stdout.encoding,
+            errors=sys.stdout.errors, closefd=False)
 
-    with open(fpath, 'rb') as fp:
-        root.set_fp(fp)
+    with open(fpath, 'rb') as fp, out:
+        extract_values(root, map_file(fp))
 
-        ds = root.data_structify()
-        print(json.dumps(ds, indent=4))
+        if ndjson:
+            write_ndjson(root, out)
+        else:
+            write_json(root, out)
+            out.write('\n')
@@ -50,7 +50,7 @@ def find_extended_name_table_svr4(fp):
     result = None
 
     start = fp.tell()
-    while not IsEof(fp):
+    while not fp.eof():
         file_ident = fp.read(16)
         fp.read(12+6+6+8) # consume timestamp, owner, group, mode
         file_size = int(fp.read(10))
@@ -71,7 +71,10 @@ def find_extended_name_table_svr4(fp):
     fp.seek(start)
     return result
 
-def analyze(fp):
+# yields after each member so callers can consume intervals as they come, see dissect_file_iter()
+def analyze_iter(fp):
+    fp = reader(fp)
+
     if not peek(fp, 8) == b'!<arch>\x0a':
         return
 
@@ -81,8 +84,13 @@ def analyze(fp):
 
     # seek
 
-    while not IsEof(fp):
+    while not fp.eof():
         ident, offset, size = tagFile(fp, name_table)
+        yield
+
+def analyze(fp):
+    for _ in analyze_iter(fp):
+        pass
 
 if __name__ == '__main__':
     import sys
@@ -9,9 +9,11 @@ from .helpers import *
 from . import h264
 
 def analyze(fp):
+    fp = reader(fp)
+
     setBigEndian()
 
-    while not IsEof(fp):
+    while not fp.eof():
         # 4 bytes for each length is most common, but really this could be
         # 1,2,3 or 4 and is specified in the avcc extradata
         length = tagUint32(fp, 'length')
@@ -38,12 +38,32 @@ def typeDescriptorToString(td):
 # "main"
 ###############################################################################
 
+FIELD_ID_ITEM = StructLayout(
+    ('H', 'class_idx'),
+    ('H', 'type_idx'),
+    ('I', 'name_idx'))
+
+METHOD_ID_ITEM = StructLayout(
+    ('H', 'class_idx'),
+    ('H', 'proto_idx'),
+    ('I', 'name_idx'))
+
+CLASS_DEF_ITEM = StructLayout(
+    ('I', 'class_idx'),
+    ('I', 'access_flags'),
+    ('I', 'superclass_idx'),
+    ('I', 'interfaces_off'),
+    ('I', 'source_file_idx'),
+    ('I', 'annotations_off'),
+    ('I', 'class_data_off'),
+    ('I', 'static_values_off'))
+
 def analyze(fp):
     magic = fp.read(8)
     if not (magic in [DEX_FILE_MAGIC_35, DEX_FILE_MAGIC_37]):
         return
 
-    print("[0x0,0x8) %s" % magicToStr(magic))
+    emit(0, 8, 'raw', magicToStr(magic))
     tagUint32(fp, 'checksum (adler32)')
     tag(fp, 20, 'signature (sha1)')
     tagUint32(fp, 'file_size')
@@ -68,17 +88,16 @@ def analyze(fp):
     class_defs_off = tagUint32(fp, 'class_defs_off')
     data_size = tagUint32(fp, 'data_size')
     data_off = tagUint32(fp, 'data_off')
-    print("[0x0,0x70) header")
+    emit(0, 0x70, 'raw', 'header')
 
     # mark data section
-    print("[0x%X,0x%X) data section" % (data_off, data_off+data_size))
+    emit(data_off, data_off+data_size, 'raw', "data section")
 
     # visit string_id_item array
     stringIdxToString = []
     fp.seek(string_ids_off)
     if string_ids_size > 1:
-        print("[0x%X,0x%X) string_ids (%d entries)" % \
-            (string_ids_off, string_ids_off+string_ids_size*4, string_ids_size))
+        emit(string_ids_off, string_ids_off+string_ids_size*4, 'raw', "string_ids (%d entries)" % string_ids_size)
     stringIdOffsets = []
     for i in range(string_ids_size):
         off = uint32(fp, True)
@@ -101,14 +120,12 @@ def analyze(fp):
     typeIdxToString = []
     fp.seek(type_ids_off)
     if type_ids_size > 1:
-        print("[0x%X,0x%X) type_ids (%d entries)" % \
-            (type_ids_off, type_ids_off+type_ids_size*4, type_ids_size))
+        emit(type_ids_off, type_ids_off+type_ids_size*4, 'raw', "type_ids (%d entries)" % type_ids_size)
     for i in range(type_ids_size):
         off = uint32(fp)
         typeIdxToString.append(stringIdxToString[off])
 
-        print("[0x%X,0x%X) type_id_item %d/%d %s" % \
-            (fp.tell()-4, fp.tell(), i+1, type_ids_size, repr(stringIdxToString[off])))
+        emit(fp.tell()-4, fp.tell(), 'raw', "type_id_item %d/%d %s" % (i+1, type_ids_size, repr(stringIdxToString[off])))
 
     #print '--------'
     #print typeIdxToString
@@ -117,65 +134,50 @@ def analyze(fp):
     # visit proto_id_item array
     fp.seek(proto_ids_off)
     if proto_ids_size > 1:
-        print("[0x%X,0x%X) proto_ids (%d entries)" % \
-            (proto_ids_off, proto_ids_off+proto_ids_size*12, proto_ids_size))
+        emit(proto_ids_off, proto_ids_off+proto_ids_size*12, 'raw', "proto_ids (%d entries)" % proto_ids_size)
     for i in range(proto_ids_size):
         shorty_idx = tagUint32(fp, "shorty_idx")
         return_type_idx = uint32(fp, True)
         rtiStr = typeIdxToString[return_type_idx]
         tagUint32(fp, "return_type_idx %s %s" % (repr(typeIdxToString[return_type_idx]), rtiStr))
         tagUint32(fp, "parameters_off")
-        print("[0x%X,0x%X) proto_id_item %d/%d %s" % \
-            (fp.tell()-12, fp.tell(), i+1, proto_ids_size, repr(stringIdxToString[shorty_idx])))
+        emit(fp.tell()-12, fp.tell(), 'raw', "proto_id_item %d/%d %s" % (i+1, proto_ids_size, repr(stringIdxToString[shorty_idx])))
 
     # visit field_id_item array
     if field_ids_off:
         fp.seek(field_ids_off)
         if field_ids_size > 1:
-            print("[0x%X,0x%X) field_ids (%d entries)" % \
-                (field_ids_off, field_ids_off+field_ids_size*8, field_ids_size))
-        for i in range(field_ids_size):
-            tagUint16(fp, "class_idx")
-            tagUint16(fp, "type_idx")
-            name_idx = tagUint32(fp, "name_idx")
-            print("[0x%X,0x%X) field_id_item %d/%d %s" % \
-                (fp.tell()-8, fp.tell(), i+1, field_ids_size, repr(stringIdxToString[name_idx])))
+            emit(field_ids_off, field_ids_off+field_ids_size*8, 'raw', "field_ids (%d entries)" % field_ids_size)
+        tagArray(fp, FIELD_ID_ITEM, field_ids_size,
+            lambda table: ["field_id_item %d/%d %s" % (i+1, field_ids_size, repr(stringIdxToString[x])) \
+                for (i, x) in enumerate(table['name_idx'].tolist())])
 
     # visit methods_id_item array
     if methods_ids_off:
         fp.seek(methods_ids_off)
         if methods_ids_size > 1:
-            print("[0x%X,0x%X) methods_ids (%d entries)" % \
-                (methods_ids_off, methods_ids_off+methods_ids_size*8, methods_ids_size))
-        for i in range(methods_ids_size):
-            tagUint16(fp, "class_idx")
-            tagUint16(fp, "proto_idx")
-            name_idx = tagUint32(fp, "name_idx")
-            print("[0x%X,0x%X) methods_id_item %d/%d %s" % \
-                (fp.tell()-8, fp.tell(), i+1, methods_ids_size, repr(stringIdxToString[name_idx])))
+            emit(methods_ids_off, methods_ids_off+methods_ids_size*8, 'raw', "methods_ids (%d entries)" % methods_ids_size)
+        tagArray(fp, METHOD_ID_ITEM, methods_ids_size,
+            lambda table: ["methods_id_item %d/%d %s" % (i+1, methods_ids_size, repr(stringIdxToString[x])) \
+                for (i, x) in enumerate(table['name_idx'].tolist())])
 
     # visit class_def_item array
     classDataOffets = []
     if class_defs_off:
         fp.seek(class_defs_off)
         if class_defs_size > 1:
-            print("[0x%X,0x%X) class_defs (%d entries)" % \
-                (class_defs_off, class_defs_off+class_defs_size*32, class_defs_size))
-        for i in range(class_defs_size):
-            class_idx = tagUint32(fp, "class_idx")
-            tagUint32(fp, "access_flags")
-            tagUint32(fp, "superclass_idx")
-            tagUint32(fp, "interfaces_off")
-            tagUint32(fp, "source_file_idx")
-            tagUint32(fp, "annotations_off")
-            class_data_off = tagUint32(fp, "class_data_off")
-            tagUint32(fp, "static_values_off")
-            print("[0x%X,0x%X) class_def_item %d/%d %s" % \
-                (fp.tell()-32, fp.tell(), i+1, class_defs_size, repr(typeIdxToString[class_idx])))
-            classDataOffets.append(class_data_off)
+            emit(class_defs_off, class_defs_off+class_defs_size*32, 'raw', "class_defs (%d entries)" % class_defs_size)
+        class_defs = tagArray(fp, CLASS_DEF_ITEM, class_defs_size,
+            lambda table: ["class_def_item %d/%d %s" % (i+1, class_defs_size, repr(typeIdxToString[x])) \
+                for (i, x) in enumerate(table['class_idx'].tolist())])
+        classDataOffets = class_defs['class_data_off'].tolist()
 
     # visit each class_data_item
     for o in classDataOffets:
+        # the item's extent is only known by parsing it, but those starting
+        # past the query window can't overlap it
+        if pastWindow(o):
+            continue
         fp.seek(o)
         static_fields_size = tagUleb128(fp, 'static_fields_size')
         instance_fields_size = tagUleb128(fp, 'instance_fields_size')
@@ -185,32 +187,32 @@ def analyze(fp):
             t = fp.tell()
             tagUleb128(fp, 'field_idx_diff')
             tagUleb128(fp, 'access_flags')
-            print("[0x%X,0x%X) static_field" % (t, fp.tell()))
+            emit(t, fp.tell(), 'raw', "static_field")
         for i in range(instance_fields_size):
             t = fp.tell()
             tagUleb128(fp, 'field_idx_diff')
             tagUleb128(fp, 'access_flags')
-            print("[0x%X,0x%X) instance_field" % (t, fp.tell()))
+            emit(t, fp.tell(), 'raw', "instance_field")
         for i in range(direct_methods_size):
             t = fp.tell()
             tagUleb128(fp, 'method_idx_diff')
             tagUleb128(fp, 'access_flags')
             tagUleb128(fp, 'code_off')
-            print("[0x%X,0x%X) direct_methods" % (t, fp.tell()))
+            emit(t, fp.tell(), 'raw', "direct_methods")
         for i in range(virtual_methods_size):
             t = fp.tell()
             tagUleb128(fp, 'field_idx_diff')
             tagUleb128(fp, 'access_flags')
             tagUleb128(fp, 'code_off')
-            print("[0x%X,0x%X) virtual_methods" % (t, fp.tell()))
-        print("[0x%X,0x%X) class_data_item" % (o, fp.tell()))
+            emit(t, fp.tell(), 'raw', "virtual_methods")
+        emit(o, fp.tell(), 'raw', "class_data_item")
 
     # visit string_data_item array
     for o in stringIdOffsets:
         fp.seek(o)
         utf16_size = tagUleb128(fp, "utf16_size")
         data = tagDataUntil(fp, b'\x00', "data")
-        print("[0x%X,0x%X) string_data_item \"%s\"" % (o, fp.tell(), data[0:-1]))
+        emit(o, fp.tell(), 'raw', "string_data_item \"%s\"" % data[0:-1])
 
 if __name__ == '__main__':
     import sys
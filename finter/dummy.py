@@ -14,9 +14,11 @@ from .helpers import *
 ###############################################################################
 
 def analyze(fp):
+    fp = reader(fp)
+
     setLittleEndian()
 
-    while not IsEof(fp) and remaining(fp) >= 15:
+    while not fp.eof() and fp.remaining() >= 15:
         tag(fp, 15, 'chunk', 1)
         tagUint8(fp, 'a', 'comment')
         tagUint16(fp, 'b', 'comment')
@@ -4,6 +4,8 @@ import sys
 import struct
 import binascii
 
+import numpy as np
+
 from enum import Enum, auto, unique
 
 from .helpers import *
@@ -755,15 +757,16 @@ class StringTable:
         self.table = FP.read(size)
 
     def __getitem__(self, offset):
-        result = None
-        end = offset
-        while end < len(self.table) and self.table[end] != 0:
-            end += 1
-        if end >= len(self.table):
-            result = b''
-        else:
-            result = self.table[offset:end]
-        return result.decode('utf-8')
+        end = self.table.find(b'\x00', offset)
+        if end < 0:
+            return ''
+        return self.table[offset:end].decode('utf-8')
+
+    # strings for an array of offsets, each distinct offset is only looked up once
+    def lookup(self, offsets):
+        (distinct, inverse) = np.unique(offsets, return_inverse=True)
+        strings = [self[x] for x in distinct.tolist()]
+        return [strings[i] for i in inverse.tolist()]
 
     def replace_string(self, oldstr, newstr):
         offset = 0
@@ -786,27 +789,28 @@ class StringTable:
                     str_ = self[i]
                     n.addNode('0x%X'%i + ' \"' + str_ + "\"", self.offset + i, len(str_)+1)
 
+# "elf32" or "elf64" if <data> starts with a valid e_ident, else None, also
+# used by finter/identify.py
+def idHeader(data):
+    if data[0:4] != b"\x7fELF" or len(data) < 7:
+        return None
+    (elfClass, eiData, eiVersion) = data[4:7] # e_ident[EI_CLASS], e_ident[EI_DATA], e_ident[EI_VERSION]
+    if not (elfClass in [ELFCLASS32, ELFCLASS64]):
+        return None
+    if not eiData in [ELFDATA2LSB, ELFDATA2MSB]:
+        return None
+    if not (eiVersion in [EV_CURRENT]):
+        return None
+    return {ELFCLASS32: 'elf32', ELFCLASS64: 'elf64'}[elfClass]
+
 def isElf(fp):
-    elfClass = None
     tmp = fp.tell()
     fp.seek(0)
-    if fp.read(4) != b"\x7fELF":
-        #print("NO SIGNATURE")
-        return False
-    elfClass = unpack('B', fp.read(1))[0] # e_ident[EI_CLASS]
-    if not (elfClass in [ELFCLASS32, ELFCLASS64]):
-        #print("NO elfClass")
-        return False
-    eiData = unpack('B', fp.read(1))[0] # e_ident[EI_DATA]
-    if not eiData in [ELFDATA2LSB, ELFDATA2MSB]:
-        #print("NO eiData")
-        return False
-    eiVersion = unpack('B', fp.read(1))[0]
-    if not (eiVersion in [EV_CURRENT]): # e_ident[EI_VERSION]
-        #print("NO eiVersion")
-        return False
+    data = fp.read(7)
     fp.seek(tmp)
-    return (True, elfClass)
+    if not idHeader(data):
+        return False
+    return (True, data[4])
 
 def isElf64(fp):
     result = isElf(fp)
@@ -34,11 +34,13 @@ def tag_elf32_rel(fp, machine:E_MACHINE=None):
 #        Elf32_Word      r_info;
 #        Elf32_Sword     r_addend;
 #} Elf32_Rela;
-def tag_elf32_rela(fp):
-    tag(fp, 12, 'Elf32_Rela', '', peek=True)
-    tag(fp, 4, 'r_offset')
-    tag(fp, 4, 'r_info')
-    tag(fp, 4, 'r_addend')
+ELF32_RELA = StructLayout(
+    ('I', 'r_offset'),
+    ('I', 'r_info'),
+    ('i', 'r_addend'))
+
+def tag_elf32_rela(fp, count):
+    return tagArray(fp, ELF32_RELA, count, 'Elf32_Rela')
 
 # get symbol table index from r_info
 #define ELF32_R_SYM(info)             ((info)>>8)
@@ -50,28 +52,21 @@ def ELF32_R_SYM(info):
 def ELF32_R_TYPE(info):
     return info & 0xFF
 
-def tag_elf32_sym(fp, index, strTab:StringTable):
-    base = fp.tell()
-
-    st_name = uint32(fp, 1)
-    nameStr = strTab[st_name]
-    tag(fp, 4, "st_name=0x%X \"%s\"" % (st_name,nameStr))
-
-    st_value = tagUint32(fp, "st_value")
+ELF32_SYM = StructLayout(
+    ('I', 'st_name'),
+    ('I', 'st_value'),
+    ('I', 'st_size'),
+    ('B', 'st_info', lambda x: 'bind:%d(%s) type:%d(%s)' % \
+        (x>>4, symbol_binding_tostr(x>>4), x&0xF, symbol_type_tostr(x&0xF))),
+    ('B', 'st_other'),
+    ('H', 'st_shndx'))
 
-    st_size = tagUint32(fp, "st_size")
+assert ELF32_SYM.size == SIZEOF_ELF32_SYM
 
-    st_info = uint8(fp, 1)
-    bindingStr = symbol_binding_tostr(st_info >> 4)
-    typeStr = symbol_type_tostr(st_info & 0xF)
-    tag(fp, 1, "st_info bind:%d(%s) type:%d(%s)" % \
-        (st_info>>4, bindingStr, st_info&0xF, typeStr))
-
-    st_other = tagUint8(fp, "st_other")
-
-    st_shndx = tagUint16(fp, "st_shndx")
-    fp.seek(base)
-    tag(fp, SIZEOF_ELF32_SYM, "Elf32_Sym \"%s\" (index:%d)" % (nameStr, index))
+def tag_elf32_syms(fp, count, strTab:StringTable):
+    return tagArray(fp, ELF32_SYM, count,
+        lambda table: ['Elf32_Sym "%s" (index:%d)' % (name, i) for (i, name) in enumerate(strTab.lookup(table['st_name']))],
+        {'st_name': lambda table: ['"%s"' % x for x in strTab.lookup(table['st_name'])]})
 
 def tag_elf32_dyn(fp, e_machine):
     base = fp.tell()
@@ -84,67 +79,47 @@ def tag_elf32_dyn(fp, e_machine):
 
     return d_tag != DynamicType.DT_NULL
 
+ELF32_SHDR = StructLayout(
+    ('I', 'sh_name'),
+    ('I', 'sh_type', lambda x: '(%s)' % sh_type_tostr(x)),
+    ('I', 'sh_flags', lambda x: '(%s)' % sh_flags_tostr(x)),
+    ('I', 'sh_addr'),
+    ('I', 'sh_offset'),
+    ('I', 'sh_size'),
+    ('I', 'sh_link'), # usually the section index of the associated string or symbol table
+    ('I', 'sh_info'), # usually the section index of the section to which this applies
+    ('I', 'sh_addralign'),
+    ('I', 'sh_entsize'))
+
 def tag_elf32_shdr(fp, index, scnStrTab):
     base = fp.tell()
 
-    sh_name = tagUint32(fp, "sh_name")
-    sh_type = uint32(fp, 1)
-    tag(fp, 4, "sh_type=0x%X (%s)" % \
-        (sh_type, sh_type_tostr(sh_type)))
-    sh_flags = uint32(fp, 1)
-    tag(fp, 4, "sh_flags=0x%X (%s)" % \
-        (sh_flags, sh_flags_tostr(sh_flags)))
-    sh_addr = tagUint32(fp, "sh_addr")
-    sh_offset = tagUint32(fp, "sh_offset")
-    sh_size = tagUint32(fp, "sh_size")
-    sh_link = tagUint32(fp, "sh_link") # usually the section index of the associated string or symbol table
-    sh_info = tagUint32(fp, "sh_info") # usually the section index of the section to which this applies
-    sh_addralign = tagUint32(fp, "sh_addralign")
-    sh_entsize = tagUint32(fp, "sh_entsize")
-
-    name = scnStrTab[sh_name]
+    result = tagStruct(fp, ELF32_SHDR)
+    result['name'] = scnStrTab[result['sh_name']]
 
-    fp.seek(base)
-    tag(fp, 40, 'elf32_shdr "%s" %s (index: %d)' % \
-        (name, sh_type_tostr(sh_type), index))
-
-    return {'sh_name': sh_name,
-            'sh_type': sh_type,
-            'sh_flags': sh_flags,
-            'sh_addr': sh_addr,
-            'sh_offset': sh_offset,
-            'sh_size': sh_size,
-            'sh_link': sh_link,
-            'sh_info': sh_info,
-            'sh_addralign': sh_addralign,
-            'sh_entsize': sh_entsize,
-            'name': name}
+    emit(base, fp.tell(), 'raw', 'elf32_shdr "%s" %s (index: %d)' % \
+        (result['name'], sh_type_tostr(result['sh_type']), index))
+
+    return result
+
+ELF32_PHDR = StructLayout(
+    ('I', 'p_type', lambda x: '(%s)' % phdr_type_tostr(x)),
+    ('I', 'p_offset'),
+    ('I', 'p_vaddr'),
+    ('I', 'p_paddr'),
+    ('I', 'p_filesz'),
+    ('I', 'p_memsz'),
+    ('I', 'p_flags', lambda x: '(%s)' % phdr_flags_tostr(x)),
+    ('I', 'p_align'))
 
 def tag_elf32_phdr(fp, index):
     base = fp.tell()
 
-    p_type = uint32(fp, True)
-    tagUint32(fp, 'p_type', '('+phdr_type_tostr(p_type)+')')
-    p_offset = tagUint32(fp, "p_offset")
-    p_vaddr = tagUint32(fp, "p_vaddr")
-    p_paddr = tagUint32(fp, "p_paddr")
-    p_filesz = tagUint32(fp, "p_filesz")
-    p_memsz = tagUint32(fp, "p_memsz")
-    p_flags = uint32(fp, True)
-    tagUint32(fp, 'p_flags', '('+phdr_flags_tostr(p_flags)+')')
-    p_align = tagUint32(fp, "p_align")
-
-    print('[0x%X,0x%X) raw elf32_phdr index=%d' % \
-        (base, fp.tell(), index))
-
-    return {    'p_type':p_type,
-                'p_offset':p_offset,
-                'p_vaddr':p_vaddr,
-                'p_paddr':p_paddr,
-                'p_filesz':p_filesz,
-                'p_memsz':p_memsz,
-                'p_flags':p_flags,
-                'p_align':p_align   }
+    result = tagStruct(fp, ELF32_PHDR)
+
+    emit(base, fp.tell(), 'raw', 'elf32_phdr index=%d' % index)
+
+    return result
 
 def analyze(fp):
     if not isElf32(fp):
@@ -204,8 +179,7 @@ def analyze(fp):
     for i, info in enumerate(scn_infos):
         # top level container
         if not info['sh_type'] in [SHT_NULL, SHT_NOBITS] and info['sh_size'] > 0:
-            print('[0x%X,0x%X) raw section "%s" contents' % \
-                (info['sh_offset'], info['sh_offset']+info['sh_size'], scnStrTab[info['sh_name']]))
+            emit(info['sh_offset'], info['sh_offset']+info['sh_size'], 'raw', 'section "%s" contents' % scnStrTab[info['sh_name']])
 
         # like .dynamic
         if info['sh_type'] == SHT_DYNAMIC:
@@ -222,11 +196,8 @@ def analyze(fp):
             fp.seek(scn_infos[link]['sh_offset'])
             strtab = StringTable(fp, scn_infos[link]['sh_size'])
             # array of Elf32_Sym entries
-            idx = 0
             fp.seek(info['sh_offset'])
-            while fp.tell() < (info['sh_offset'] + info['sh_size']):
-                tag_elf32_sym(fp, idx, strtab)
-                idx += 1
+            tag_elf32_syms(fp, info['sh_size'] // SIZEOF_ELF32_SYM, strtab)
 
         elif info['sh_type'] == SHT_STRTAB:
             fp.seek(info['sh_offset'])
@@ -239,8 +210,7 @@ def analyze(fp):
 
         elif info['sh_type'] == SHT_RELA:
             fp.seek(info['sh_offset'])
-            while fp.tell() < (info['sh_offset'] + info['sh_size']):
-                tag_elf32_rela(fp, e_machine)
+            tag_elf32_rela(fp, info['sh_size'] // ELF32_RELA.size)
 
         elif info['name'] == '__versions':
             fp.seek(info['sh_offset'])
@@ -265,8 +235,7 @@ def analyze(fp):
 
         type_str = phdr_type_tostr(info['p_type'])
 
-        print('[0x%X,0x%X) raw segment idx:%d type:%s' % \
-            (start, end, i, type_str))
+        emit(start, end, 'raw', 'segment idx:%d type:%s' % (i, type_str))
 
         # If a dynamic program header / segment exists, but it wasn't tagged in a section,
         # tag it now. Some toolchains produce section-less binaries.
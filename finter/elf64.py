@@ -18,6 +18,9 @@
 import sys
 import struct
 import binascii
+import itertools
+
+import numpy as np
 
 from . import dwarf
 from .elf import *
@@ -43,30 +46,28 @@ def ELF64_ST_TYPE(info):
 #     Elf64_Xword	r_info;			/* Relocation type and symbol index */
 #     Elf64_Sxword	r_addend;		/* Addend */
 # } Elf64_Rela;
-def tag_elf64_rela(fp, machine:E_MACHINE=None):
-    tag(fp, 24, 'Elf64_Rela', '', peek=True)
-    tagUint64(fp, 'r_offset')
-
-    # info is type.24|id.8
-    r_info = uint64(fp, True)
-
-    # this way? with ELF64_R_TYPE_DATA() and ELF64_R_TYPE_ID()
-    if 0:
-        data = (r_info & 0xFFFFFF00) >> 8
-        id_ = r_info & 0xFF
-        tagUint64(fp, 'r_info', f'data=0x{data:X} id=0x{id_:X}')
-    # or this? with ELF64_R_SYM() and ELF64_R_TYPE()
-    if 1:
-        r_sym = ELF64_R_SYM(r_info)
-        r_type = ELF64_R_TYPE(r_info)
-        r_type_str = ''
-        if machine == E_MACHINE.EM_AARCH64.value:
-            r_type_str = ' (' + RELOC_TYPE_ARM64(r_type).name + ')'
-        elif machine == E_MACHINE.EM_X86_64.value:
-            r_type_str = ' (' + RELOC_TYPE_X86_64(r_type).name + ')'
-        tagUint64(fp, 'r_info', f'sym=0x{r_sym:X} type=0x{r_type:X}{r_type_str}')
-
-    tagInt64(fp, 'r_addend')
+ELF64_RELA = StructLayout(
+    ('Q', 'r_offset'),
+    ('Q', 'r_info'),
+    ('q', 'r_addend'))
+
+def tag_elf64_rela(fp, count, machine:E_MACHINE=None):
+    reloc_types = {E_MACHINE.EM_AARCH64.value: RELOC_TYPE_ARM64,
+                   E_MACHINE.EM_X86_64.value: RELOC_TYPE_X86_64}.get(machine)
+
+    # info is sym.32|type.32, see ELF64_R_SYM() and ELF64_R_TYPE()
+    def r_info_comments(table):
+        r_sym = ELF64_R_SYM(table['r_info']).tolist()
+        r_type = ELF64_R_TYPE(table['r_info'])
+        if reloc_types:
+            (distinct, inverse) = np.unique(r_type, return_inverse=True)
+            names = [' (%s)' % enum_int_to_name(reloc_types, x) for x in distinct.tolist()]
+            r_type_str = [names[i] for i in inverse.tolist()]
+        else:
+            r_type_str = itertools.repeat('', len(table))
+        return ['sym=0x%X type=0x%X%s' % x for x in zip(r_sym, r_type.tolist(), r_type_str)]
+
+    return tagArray(fp, ELF64_RELA, count, 'Elf64_Rela', {'r_info': r_info_comments})
 
 # typedef struct {
 #         Elf64_Xword d_tag;
@@ -93,22 +94,28 @@ def tag_elf64_dyn(fp, e_machine, dynStrTab=None):
 
     return d_tag != DynamicType.DT_NULL
 
-def tag_elf64_sym(fp, index, strTab):
-    base = fp.tell()
-    st_name = uint32(fp, 1)
-    nameStr = strTab[st_name] if strTab else ''
-    tag(fp, 4, "st_name=0x%X \"%s\"" % (st_name, nameStr))
-    st_info = uint8(fp, 1)
-    bindingStr = symbol_binding_tostr(ELF64_ST_BIND(st_info))
-    typeStr = symbol_type_tostr(ELF64_ST_TYPE(st_info))
-    tag(fp, 1, "st_info bind:%d(%s) type:%d(%s)" % \
-        (st_info>>4, bindingStr, st_info&0xF, typeStr))
-    st_other = tagUint8(fp, "st_other")
-    st_shndx = tagUint16(fp, "st_shndx")
-    st_value = tagUint64(fp, "st_value")
-    st_size = tagUint64(fp, "st_size")
-    fp.seek(base)
-    tag(fp, SIZEOF_ELF64_SYM, "Elf64_Sym[%d] \"%s\"" % (index, nameStr))
+ELF64_SYM = StructLayout(
+    ('I', 'st_name'),
+    ('B', 'st_info', lambda x: 'bind:%d(%s) type:%d(%s)' % \
+        (ELF64_ST_BIND(x), symbol_binding_tostr(ELF64_ST_BIND(x)), ELF64_ST_TYPE(x), symbol_type_tostr(ELF64_ST_TYPE(x)))),
+    ('B', 'st_other'),
+    ('H', 'st_shndx'),
+    ('Q', 'st_value'),
+    ('Q', 'st_size'))
+
+assert ELF64_SYM.size == SIZEOF_ELF64_SYM
+
+def tag_elf64_syms(fp, count, strTab):
+    # looked up once, used by both the record labels and the st_name comments
+    cache = []
+    def names(table):
+        if not cache:
+            cache.append(strTab.lookup(table['st_name']) if strTab else [''] * len(table))
+        return cache[0]
+
+    return tagArray(fp, ELF64_SYM, count,
+        lambda table: ['Elf64_Sym[%d] "%s"' % x for x in enumerate(names(table))],
+        {'st_name': lambda table: ['"%s"' % x for x in names(table)]})
 
 # typedef struct {
 #         Elf64_Word      sh_name; // 4
@@ -124,64 +131,48 @@ def tag_elf64_sym(fp, index, strTab):
 # } Elf64_Shdr;
 #
 # 72 bytes total!
+ELF64_SHDR = StructLayout(
+    ('I', 'sh_name'),
+    ('I', 'sh_type', lambda x: '(%s)' % sh_type_tostr(x)),
+    ('Q', 'sh_flags', lambda x: '(%s)' % sh_flags_tostr(x)),
+    ('Q', 'sh_addr'),
+    ('Q', 'sh_offset'),
+    ('Q', 'sh_size'),
+    ('I', 'sh_link'), # usually the section index of the associated string or symbol table
+    ('I', 'sh_info'), # usually the section index of the section to which this applies
+    ('Q', 'sh_addralign'),
+    ('Q', 'sh_entsize'))
+
+assert ELF64_SHDR.size == SIZEOF_ELF64_SHDR
+
 def tag_elf64_shdr(fp, index, scnStrTab):
     base = fp.tell()
 
-    sh_name = tagUint32(fp, "sh_name")
-    sh_type = uint32(fp, 1)
-    tagUint32(fp, "sh_type=0x%X (%s)" % (sh_type, sh_type_tostr(sh_type)))
-    sh_flags = uint64(fp, 1)
-    tagUint64(fp, "sh_flags=0x%X (%s)" % (sh_flags, sh_flags_tostr(sh_flags)))
-    sh_addr = tagUint64(fp, "sh_addr")
-    sh_offset = tagUint64(fp, "sh_offset")
-    sh_size = tagUint64(fp, "sh_size")
-    sh_link = tagUint32(fp, "sh_link") # usually the section index of the associated string or symbol table
-    sh_info = tagUint32(fp, "sh_info") # usually the section index of the section to which this applies
-    sh_addralign = tagUint64(fp, "sh_addralign")
-    sh_entsize = tagUint64(fp, "sh_entsize")
-
-    assert (fp.tell() - base) == SIZEOF_ELF64_SHDR
+    result = tagStruct(fp, ELF64_SHDR)
 
-    fp.seek(base)
-    tag(fp, SIZEOF_ELF64_SHDR, 'elf64_shdr "%s" %s (index: %d)' % \
-        (scnStrTab[sh_name], sh_type_tostr(sh_type), index))
-
-    return {'sh_name':sh_name,
-            'sh_type':sh_type,
-            'sh_flags':sh_flags,
-            'sh_addr':sh_addr,
-            'sh_offset':sh_offset,
-            'sh_size':sh_size,
-            'sh_link':sh_link,
-            'sh_info':sh_info,
-            'sh_addralign':sh_addralign,
-            'sh_entsize':sh_entsize}
+    emit(base, fp.tell(), 'raw', 'elf64_shdr "%s" %s (index: %d)' % \
+        (scnStrTab[result['sh_name']], sh_type_tostr(result['sh_type']), index))
+
+    return result
+
+ELF64_PHDR = StructLayout(
+    ('I', 'p_type', lambda x: '(%s)' % phdr_type_tostr(x)),
+    ('I', 'p_flags', lambda x: '(%s)' % phdr_flags_tostr(x)),
+    ('Q', 'p_offset'),
+    ('Q', 'p_vaddr'),
+    ('Q', 'p_paddr'),
+    ('Q', 'p_filesz'),
+    ('Q', 'p_memsz'),
+    ('Q', 'p_align'))
 
 def tag_elf64_phdr(fp, index):
     base = fp.tell()
 
-    p_type = uint32(fp, True)
-    tagUint32(fp, 'p_type', '('+phdr_type_tostr(p_type)+')')
-    p_flags = uint32(fp, True)
-    tagUint32(fp, 'p_flags', '('+phdr_flags_tostr(p_flags)+')')
-    p_offset = tagUint64(fp, 'p_offset')
-    p_vaddr = tagUint64(fp, 'p_vaddr')
-    p_paddr = tagUint64(fp, 'p_paddr')
-    p_filesz = tagUint64(fp, 'p_filesz')
-    p_memsz = tagUint64(fp, 'p_memsz')
-    p_align = tagUint64(fp, 'p_align')
-
-    print('[0x%X,0x%X) raw elf64_phdr index=%d' % \
-        (base, fp.tell(), index))
-
-    return {    'p_type':p_type,
-                'p_offset':p_offset,
-                'p_vaddr':p_vaddr,
-                'p_paddr':p_paddr,
-                'p_filesz':p_filesz,
-                'p_memsz':p_memsz,
-                'p_flags':p_flags,
-                'p_align':p_align   }
+    result = tagStruct(fp, ELF64_PHDR)
+
+    emit(base, fp.tell(), 'raw', 'elf64_phdr index=%d' % index)
+
+    return result
 
 ###############################################################################
 # "main"
@@ -278,8 +269,7 @@ def analyze(fp):
             rela_sections.append((sh_offset, sh_size))
 
         if (not sh_type in [SHT_NULL, SHT_NOBITS]):
-            print('[0x%X,0x%X) raw section "%s" contents' % \
-                (sh_offset, sh_offset+sh_size, scnStrTab[sh_name]))
+            emit(sh_offset, sh_offset+sh_size, 'raw', 'section "%s" contents' % scnStrTab[sh_name])
 
     # certain sections we analyze deeper...
     strTab = None
@@ -318,10 +308,7 @@ def analyze(fp):
             continue
         offs, size = sym_section
         fp.seek(offs)
-        index = 0
-        while fp.tell() < (offs + size):
-            tag_elf64_sym(fp, index, lookup)
-            index += 1
+        tag_elf64_syms(fp, size // SIZEOF_ELF64_SYM, lookup)
 
 #    opd = False
 #    if opd and E_MACHINE(e_machine) == E_MACHINE.EM_PPC64:
@@ -368,8 +355,7 @@ def analyze(fp):
 
     for (addr, size) in rela_sections:
         fp.seek(addr)
-        while fp.tell() < addr + size:
-            tag_elf64_rela(fp, e_machine)
+        tag_elf64_rela(fp, size // ELF64_RELA.size, e_machine)
 
     # read program headers
     # REMINDER! struct member 'p_flags' changes between 32/64 bits
@@ -390,8 +376,7 @@ def analyze(fp):
 
         type_str = phdr_type_tostr(info['p_type'])
 
-        print('[0x%X,0x%X) raw segment idx:%d type:%s' % \
-            (start, end, i, type_str))
+        emit(start, end, 'raw', 'segment idx:%d type:%s' % (i, type_str))
 
         # If a dynamic program header / segment exists, but it wasn't tagged in a section,
         # tag it now. Some toolchains produce section-less binaries.
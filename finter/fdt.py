@@ -21,13 +21,26 @@ class TOKEN(Enum):
 # "main"
 ###############################################################################
 
+FDT_HEADER = StructLayout(
+    ('I', 'magic'),
+    ('I', 'totalsize'),
+    ('I', 'off_dt_struct'),
+    ('I', 'off_dt_strings'),
+    ('I', 'off_mem_rsvmap'),
+    ('I', 'version'),
+    ('I', 'last_comp_version'),
+    ('I', 'boot_cpuid_phys'),
+    ('I', 'size_dt_strings'),
+    ('I', 'size_dt_struct'))
+
+FDT_RESERVE_ENTRY = StructLayout(
+    ('Q', 'address'),
+    ('Q', 'size'))
+
 def tag_fdt_header(fp):
     start = fp.tell()
 
-    result = tagFormat(fp, 'IIIIIIIIII',
-        'magic', 'totalsize', 'off_dt_struct', 'off_dt_strings',
-        'off_mem_rsvmap', 'version', 'last_comp_version', 'boot_cpuid_phys',
-        'size_dt_strings', 'size_dt_struct')
+    result = tagStruct(fp, FDT_HEADER)
 
     tagFromPosition(fp, start, 'fdt_header')
 
@@ -35,8 +48,7 @@ def tag_fdt_header(fp):
 
 def tag_fdt_reserve_entry(fp):
     start = fp.tell()
-    tagUint64(fp, 'address')
-    tagUint64(fp, 'size')
+    tagStruct(fp, FDT_RESERVE_ENTRY)
     tagFromPosition(fp, start, 'fdt_reserve_entry')
 
 def tag_dt_strings(fp, size):
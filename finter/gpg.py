@@ -117,9 +117,12 @@ def litDataFmtToStr(fmt):
 # "main"
 ###############################################################################
 
-def analyze(fp):
+# yields after each packet so callers can consume intervals as they come, see dissect_file_iter()
+def analyze_iter(fp):
+    fp = reader(fp)
+
     # for each packet
-    while not IsEof(fp):
+    while not fp.eof():
         (hdrLen,bodyLen) = (0,0)
         oPacket = fp.tell()
 
@@ -163,7 +166,7 @@ def analyze(fp):
                     
                 body += fp.read(bodyLen)
 
-                if IsEof(fp) or not partial: 
+                if fp.eof() or not partial: 
                     break
 
         # parse old format
@@ -193,10 +196,9 @@ def analyze(fp):
             body = fp.read(bodyLen)
 
         # mark the whole packet
-        print("[0x%X,0x%X) header (%s)" % (oPacket, oPacket+hdrLen, hdrStyle))
-        print("[0x%X,0x%X) body" % (oPacket+hdrLen, oPacket+hdrLen+bodyLen))
-        print("[0x%X,0x%X) %s packet (Tag %d)" % \
-            (oPacket, fp.tell(), tagToStr(tagId), tagId))
+        emit(oPacket, oPacket+hdrLen, 'raw', "header (%s)" % hdrStyle)
+        emit(oPacket+hdrLen, oPacket+hdrLen+bodyLen, 'raw', "body")
+        emit(oPacket, fp.tell(), 'raw', "%s packet (Tag %d)" % (tagToStr(tagId), tagId))
 
         oPacketEnd = fp.tell()
 
@@ -234,6 +236,11 @@ def analyze(fp):
     
         # next packet
         fp.seek(oPacketEnd)
+        yield
+
+def analyze(fp):
+    for _ in analyze_iter(fp):
+        pass
 
 if __name__ == '__main__':
     import sys
@@ -16,7 +16,10 @@ from . import h264
 # "main"
 ###############################################################################
 
-def analyze(fp):
+# yields after each NAL unit so callers can consume intervals as they come, see dissect_file_iter()
+def analyze_iter(fp):
+    fp = reader(fp)
+
     setLittleEndian()
 
     code3 = b'\x00\x00\x01'
@@ -31,27 +34,31 @@ def analyze(fp):
     else:
         return
 
-    # precompute location of all start codes
-    #
-    # |code|nalu|code|nalu|...|code|nalu|
-    # ^         ^             ^
-    data = fp.read()
-    start_locs = []
-    i = 0
-    while True:
-        if (i := data.find(code, i)) == -1:
-            break
-        start_locs.append(i)
-        i += len(code)
+    # search the mapping directly when there is one, rather than copying the file
+    start = fp.tell()
+    if type(fp) is MmapReader:
+        (data, base) = (fp.map, 0)
+    else:
+        (data, base) = (fp.read(), start)
 
+    # find each start code only when the previous nalu is done
+    #
     # |code|nalu|code|nalu|...|code|nalu|
     # ^         ^
     # a         b
-    for a, b in zip(start_locs, start_locs[1:] + [len(data)]):
-        fp.seek(a)
+    a = data.find(code, start - base)
+    while a != -1:
+        b = data.find(code, a + len(code))
+        fp.seek(base + a)
         tag(fp, len(code), 'start code')
-        len_nalu = b - (a + len(code))
+        len_nalu = (len(data) if b == -1 else b) - (a + len(code))
         h264.tag_nalu(fp, len_nalu)
+        yield
+        a = b
+
+def analyze(fp):
+    for _ in analyze_iter(fp):
+        pass
 
 if __name__ == '__main__':
     import sys
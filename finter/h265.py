@@ -60,9 +60,11 @@ def tag_nalu(fp, length):
 ###############################################################################
 
 def analyze(fp):
+    fp = reader(fp)
+
     setLittleEndian()
 
-    while not IsEof(fp):
+    while not fp.eof():
         sclen, nalulen = seek_nalu(fp)
         tag(fp, sclen, 'start code')
         tag_nalu(fp, nalulen)
@@ -1,11 +1,18 @@
 #!/usr/bin/env python
 
 import io
+import os
 import sys
 import enum
+import mmap
+import stat
 import types
 import binascii
-from struct import pack, unpack
+import itertools
+import contextvars
+from struct import Struct, calcsize, pack, unpack, unpack_from, error as StructError
+
+import numpy as np
 
 ###############################################################################
 # color crap
@@ -90,15 +97,124 @@ def colorFromBytesfp(fp, length, peek=0):
 # fp conveniences
 ###############################################################################
 
+# file-like wrapper that knows where its data ends, so end-of-file and
+# remaining byte checks don't have to touch the file
+# - limit is the offset one past the last readable byte, default end of file
+# - reads never cross limit, seek(x, SEEK_END) is relative to limit
+class Reader():
+    def __init__(self, fp, limit=None):
+        self.fp = fp
+        if limit is None:
+            here = fp.tell()
+            limit = fp.seek(0, io.SEEK_END)
+            fp.seek(here)
+        self.limit = limit
+
+    def read(self, size=-1):
+        available = self.limit - self.fp.tell()
+        if size is None or size < 0 or size > available:
+            size = max(available, 0)
+        return self.fp.read(size)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_END:
+            return self.fp.seek(self.limit + offset)
+        return self.fp.seek(offset, whence)
+
+    def tell(self):
+        return self.fp.tell()
+
+    def eof(self):
+        return self.fp.tell() >= self.limit
+
+    def remaining(self):
+        return self.limit - self.fp.tell()
+
+    # closing a reader closes its file, eg: with reader(open(path, 'rb')) as fp:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # everything else (name, fileno, ...) goes to the wrapped file
+    def __getattr__(self, name):
+        return getattr(self.fp, name)
+
+# Reader over a memory map of the whole file
+# - .map is the mmap, .buf a memoryview of it, .pos the current offset
+# - the data accessors below unpack straight out of .buf, no read or seek calls
+class MmapReader(Reader):
+    def __init__(self, fp, limit=None):
+        self.fp = fp
+        self.map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buf = memoryview(self.map)
+        self.pos = fp.tell()
+        self.limit = len(self.map) if limit is None else limit
+
+    def read(self, size=-1):
+        start = self.pos
+        if size is None or size < 0 or start + size > self.limit:
+            end = max(start, self.limit)
+        else:
+            end = start + size
+        self.pos = end
+        return self.map[start:end]
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.limit
+        if offset < 0:
+            raise ValueError(f'negative seek position {offset}')
+        self.pos = offset
+        return offset
+
+    def tell(self):
+        return self.pos
+
+    def eof(self):
+        return self.pos >= self.limit
+
+    def remaining(self):
+        return self.limit - self.pos
+
+    # unmap, unless something still holds a view of the map (then it's
+    # unmapped when that goes), and close the file
+    def close(self):
+        try:
+            self.buf.release()
+            self.map.close()
+        except BufferError:
+            pass
+        self.fp.close()
+
+# wrap fp in a Reader unless it already is one, regular files get memory mapped
+def reader(fp):
+    if isinstance(fp, Reader):
+        return fp
+
+    try:
+        if stat.S_ISREG(os.fstat(fp.fileno()).st_mode):
+            return MmapReader(fp)
+    except (AttributeError, io.UnsupportedOperation, OSError, ValueError):
+        # no file descriptor (BytesIO), or can't map it (empty file)
+        pass
+
+    return Reader(fp)
+
 def IsEof(fp):
-    answer = False
+    if isinstance(fp, Reader):
+        return fp.eof()
     temp = fp.tell()
-    if fp.read() == b'':
-        answer = True
+    answer = fp.seek(0, io.SEEK_END) == temp
     fp.seek(temp)
     return answer
 
 def remaining(fp):
+    if isinstance(fp, Reader):
+        return fp.remaining()
     a = fp.tell()
     fp.seek(0, io.SEEK_END);
     b = fp.tell()
@@ -106,6 +222,8 @@ def remaining(fp):
     return b-a
 
 def peek(fp, amt):
+    if type(fp) is MmapReader:
+        return fp.map[fp.pos:min(fp.pos+amt, fp.limit)]
     value = fp.read(amt)
     fp.seek(-amt, io.SEEK_CUR)
     return value
@@ -117,97 +235,63 @@ def rewind(fp, amt):
 # endianness
 ###############################################################################
 
-endian = 'little'
+# struct formats for each byte order, the ones in use are the current context's
+ENDIAN_FORMATS = {
+    'little': {'endian': 'little', 'fmtu8': '<B', 'fmt8': '<b', 'fmtu16': '<H', 'fmt16': '<h',
+        'fmtu32': '<I', 'fmt32': '<i', 'fmtu64': '<Q', 'fmt64': '<q', 'fmtd': '<d'},
+    'big': {'endian': 'big', 'fmtu8': '>B', 'fmt8': '>b', 'fmtu16': '>H', 'fmt16': '>h',
+        'fmtu32': '>I', 'fmt32': '>i', 'fmtu64': '>Q', 'fmt64': '>q', 'fmtd': '>d'},
+}
 
-# default to little-endian
-fmtu8 = '<B'
-fmt8 = '<b'
-fmtu16 = '<H'
-fmt16 = '<h'
-fmtu32 = '<I'
-fmt32 = '<i'
-fmtu64 = '<Q'
-fmt64 = '<q'
-fmtd = '<d'
-
-def setLittleEndian():
-    global endian
-    old = endian
-
-    global fmt8, fmtu8, fmt16, fmtu16
-    global fmt32, fmtu32, fmt64, fmtu64
-    fmtu8 = '<B'
-    fmt8 = '<b'
-    fmtu16 = '<H'
-    fmt16 = '<h'
-    fmtu32 = '<I'
-    fmt32 = '<i'
-    fmtu64 = '<Q'
-    fmt64 = '<q'
-    fmtd = '<d'
-
-    endian = 'little'
-    return old
+# install byte order 'little' or 'big', returning the old one so callers can restore it
+def setEndian(what):
+    if not what in ENDIAN_FORMATS:
+        raise Exception(f'unknown endian: {what}')
 
-def setBigEndian():
-    global endian
-    old = endian
-
-    global fmt8, fmtu8, fmt16, fmtu16
-    global fmt32, fmtu32, fmt64, fmtu64
-    fmtu8 = '>B'
-    fmt8 = '>b'
-    fmtu16 = '>H'
-    fmt16 = '>h'
-    fmtu32 = '>I'
-    fmt32 = '>i'
-    fmtu64 = '>Q'
-    fmt64 = '>q'
-    fmtd = '>d'
-
-    endian = 'big'
+    ctx = context.get()
+    old = ctx.endian
+    vars(ctx).update(ENDIAN_FORMATS[what])
     return old
 
-def setEndian(what):
-    if what == 'little':
-        return setLittleEndian()
-    elif what == 'big':
-        return setBigEndian()
+def setLittleEndian():
+    return setEndian('little')
 
-    raise Exception(f'unknown endian: {what}')
+def setBigEndian():
+    return setEndian('big')
 
 ###############################################################################
 # data accessors
 ###############################################################################
 
-def int8(fp, peek=0):
-    global fmt8
-    value = unpack(fmt8, fp.read(1))[0]
-    if peek: fp.seek(-1,1)
+# unpack one value of <size> bytes at the current position
+def unpack_value(fp, fmt, size, peek):
+    if type(fp) is MmapReader:
+        pos = fp.pos
+        if pos + size > fp.limit:
+            raise StructError(f'unpack requires a buffer of {size} bytes')
+        value = unpack_from(fmt, fp.buf, pos)[0]
+        if not peek: fp.pos = pos + size
+        return value
+
+    value = unpack(fmt, fp.read(size))[0]
+    if peek: fp.seek(-size,1)
     return value
 
+def int8(fp, peek=0):
+    return unpack_value(fp, context.get().fmt8, 1, peek)
+
 def uint8(fp, peek=0):
-    global fmtu8
-    value = unpack(fmtu8, fp.read(1))[0]
-    if peek: fp.seek(-1,1)
-    return value
+    return unpack_value(fp, context.get().fmtu8, 1, peek)
 
 def int16(fp, peek=0):
-    global fmt16
-    value = unpack(fmt16, fp.read(2))[0]
-    if peek: fp.seek(-2,1)
-    return value
+    return unpack_value(fp, context.get().fmt16, 2, peek)
 
 def uint16(fp, peek=0):
-    global fmtu16
-    value = unpack(fmtu16, fp.read(2))[0]
-    if peek: fp.seek(-2,1)
-    return value
+    return unpack_value(fp, context.get().fmtu16, 2, peek)
 
 def uint24(fp, peek=0):
-    global endian
     data = fp.read(3)
-    if endian == 'little':
+    if context.get().endian == 'little':
         value = (data[0] << 16) | (data[1] << 8) | data[2]
     else:
         value = (data[2] << 16) | (data[1] << 8) | data[0]
@@ -215,38 +299,41 @@ def uint24(fp, peek=0):
     return value
 
 def int32(fp, peek=0):
-    global fmt32
-    value = unpack(fmt32, fp.read(4))[0]
-    if peek: fp.seek(-4,1)
-    return value
+    return unpack_value(fp, context.get().fmt32, 4, peek)
 
 def uint32(fp, peek=0):
-    global fmtu32
-    value = unpack(fmtu32, fp.read(4))[0]
-    if peek: fp.seek(-4,1)
-    return value
+    return unpack_value(fp, context.get().fmtu32, 4, peek)
 
 def int64(fp, peek=0):
-    global fmt64
-    value = unpack(fmt64, fp.read(8))[0]
-    if peek: fp.seek(-8,1)
-    return value
+    return unpack_value(fp, context.get().fmt64, 8, peek)
 
 def uint64(fp, peek=0):
-    global fmtu64
-    value = unpack(fmtu64, fp.read(8))[0]
-    if peek: fp.seek(-8,1)
-    return value
+    return unpack_value(fp, context.get().fmtu64, 8, peek)
 
 def double(fp, peek=0):
-    global fmtd
-    value = unpack(fmtd, fp.read(8))[0]
-    if peek: fp.seek(-8,1)
-    return value
+    return unpack_value(fp, context.get().fmtd, 8, peek)
 
 def uleb128(fp, peek=0):
     anchor = fp.tell()
 
+    if type(fp) is MmapReader:
+        buf = fp.buf
+        limit = min(anchor + 7, fp.limit)
+        pos = anchor
+        value = 0
+        while pos < limit:
+            t = buf[pos]
+            value = value | ((t & 0x7F)<<(7*(pos-anchor)))
+            pos += 1
+            if not (t & 0x80):
+                if not peek: fp.pos = pos
+                return (value, pos-anchor)
+
+        if pos < fp.limit:
+            sample = binascii.hexlify(buf[anchor:anchor+5])
+            raise Exception("invalid uleb128 at offs=0x%X %s..." % (anchor, sample))
+        raise StructError('unpack requires a buffer of 1 bytes')
+
     nbytes = 0
     value = 0
     while 1:
@@ -275,6 +362,10 @@ def string(fp, length, peek=0):
 
 # null-terminated string
 def string_null(fp, peek=0):
+	if type(fp) is MmapReader:
+		# the data runs to the end when there's no terminator
+		return dataUntil(fp, b'\x00', peek).removesuffix(b'\x00').decode('utf-8')
+
 	buf = b''
 	while not buf.endswith(b'\x00'):
 		buf += fp.read(1)
@@ -283,6 +374,14 @@ def string_null(fp, peek=0):
 
 #
 def dataUntil(fp, terminator, peek=0):
+    if type(fp) is MmapReader:
+        # without a terminator, the data runs to the end
+        start = fp.pos
+        end = fp.map.find(terminator, start, fp.limit)
+        end = fp.limit if end == -1 else end + len(terminator)
+        if not peek: fp.pos = end
+        return fp.map[start:end]
+
     data = b''
     lenterm = len(terminator)
     while 1:
@@ -294,6 +393,132 @@ def dataUntil(fp, terminator, peek=0):
     if peek: fp.seek(-len(data), 1)
     return data
 
+###############################################################################
+# interval sinks
+###############################################################################
+
+# dissectors report intervals to the current sink rather than printing them
+# - TextSink writes the "[0x0,0x40) raw elf64_hdr" text protocol to stdout (or a file)
+# - ListSink collects (begin, end, type_, comment) tuples in memory
+# - intervals() takes a batch of such tuples at once, see tagStruct()
+
+class TextSink():
+    # fp=None is whatever sys.stdout is at the time
+    def __init__(self, fp=None):
+        self.fp = fp
+
+    def interval(self, begin, end, type_, comment):
+        print('[0x%X,0x%X) %s %s' % (begin, end, type_, comment), file=self.fp)
+
+    def intervals(self, records):
+        if records:
+            print('\n'.join('[0x%X,0x%X) %s %s' % r for r in records), file=self.fp)
+
+    def note(self, text):
+        print('// %s' % text, file=self.fp)
+
+class ListSink():
+    def __init__(self):
+        self.records = []
+
+    def interval(self, begin, end, type_, comment):
+        self.records.append((begin, end, type_, comment))
+
+    def intervals(self, records):
+        self.records.extend(records)
+
+    def note(self, text):
+        pass
+
+# install a new sink, returning the old one so callers can restore it
+def setSink(new):
+    ctx = context.get()
+    (old, ctx.sink) = (ctx.sink, new)
+    return old
+
+def emit(begin, end, type_, comment=''):
+    context.get().sink.interval(begin, end, type_, comment)
+
+# report a batch of (begin, end, type_, comment) tuples
+def emit_all(records):
+    context.get().sink.intervals(records)
+
+# debugging text, not an interval
+def note(text):
+    context.get().sink.note(text)
+
+###############################################################################
+# query window
+###############################################################################
+
+# (lo, hi) when only intervals overlapping [lo, hi) are wanted, else None
+# - WindowSink drops the other intervals on their way to the real sink
+# - dissectors call overlaps() and pastWindow() to skip records and tables
+#   that can't produce anything inside the window
+
+class WindowSink():
+    def __init__(self, inner, lo, hi):
+        self.inner = inner
+        (self.lo, self.hi) = (lo, hi)
+
+    def interval(self, begin, end, type_, comment):
+        if begin < self.hi and end > self.lo:
+            self.inner.interval(begin, end, type_, comment)
+
+    def intervals(self, records):
+        (lo, hi) = (self.lo, self.hi)
+        self.inner.intervals([r for r in records if r[0] < hi and r[1] > lo])
+
+    def note(self, text):
+        self.inner.note(text)
+
+# install a new window, returning the old one so callers can restore it
+def setWindow(new):
+    ctx = context.get()
+    (old, ctx.window) = (ctx.window, new)
+    return old
+
+def overlaps(begin, end):
+    window = context.get().window
+    return window is None or (begin < window[1] and end > window[0])
+
+# nothing at or after offset can overlap the window
+def pastWindow(offset):
+    window = context.get().window
+    return window is not None and offset >= window[1]
+
+###############################################################################
+# context
+###############################################################################
+
+# the byte order, sink and window a dissection runs with
+# - the current one is a context variable, so each thread (and asyncio task)
+#   dissecting under use_context() sees only its own
+# - code not installing one shares the default, like scripts always have
+# - use_context() installs another, eg: a fresh one per file, or a paused
+#   analyze_iter() generator's while it takes a step
+# - dissectors keep state spanning records (packet numbers, link types, ...)
+#   in locals or objects of their own, never in module globals
+class Context():
+    def __init__(self, sink=None, window=None, endian='little'):
+        self.sink = TextSink() if sink is None else sink
+        self.window = window
+        vars(self).update(ENDIAN_FORMATS[endian])
+
+context = contextvars.ContextVar('finter_context', default=Context())
+
+# install a context, returning the old one so callers can restore it
+def use_context(ctx):
+    old = context.get()
+    context.set(ctx)
+    return old
+
+# helpers.sink, helpers.window, helpers.endian, helpers.fmtu32, ... read the current context
+def __getattr__(name):
+    if name in ('sink', 'window') or name in ENDIAN_FORMATS['little']:
+        return getattr(context.get(), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 ###############################################################################
 # taggers
 ###############################################################################
@@ -304,9 +529,9 @@ def tag(fp, length, name, comment='', peek=False, rewind=False):
     if type(comment) == types.FunctionType: comment = comment(val)
 
     if name:
-        print('[0x%X,0x%X) raw %s %s' % (pos, pos+length, name, comment))
+        emit(pos, pos+length, 'raw', '%s %s' % (name, comment))
     else:
-        print('[0x%X,0x%X) raw %s' % (pos, pos+length, comment))
+        emit(pos, pos+length, 'raw', str(comment))
 
     if peek or rewind: fp.seek(pos)
     return val
@@ -327,9 +552,9 @@ def tagUint8(fp, name, comment='', peek=0):
     val = uint8(fp, peek)
     if type(comment) == types.FunctionType: comment = comment(val)
     if name:
-        print('[0x%X,0x%X) %s %s=0x%X %s' % (pos, pos+1, fmtu8, name, val, comment))
+        emit(pos, pos+1, context.get().fmtu8, '%s=0x%X %s' % (name, val, comment))
     else:
-        print('[0x%X,0x%X) %s 0x%X %s' % (pos, pos+1, fmtu8, val, comment))
+        emit(pos, pos+1, context.get().fmtu8, '0x%X %s' % (val, comment))
     return val
 
 def tagUint16(fp, name, comment='', peek=0):
@@ -337,9 +562,9 @@ def tagUint16(fp, name, comment='', peek=0):
     val = uint16(fp, peek)
     if type(comment) == types.FunctionType: comment = comment(val)
     if name:
-        print('[0x%X,0x%X) %s %s=0x%X %s' % (pos, pos+2, fmtu16, name, val, comment))
+        emit(pos, pos+2, context.get().fmtu16, '%s=0x%X %s' % (name, val, comment))
     else:
-        print('[0x%X,0x%X) %s 0x%X %s' % (pos, pos+2, fmtu16, val, comment))
+        emit(pos, pos+2, context.get().fmtu16, '0x%X %s' % (val, comment))
     return val
 
 def tagInt16(fp, name, comment='', peek=0):
@@ -347,18 +572,18 @@ def tagInt16(fp, name, comment='', peek=0):
     val = int16(fp, peek)
     if type(comment) == types.FunctionType: comment = comment(val)
     if name:
-        print('[0x%X,0x%X) %s %s=0x%X %s' % (pos, pos+2, fmt16, name, val, comment))
+        emit(pos, pos+2, context.get().fmt16, '%s=0x%X %s' % (name, val, comment))
     else:
-        print('[0x%X,0x%X) %s 0x%X %s' % (pos, pos+2, fmt16, val, comment))
+        emit(pos, pos+2, context.get().fmt16, '0x%X %s' % (val, comment))
 
 def tagUint24(fp, name, comment='', peek=0):
     pos = fp.tell()
     val = uint24(fp, peek)
     if type(comment) == types.FunctionType: comment = comment(val)
     if name:
-        print('[0x%X,0x%X) %s %s=0x%X %s' % (pos, pos+3, 'raw', name, val, comment))
+        emit(pos, pos+3, 'raw', '%s=0x%X %s' % (name, val, comment))
     else:
-        print('[0x%X,0x%X) %s 0x%X %s' % (pos, pos+3, 'raw', val, comment))
+        emit(pos, pos+3, 'raw', '0x%X %s' % (val, comment))
     return val
 
 def tagUint32(fp, name, comment='', peek=0):
@@ -366,9 +591,9 @@ def tagUint32(fp, name, comment='', peek=0):
     val = uint32(fp, peek)
     if type(comment) == types.FunctionType: comment = comment(val)
     if name:
-        print('[0x%X,0x%X) %s %s=0x%X %s' % (pos, pos+4, fmtu32, name, val, comment))
+        emit(pos, pos+4, context.get().fmtu32, '%s=0x%X %s' % (name, val, comment))
     else:
-        print('[0x%X,0x%X) %s 0x%X %s' % (pos, pos+4, fmtu32, val, comment))
+        emit(pos, pos+4, context.get().fmtu32, '0x%X %s' % (val, comment))
     return val
 
 def tagInt32(fp, name, comment='', peek=0):
@@ -376,9 +601,9 @@ def tagInt32(fp, name, comment='', peek=0):
     val = int32(fp, peek)
     if type(comment) == types.FunctionType: comment = comment(val)
     if name:
-        print('[0x%X,0x%X) %s %s=0x%X %s' % (pos, pos+4, fmt32, name, val, comment))
+        emit(pos, pos+4, context.get().fmt32, '%s=0x%X %s' % (name, val, comment))
     else:
-        print('[0x%X,0x%X) %s 0x%X %s' % (pos, pos+4, fmt32, val, comment))
+        emit(pos, pos+4, context.get().fmt32, '0x%X %s' % (val, comment))
     return val
 
 def tagUint64(fp, name, comment='', peek=0):
@@ -386,9 +611,9 @@ def tagUint64(fp, name, comment='', peek=0):
     val = uint64(fp, peek)
     if type(comment) == types.FunctionType: comment = comment(val)
     if name:
-        print('[0x%X,0x%X) %s %s=0x%X %s' % (pos, pos+8, fmtu64, name, val, comment))
+        emit(pos, pos+8, context.get().fmtu64, '%s=0x%X %s' % (name, val, comment))
     else:
-        print('[0x%X,0x%X) %s 0x%X %s' % (pos, pos+8, fmtu64, val, comment))
+        emit(pos, pos+8, context.get().fmtu64, '0x%X %s' % (val, comment))
     return val
 
 def tagInt64(fp, name, comment='', peek=0):
@@ -396,9 +621,9 @@ def tagInt64(fp, name, comment='', peek=0):
     val = int64(fp, peek)
     if type(comment) == types.FunctionType: comment = comment(val)
     if name:
-        print('[0x%X,0x%X) %s %s=%d %s' % (pos, pos+8, fmt64, name, val, comment))
+        emit(pos, pos+8, context.get().fmt64, '%s=%d %s' % (name, val, comment))
     else:
-        print('[0x%X,0x%X) %s %d %s' % (pos, pos+8, fmt64, val, comment))
+        emit(pos, pos+8, context.get().fmt64, '%d %s' % (val, comment))
     return val
 
 def tagDouble(fp, name, comment='', peek=0):
@@ -406,9 +631,9 @@ def tagDouble(fp, name, comment='', peek=0):
     val = double(fp, peek)
     if type(comment) == types.FunctionType: comment = comment(val)
     if name:
-        print('[0x%X,0x%X) %s %s=%f %s' % (pos, pos+8, fmtd, name, val, comment))
+        emit(pos, pos+8, context.get().fmtd, '%s=%f %s' % (name, val, comment))
     else:
-        print('[0x%X,0x%X) %s %f %s' % (pos, pos+8, fmtd, val, comment))
+        emit(pos, pos+8, context.get().fmtd, '%f %s' % (val, comment))
     return val
 
 def tagUleb128(fp, name, comment='', peek=0):
@@ -416,18 +641,18 @@ def tagUleb128(fp, name, comment='', peek=0):
     (val, length) = uleb128(fp, peek)
     if type(comment) == types.FunctionType: comment = comment(val)
     if name:
-        print('[0x%X,0x%X) uleb128 %s=0x%X %s' % (pos, pos+length, name, val, comment))
+        emit(pos, pos+length, 'uleb128', '%s=0x%X %s' % (name, val, comment))
     else:
-        print('[0x%X,0x%X) uleb128 0x%X %s' % (pos, pos+length, val, comment))
+        emit(pos, pos+length, 'uleb128', '0x%X %s' % (val, comment))
     return val
 
 def tagString(fp, length, name, peek=0):
     pos = fp.tell()
     val = string(fp, length, peek)
     if name:
-        print('[0x%X,0x%X) string %s=\"%s\"' % (pos, pos+length, name, val))
+        emit(pos, pos+length, 'string', '%s="%s"' % (name, val))
     else:
-        print('[0x%X,0x%X) string \"%s\"' % (pos, pos+length, val))
+        emit(pos, pos+length, 'string', '"%s"' % val)
     return val
 
 def tagStringNull(fp, name, peek=0):
@@ -435,9 +660,9 @@ def tagStringNull(fp, name, peek=0):
     val = string_null(fp, peek)
     length = len(val) + 1
     if name:
-        print('[0x%X,0x%X) string %s=\"%s\"' % (pos, pos+length, name, val))
+        emit(pos, pos+length, 'string', '%s="%s"' % (name, val))
     else:
-        print('[0x%X,0x%X) string \"%s\"' % (pos, pos+length, val))
+        emit(pos, pos+length, 'string', '"%s"' % val)
     return val
 
 def tagDataUntil(fp, term, name, comment, peek=0):
@@ -445,27 +670,185 @@ def tagDataUntil(fp, term, name, comment, peek=0):
     data = dataUntil(fp, term, peek)
     if type(comment) == types.FunctionType: comment = comment(val)
     if name:
-        print('[0x%X,0x%X) raw %s=\"%s\" %s' % (pos, pos+len(data), name, data, comment))
+        emit(pos, pos+len(data), 'raw', '%s="%s" %s' % (name, data, comment))
     else:
-        print('[0x%X,0x%X) raw \"%s\" %s' % (pos, pos+len(data), data, comment))
+        emit(pos, pos+len(data), 'raw', '"%s" %s' % (data, comment))
     return data
 
-def tagFormat(fp, fmt, *names):
-    assert len(fmt) == len(names)
+# fixed layout record for tagStruct(), fields are (format, name) or (format, name, comment)
+# - format is a struct code: B b H h I i Q q d, '<n>s' for n raw bytes, or
+#   '<n>z' for an n byte string (eats trailing nulls, like string())
+# - comment is a string or a function of the field value, like the tagUint32() comment
+# eg: StructLayout(('I', 'magic'), ('H', 'flags', flags_tostr), ('8s', 'reserved'))
+class StructLayout():
+    def __init__(self, *fields):
+        self.fields = []
+        self.fmt = ''
+        self.size = 0
+
+        for field in fields:
+            (code, name) = field[0:2]
+            comment = field[2] if len(field) > 2 else ''
+            assert name
+            escaped = name.replace('%', '%%')
+
+            if code[-1] == 'z':
+                code = code[:-1] + 's'
+                (kind, template) = ('string', escaped + '="%s"')
+            elif code[-1] == 's':
+                (kind, template) = ('raw', escaped + ' %s')
+            elif code == 'q':
+                (kind, template) = (code, escaped + '=%d %s')
+            elif code == 'd':
+                (kind, template) = (code, escaped + '=%f %s')
+            else:
+                (kind, template) = (code, escaped + '=0x%X %s')
+
+            length = calcsize('<' + code)
+            self.fields.append((name, kind, self.size, length, template, comment))
+            self.fmt += code
+            self.size += length
+
+        # (struct.Struct, fields with resolved types) per endianness, built on first use
+        self.compiled = {}
+        self.dtypes = {}
+
+    def compile(self):
+        prefix = context.get().fmtu8[0]
+        result = self.compiled.get(prefix)
+        if result is None:
+            fields = []
+            for (name, kind, offset, length, template, comment) in self.fields:
+                type_ = kind if kind in ('raw', 'string') else prefix + kind
+                dynamic = type(comment) == types.FunctionType
+                fields.append((name, kind, type_, offset, length, template, comment, dynamic))
+            result = self.compiled[prefix] = (Struct(prefix + self.fmt), fields)
+        return result
 
-    result = {}
+    # numpy structured dtype for the current endianness, see tagArray()
+    def dtype(self):
+        prefix = context.get().fmtu8[0]
+        result = self.dtypes.get(prefix)
+        if result is None:
+            spec = []
+            for (name, kind, offset, length, template, comment) in self.fields:
+                spec.append((name, 'V%d' % length if kind in ('raw', 'string') else prefix + kind))
+            result = self.dtypes[prefix] = np.dtype(spec)
+            assert result.itemsize == self.size
+        return result
 
-    for i in range(len(fmt)):
-        fchar = fmt[i]
-        name = names[i]
+# tag every field of a StructLayout from one unpack, returns {name: value}
+def tagStruct(fp, layout, peek=0):
+    (s, fields) = layout.compile()
+    pos = fp.tell()
+
+    if type(fp) is MmapReader:
+        if pos + s.size > fp.limit:
+            raise StructError(f'unpack requires a buffer of {s.size} bytes')
+        values = s.unpack_from(fp.buf, pos)
+        if not peek: fp.pos = pos + s.size
+    else:
+        values = s.unpack(fp.read(s.size))
+        if peek: fp.seek(pos)
 
-        if fchar == 'I':
-            result[name] = tagUint32(fp, name)
+    # outside the window only the values are wanted
+    tagging = overlaps(pos, pos + s.size)
+
+    result = {}
+    records = []
+    for ((name, kind, type_, offset, length, template, comment, dynamic), val) in zip(fields, values):
+        if kind == 'string':
+            val = val.rstrip(b'\x00').decode('utf-8')
+        result[name] = val
+
+        if not tagging:
+            continue
+
+        if dynamic: comment = comment(val)
+        begin = pos + offset
+
+        if kind == 'string':
+            records.append((begin, begin+length, type_, template % val))
+        elif kind == 'raw':
+            records.append((begin, begin+length, type_, template % comment))
         else:
-            assert False
+            records.append((begin, begin+length, type_, template % (val, comment)))
 
+    if records:
+        emit_all(records)
     return result
 
+# tag an array of <count> StructLayout records, returns them as a numpy structured array
+# - the table is read once and decoded per column rather than per record
+# - label names each record: a string, or a function of the whole array returning one string per record
+# - comments overrides field comments with functions of the whole array, also one string per record
+# - per-value layout comments are only called once for each distinct value
+# eg: tagArray(fp, ELF64_SYM, n, lambda a: ['sym %d' % i for i in range(len(a))])
+def tagArray(fp, layout, count, label, comments={}):
+    pos = fp.tell()
+    dtype = layout.dtype()
+    data = fp.read(layout.size * count)
+    if len(data) != layout.size * count:
+        raise StructError(f'array requires a buffer of {layout.size * count} bytes')
+    table = np.frombuffer(data, dtype=dtype)
+
+    # a table entirely outside the window is read but not tagged
+    if not overlaps(pos, pos + len(data)):
+        return table
+
+    (_, fields) = layout.compile()
+    size = layout.size
+
+    if type(label) == str:
+        label = itertools.repeat(label, count)
+    elif type(label) == types.FunctionType:
+        label = label(table)
+
+    columns = [zip(range(pos, pos+size*count, size), range(pos+size, pos+size*(count+1), size),
+        itertools.repeat('raw'), label)]
+
+    for (name, kind, type_, offset, length, template, comment, dynamic) in fields:
+        if kind in ('raw', 'string'):
+            values = [bytes(v) for v in table[name].tolist()]
+        else:
+            values = table[name].tolist()
+
+        if name in comments:
+            notes = comments[name](table)
+        elif dynamic:
+            (distinct, inverse) = np.unique(table[name], return_inverse=True)
+            distinct = [comment(bytes(v) if kind in ('raw', 'string') else v) for v in distinct.tolist()]
+            notes = [distinct[i] for i in inverse.tolist()]
+        else:
+            notes = itertools.repeat(comment, count)
+
+        if kind == 'string':
+            texts = [template % v.rstrip(b'\x00').decode('utf-8') for v in values]
+        elif kind == 'raw':
+            texts = [template % c for c in notes]
+        else:
+            texts = [template % vc for vc in zip(values, notes)]
+
+        begin = pos + offset
+        columns.append(zip(range(begin, begin+size*count, size), range(begin+length, begin+length+size*count, size),
+            itertools.repeat(type_), texts))
+
+    # each record followed by its fields, like the tag(..., peek=True) then tagUint32() idiom
+    if count:
+        emit_all(list(itertools.chain.from_iterable(zip(*columns))))
+    return table
+
+# eg: tagFormat(fp, 'IIH', 'magic', 'size', 'flags')
+formatLayouts = {}
+def tagFormat(fp, fmt, *names):
+    assert len(fmt) == len(names)
+
+    layout = formatLayouts.get((fmt, names))
+    if layout is None:
+        layout = formatLayouts[(fmt, names)] = StructLayout(*zip(fmt, names))
+
+    return tagStruct(fp, layout)
+
 def tagPaddingUntilAlignment(fp, alignment):
     residue = fp.tell() % alignment
     if residue:
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+#
+# identify which dissector applies to a file from a bounded sample of it,
+# without running `file`
+#
+# each signature is a magic byte string at an offset, an optional check on
+# the sample (which may also pick between dissectors, eg: elf32 vs. elf64),
+# and a confidence
+
+import os
+import re
+
+# bytes read from the head of the file, checks needing more use Sample.at()
+HEAD_SIZE = 4096
+
+# confidences
+CERTAIN = 100   # magic and structure check out
+STRONG = 80     # long magic
+WEAK = 40       # short or common magic
+EXTENSION = 10  # file name only
+
+###############################################################################
+# sample of a file
+###############################################################################
+
+class Sample(object):
+    def __init__(self, fp, offset=0):
+        self.fp = fp
+        self.offset = offset
+        fp.seek(0, os.SEEK_END)
+        self.size = fp.tell() - offset
+        fp.seek(offset)
+        self.head = fp.read(HEAD_SIZE)
+
+    # <length> bytes at <offset> (negative is from the end), read from the head if possible
+    def at(self, offset, length):
+        if offset < 0:
+            offset += self.size
+        if offset < 0:
+            return b''
+        if offset + length <= len(self.head):
+            return self.head[offset:offset+length]
+        self.fp.seek(self.offset + offset)
+        return self.fp.read(length)
+
+###############################################################################
+# checks, given a Sample, return the dissector name (or None if no match)
+###############################################################################
+
+# the format's modules are imported only once their magic matched, the
+# dissector would import them anyway
+
+# e_ident, see elf.idHeader()
+def checkElf(sample):
+    from . import elf
+    return elf.idHeader(sample.head)
+
+# follow e_lfanew to the PE signature and machine, see pe.idImage()
+def checkPe(sample):
+    from . import pe
+    if (result := pe.idImage(sample.size, sample.at)) in ['pe32', 'pe64']:
+        return result
+
+# NAL unit header after the start code: forbidden_zero_bit clear, nal_unit_type set
+def checkAnnexB(sample):
+    if len(sample.head) > 4 and not sample.head[4] & 0x80 and sample.head[4] & 0x1F:
+        return 'h264_annexb'
+
+# Certificate SEQUENCE { TBSCertificate SEQUENCE { [0] version (v3) or INTEGER serial (v1)
+def checkX509(sample):
+    if sample.head[4:6] == b'\x30\x82' and (sample.head[8:10] == b'\xa0\x03' or sample.head[8:9] == b'\x02'):
+        return 'x509_der'
+
+def checkRel(sample):
+    if re.match(rb'[XDQ][HL][234]\x0a', sample.head[0:4]):
+        return 'rel'
+
+###############################################################################
+# signature table
+###############################################################################
+
+# (name, offset, magic, confidence, check, extension)
+signatures = []
+
+# name is the dissector (module in finter/) matched, a check may return a different one
+def register(name, magic=b'', offset=0, confidence=STRONG, check=None, extension=None):
+    global compiled
+    signatures.append((name, offset, magic, confidence, check, extension))
+    compiled = None
+
+register('elf64', b'\x7fELF', confidence=CERTAIN, check=checkElf)
+register('pe32', b'MZ', confidence=CERTAIN, check=checkPe)
+register('exe', b'MZ', confidence=WEAK)
+register('x509_der', b'\x30\x82', confidence=STRONG, check=checkX509)
+register('x509_der', b'\x30\x82', confidence=WEAK, extension=('.der', '.cer'))
+register('dex', b'dex\x0a035\x00')
+register('dex', b'dex\x0a037\x00')
+for magic in [b'\xfe\xed\xfa\xce', b'\xce\xfa\xed\xfe', b'\xfe\xed\xfa\xcf', b'\xcf\xfa\xed\xfe']:
+    register('macho', magic)
+register('wav', b'WAVE', offset=8, check=lambda s: 'wav' if s.head[0:4] == b'RIFF' else None)
+register('combo_boot', b'COMBO_BOOT\x00\x00', confidence=CERTAIN)
+register('uboot', b'\x27\x05\x19\x56')
+register('pcapng', b'\x0a\x0d\x0d\x0a')
+register('pcapng', extension='.pcapng', confidence=EXTENSION)
+register('pcap', b'\xd4\xc3\xb2\xa1')
+register('pcap', b'\xa1\xb2\xc3\xd4')
+register('ar', b'!<arch>\x0a')
+register('gpg', b'\x8c\x0d\x04', confidence=WEAK)
+register('avb', b'AVB0')
+register('atags', b'\x01\x00\x41\x54', offset=4)
+register('fdt', b'\xd0\x0d\xfe\xed')
+register('saleae_bin', b'<SALEAE>')
+register('sfdp', b'SFDP')
+register('mkv', b'\x1a\x45\xdf\xa3', confidence=WEAK)
+register('h264_annexb', b'\x00\x00\x00\x01', confidence=WEAK, check=checkAnnexB)
+register('mpeg', b'\x00\x00\x01\xba', confidence=WEAK) # pack header
+register('mpeg', b'\x00\x00\x01\xb3', confidence=WEAK) # sequence header
+register('mkv', extension='.mkv', confidence=EXTENSION)
+register('rel', extension='.rel', confidence=EXTENSION, check=checkRel)
+register('ihx', extension='.ihx', confidence=EXTENSION)
+
+# {(offset, length): {magic: [signature, ...]}} so each (offset, length) costs one slice and lookup
+compiled = None
+
+def compile_signatures():
+    global compiled
+    compiled = {}
+    for sig in signatures:
+        (name, offset, magic, confidence, check, extension) = sig
+        compiled.setdefault((offset, len(magic)), {}).setdefault(magic, []).append(sig)
+    return compiled
+
+###############################################################################
+# API
+###############################################################################
+
+# return [(confidence, name), ...] best first, for the file open as <fp> with path <fpath>
+def identify_fp(fp, fpath='', offset=0):
+    sample = Sample(fp, offset)
+
+    scores = {}
+    for ((sig_offset, length), magics) in (compiled or compile_signatures()).items():
+        for (name, _, _, confidence, check, extension) in magics.get(sample.head[sig_offset:sig_offset+length], []):
+            if extension and not fpath.endswith(extension):
+                continue
+            if check and not (name := check(sample)):
+                continue
+            scores[name] = max(confidence, scores.get(name, 0))
+
+    return sorted(((c, n) for (n, c) in scores.items()), reverse=True)
+
+def identify(fpath, offset=0):
+    with open(fpath, 'rb') as fp:
+        return identify_fp(fp, fpath, offset)
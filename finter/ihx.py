@@ -8,9 +8,11 @@ from struct import unpack
 from .helpers import *
 
 def analyze(fp):
+    fp = reader(fp)
+
     fp.seek(0)
 
-    while not IsEof(fp):
+    while not fp.eof():
         line = dataUntil(fp, b'\x0a', 1).decode('utf-8')
        
         m = re.match(r'^:(..)(....)00(.*)(..)', line)
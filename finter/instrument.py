@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+#
+# optional profiling of dissections
+#
+# enable() swaps every tag* primitive and every function of the dissector
+# modules for a wrapper counting calls, bytes consumed (movement of the reader
+# given as first argument), intervals emitted and time; nothing is wrapped
+# until then, so a run without it pays nothing
+#
+# phase() times the stages around dissection: identify, dissect, parse, tree
+# build, render
+#
+# dissections may run on several threads (eg: in daemon.py), each keeps its own
+# call stack in a ThreadState, the totals are shared under a lock
+
+import sys
+import time
+import types
+import functools
+import threading
+import contextlib
+
+from . import helpers
+
+enabled = False
+
+# name -> [calls, bytes, intervals, total seconds, self seconds]
+stats = {}
+
+# phase -> [calls, seconds]
+phases = {}
+
+# guards stats and phases
+lock = threading.Lock()
+
+class ThreadState(threading.local):
+    def __init__(self):
+        # intervals emitted so far, counted by the emit() and emit_all() wrappers
+        self.emitted = 0
+        # time spent in wrapped callees of each active wrapped call
+        self.child_time = []
+
+state = ThreadState()
+
+# modules that aren't dissectors
+SKIP = {'finter.helpers', 'finter.identify', 'finter.registry', 'finter.instrument'}
+
+# original function -> wrapper
+wrappers = {}
+
+# inspect.CO_GENERATOR, without importing inspect
+CO_GENERATOR = 0x20
+
+###############################################################################
+# wrappers
+###############################################################################
+
+def record(stat, elapsed, consumed, intervals):
+    child_time = state.child_time
+    self_ = elapsed - child_time.pop()
+    if child_time:
+        child_time[-1] += elapsed
+    with lock:
+        stat[0] += 1
+        stat[1] += max(consumed, 0)
+        stat[2] += intervals
+        stat[3] += elapsed
+        stat[4] += self_
+
+def position(args):
+    if args and hasattr(args[0], 'tell'):
+        try:
+            return args[0].tell()
+        except (ValueError, OSError):
+            pass
+    return None
+
+def wrap(name, func):
+    stat = stats.setdefault(name, [0, 0, 0, 0.0, 0.0])
+
+    if func.__code__.co_flags & CO_GENERATOR:
+        # time each step of the generator, not the consumer between steps
+        def wrapper(*args, **kwargs):
+            steps = func(*args, **kwargs)
+            while True:
+                (pos, count) = (position(args), state.emitted)
+                state.child_time.append(0.0)
+                t0 = time.perf_counter()
+                try:
+                    value = next(steps)
+                except StopIteration:
+                    return
+                finally:
+                    after = position(args)
+                    record(stat, time.perf_counter() - t0, after - pos if pos is not None and after is not None else 0, state.emitted - count)
+                yield value
+    else:
+        def wrapper(*args, **kwargs):
+            (pos, count) = (position(args), state.emitted)
+            state.child_time.append(0.0)
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                after = position(args)
+                record(stat, time.perf_counter() - t0, after - pos if pos is not None and after is not None else 0, state.emitted - count)
+
+    # keep __module__ and __name__, dissect_file() uses analyze.__module__
+    functools.update_wrapper(wrapper, func)
+    wrapper.instrumented = True
+    return wrapper
+
+def counting_emit(begin, end, type_, comment=''):
+    state.emitted += 1
+    helpers.context.get().sink.interval(begin, end, type_, comment)
+
+def counting_emit_all(records):
+    state.emitted += len(records)
+    helpers.context.get().sink.intervals(records)
+
+###############################################################################
+# installing
+###############################################################################
+
+# wrap the tag* primitives, and emit() and emit_all() to count intervals
+def instrument_helpers():
+    wrappers[helpers.emit] = counting_emit
+    wrappers[helpers.emit_all] = counting_emit_all
+    for (name, value) in list(vars(helpers).items()):
+        if name.startswith('tag') and type(value) is types.FunctionType:
+            wrappers[value] = wrap(name, value)
+
+# wrap functions defined in dissector <module>
+def instrument_module(module):
+    short = module.__name__.removeprefix('finter.')
+    for (name, value) in list(vars(module).items()):
+        if type(value) is types.FunctionType and value.__module__ == module.__name__ and \
+          not value in wrappers and not hasattr(value, 'instrumented'):
+            wrappers[value] = wrap(f'{short}.{name}', value)
+
+# point every loaded finter module's globals at the wrappers, dissectors
+# imported later pick them up from finter.helpers through `import *`
+def install():
+    for (mod_name, module) in list(sys.modules.items()):
+        if not mod_name.startswith('finter.') or module is None:
+            continue
+        if not mod_name in SKIP:
+            instrument_module(module)
+
+    for (mod_name, module) in list(sys.modules.items()):
+        if not mod_name.startswith('finter.') or module is None or mod_name == 'finter.instrument':
+            continue
+        namespace = vars(module)
+        for (name, value) in list(namespace.items()):
+            if type(value) is types.FunctionType and value in wrappers:
+                namespace[name] = wrappers[value]
+
+def enable():
+    global enabled
+    if not enabled:
+        enabled = True
+        instrument_helpers()
+    install()
+
+###############################################################################
+# phases
+###############################################################################
+
+@contextlib.contextmanager
+def timed_phase(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        with lock:
+            entry = phases.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+
+nothing = contextlib.nullcontext()
+
+# with phase('dissect'): ...
+def phase(name):
+    return timed_phase(name) if enabled else nothing
+
+# decorator timing each call of a function as the phase
+def phased(name):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with timed_phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+###############################################################################
+# reporting
+###############################################################################
+
+def report(fp=sys.stderr, top=40):
+    print('phase                  calls     seconds', file=fp)
+    for (name, (calls, seconds)) in phases.items():
+        print(f'{name:<20} {calls:7d} {seconds:11.4f}', file=fp)
+    print('', file=fp)
+
+    rows = sorted(((name, s) for (name, s) in stats.items() if s[0]), key=lambda r: r[1][4], reverse=True)
+    print(f'{"function":<40} {"calls":>9} {"bytes":>11} {"intervals":>10} {"total s":>9} {"self s":>9}', file=fp)
+    for (name, (calls, consumed, intervals, total, self_)) in rows[:top]:
+        print(f'{name:<40} {calls:9d} {consumed:11d} {intervals:10d} {total:9.4f} {self_:9.4f}', file=fp)
+    if len(rows) > top:
+        print(f'({len(rows) - top} more, see the JSON dump)', file=fp)
+
+def dump(path):
+    import json
+    with open(path, 'w') as fp:
+        json.dump({
+            'phases': {name: {'calls': c, 'seconds': s} for (name, (c, s)) in phases.items()},
+            'functions': {name: {'calls': c, 'bytes': b, 'intervals': i, 'total_seconds': t, 'self_seconds': s}
+                for (name, (c, b, i, t, s)) in stats.items() if c}
+        }, fp, indent=2)
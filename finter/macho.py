@@ -18,14 +18,6 @@ from enum import Enum
 
 from .helpers import *
 
-# globals
-# while parsing load commands segment64, save these areas to parse relocations
-reloc_areas = [] # (<offset>, <num_relocs>, <info>)
-# while parsing load command symtab
-(symtab_offset, symtab_amount, symtab_strtab_offset) = (0, 0, 0)
-symtab_strings = []
-section_strings = [''] # 1-indexed in macho, given as "<SEGNAME>/<SECNAME> like __TEXT/__stubs"
-
 MH_MAGIC = 0xFEEDFACE
 MH_CIGAM = 0xCEFAEDFE
 MH_MAGIC_64 = 0xFEEDFACF
@@ -454,7 +446,7 @@ R_SCATTERED = 0x80000000
 #    uint32_t r_type:4;
 #};
 
-def tag_relocation_info(fp, cputype, sym_table_names, comment=''):
+def tag_relocation_info(fp, cputype, symtab_strings, section_strings, comment=''):
     base = fp.tell()
 
     # peek at r_address, determine entire structure size
@@ -500,6 +492,32 @@ def tag_relocation_info(fp, cputype, sym_table_names, comment=''):
     tag(fp, 4, '\\n'.join(descr))
     return 8
 
+# segment_command_64 after cmd, cmdsize
+SEGMENT_COMMAND_64 = StructLayout(
+    ('16z', 'segname'),
+    ('Q', 'vmaddr'),
+    ('Q', 'vmsize'),
+    ('Q', 'fileoff'),
+    ('Q', 'filesize'),
+    ('I', 'maxprot'),
+    ('I', 'initprot', vm_prot_str),
+    ('I', 'nsects'),
+    ('I', 'flags'))
+
+SECTION_64 = StructLayout(
+    ('16z', 'sectname'),
+    ('16z', 'segname'),
+    ('Q', 'addr'),
+    ('Q', 'size'),
+    ('I', 'offset'),
+    ('I', 'align'),
+    ('I', 'reloff'),
+    ('I', 'nreloc'),
+    ('I', 'flags', lambda x: '\\n  type: %s\\n  attrs: %s' % (section_type_str(x), section_attrs_str(x))),
+    ('I', 'reserved1'),
+    ('I', 'reserved2'),
+    ('I', 'reserved3'))
+
 #------------------------------------------------------------------------------
 # "main"
 #------------------------------------------------------------------------------
@@ -525,11 +543,18 @@ def analyze(fp):
     cputype = uint32(fp)
     fp.seek(0)
 
+    # while parsing load commands segment64, save these areas to parse relocations
+    reloc_areas = [] # (<offset>, <num_relocs>, <info>)
+    # while parsing load command symtab
+    (symtab_offset, symtab_amount, symtab_strtab_offset) = (0, 0, 0)
+    symtab_strings = []
+    section_strings = [''] # 1-indexed in macho, given as "<SEGNAME>/<SECNAME> like __TEXT/__stubs"
+
     # actually read the header now
     if is64:
-        tag(fp, 4+4+4+4+4+4+4+4, "mach_header_64", 1)
+        tag(fp, 4+4+4+4+4+4+4+4, "mach_header_64", "", True)
     else:
-        tag(fp, 4+4+4+4+4+4+4, "mach_header", 1)
+        tag(fp, 4+4+4+4+4+4+4, "mach_header", "", True)
     magic = uint32(fp, True)
     tag(fp, 4, "magic=%08X (%s)" % (magic, lookup_magic[magic]))
     cputype = uint32(fp, True)
@@ -561,40 +586,20 @@ def analyze(fp):
         cmd = LOAD_COMMAND_TYPE(cmd)
 
         if cmd == LOAD_COMMAND_TYPE.LC_SEGMENT_64:
-            segname = tagString(fp, 16, "segname")
-            tagUint64(fp, "vmaddr")
-            tagUint64(fp, "vmsize")
-            tagUint64(fp, "fileoff")
-            tagUint64(fp, "filesize")
-            tagUint32(fp, "maxprot")
-            initprot = uint32(fp, "initprot")
-            tag(fp, 4, 'initprot=0x%X %s' % (initprot, vm_prot_str(initprot)))
-
-            nsects = tagUint32(fp, "nsects")
-            flags = tagUint32(fp, "flags")
+            segment = tagStruct(fp, SEGMENT_COMMAND_64)
+            segname = segment['segname']
+            nsects = segment['nsects']
 
             for j in range(nsects):
                 oScn = fp.tell()
-                sectname = tagString(fp, 16, "sectname")
-                segname = tagString(fp, 16, "segname")
-                tagUint64(fp, "addr")
-                size = tagUint64(fp, "size")
-                offset = tagUint32(fp, "offset")
-                tagUint32(fp, "align")
-                reloff = tagUint32(fp, "reloff")
-                nreloc = tagUint32(fp, "nreloc")
-                flags = uint32(fp, 1)
-                tag(fp, 4, "flags=0x%X\\n  type: %s\\n  attrs: %s" % \
-                    (flags, section_type_str(flags), section_attrs_str(flags)))
-                tagUint32(fp, "reserved1")
-                tagUint32(fp, "reserved2")
-                tagUint32(fp, "reserved3")
-                print('[0x%X,0x%X) section_64 \"%s\" %d/%d' % \
-                    (oScn, fp.tell(), sectname, j+1, nsects))
+                section = tagStruct(fp, SECTION_64)
+                (sectname, segname) = (section['sectname'], section['segname'])
+                (size, offset) = (section['size'], section['offset'])
+                (reloff, nreloc) = (section['reloff'], section['nreloc'])
+                emit(oScn, fp.tell(), 'raw', 'section_64 "%s" %d/%d' % (sectname, j+1, nsects))
 
                 # tag section body
-                print('[0x%X,0x%X) section %s/%s contents' % \
-                    (offset, offset+size, segname, sectname))
+                emit(offset, offset+size, 'raw', 'section %s/%s contents' % (segname, sectname))
 
                 # save section name
                 section_strings.append('%s/%s' % (segname, sectname))
@@ -602,8 +607,7 @@ def analyze(fp):
                 # save reloc reference for later parsing
                 reloc_areas.append((reloff, nreloc, '(section %s)' % sectname))
 
-            print('[0x%X,0x%X) segment_command_64 \"%s\"' % \
-                (oCmd, fp.tell(), segname))
+            emit(oCmd, fp.tell(), 'raw', 'segment_command_64 "%s"' % segname)
 
         elif cmd == LOAD_COMMAND_TYPE.LC_LOAD_DYLIB:
             # parse the dylib
@@ -617,11 +621,9 @@ def analyze(fp):
             fp.seek(oCmd + lc_str)
             path = string(fp, cmdSize - lc_str)
 
-            print('[0x%X,0x%X) path "%s"' % \
-                (oCmd+lc_str, oCmd+cmdSize, path))
+            emit(oCmd+lc_str, oCmd+cmdSize, 'raw', 'path "%s"' % path)
 
-            print('[0x%X,0x%X) dylib_command \"%s\"' % \
-                (oCmd, oCmd+cmdSize, path))
+            emit(oCmd, oCmd+cmdSize, 'raw', 'dylib_command "%s"' % path)
 
         elif cmd == LOAD_COMMAND_TYPE.LC_LOAD_DYLINKER:
             lc_str = tagUint32(fp, "lc_str")
@@ -629,8 +631,7 @@ def analyze(fp):
             fp.seek(oCmd + lc_str)
             path = string(fp, cmdSize - lc_str)
 
-            print('[0x%X,0x%X) dylinker_command \"%s\"' % \
-                (oCmd, oCmd+cmdSize, path))
+            emit(oCmd, oCmd+cmdSize, 'raw', 'dylinker_command "%s"' % path)
 
         elif (cmd == LOAD_COMMAND_TYPE.LC_DYLD_INFO) or (cmd == LOAD_COMMAND_TYPE.LC_DYLD_INFO_ONLY):
             tagUint32(fp, "rebase_off")
@@ -643,23 +644,20 @@ def analyze(fp):
             tagUint32(fp, "lazy_bind_size")
             tagUint32(fp, "export_off")
             tagUint32(fp, "export_size")
-            print('[0x%X,0x%X) raw dyld_info_command' % \
-                (oCmd, fp.tell()))
+            emit(oCmd, fp.tell(), 'raw', 'dyld_info_command')
 
         elif cmd == LOAD_COMMAND_TYPE.LC_SYMTAB:
             symoff = tagUint32(fp, "symoff")
             nsyms = tagUint32(fp, "nsyms")
             stroff = tagUint32(fp, "stroff")
             tagUint32(fp, "strsize")
-            print('[0x%X,0x%X) raw symtab_command' % \
-                (oCmd, fp.tell()))
+            emit(oCmd, fp.tell(), 'raw', 'symtab_command')
 
             (symtab_offset, symtab_amount, symtab_strtab_offset) = (symoff, nsyms, stroff)
 
         elif cmd == LOAD_COMMAND_TYPE.LC_UUID:
             uuid = tag(fp, 16, "uuid")
-            print('[0x%X,0x%X) uuid_command "%s"' % \
-                (oCmd, oCmd+cmdSize, binascii.hexlify(uuid)))
+            emit(oCmd, oCmd+cmdSize, 'raw', 'uuid_command "%s"' % binascii.hexlify(uuid))
 
         elif cmd == LOAD_COMMAND_TYPE.LC_VERSION_MIN_MACOSX or cmd == LOAD_COMMAND_TYPE.LC_VERSION_MIN_IPHONEOS:
             version = tagUint32(fp, "version")
@@ -672,8 +670,7 @@ def analyze(fp):
             y = (sdk & 0x0000FF00) >> 8
             z = (sdk & 0x000000FF) >> 0
             strSdk = '%d.%d.%d' % (x,y,z)
-            print('[0x%X,0x%X) version_min_command ver=%s sdk=%s' % \
-                (oCmd, oCmd+cmdSize, strVersion, strSdk))
+            emit(oCmd, oCmd+cmdSize, 'raw', 'version_min_command ver=%s sdk=%s' % (strVersion, strSdk))
 
         elif cmd == LOAD_COMMAND_TYPE.LC_SOURCE_VERSION:
             version = tagUint64(fp, "version")
@@ -682,21 +679,19 @@ def analyze(fp):
             c = (0x000000003FF00000 & version) >> 20
             d = (0x00000000000FFC00 & version) >> 10
             e = (0x00000000000003FF & version) >> 0
-            print('[0x%X,0x%X) source_version_command %s.%s.%s.%s.%s' % \
-                (oCmd, oCmd+cmdSize, str(a), str(b), str(c), str(d), str(e)))
+            emit(oCmd, oCmd+cmdSize, 'raw', 'source_version_command %s.%s.%s.%s.%s' % (str(a), str(b), str(c), str(d), str(e)))
 
         elif cmd == LOAD_COMMAND_TYPE.LC_MAIN:
             entrypoint = tagUint32(fp, "entryoff")
             tagUint32(fp, "stacksize")
-            print('[0x%X,0x%X) entry_point_command (main @0x%08X)' % \
-                (oCmd, oCmd+cmdSize, entrypoint))
+            emit(oCmd, oCmd+cmdSize, 'raw', 'entry_point_command (main @0x%08X)' % entrypoint)
             if fp.tell() < (oCmd+cmdSize):
                 tag(fp, oCmd+cmdSize-fp.tell(), "padding")
 
         elif cmd in [LOAD_COMMAND_TYPE.LC_FUNCTION_STARTS, LOAD_COMMAND_TYPE.LC_DATA_IN_CODE]:
             offs = tagUint32(fp, 'data offset')
             length = tagUint32(fp, 'data length')
-            print('[0x%X,0x%X) raw %s' % (oCmd, oCmd+cmdSize, cmd.name))
+            emit(oCmd, oCmd+cmdSize, 'raw', cmd.name)
 
             if length:
                 fp.seek(offs)
@@ -730,14 +725,12 @@ def analyze(fp):
             tagUint32(fp, "nextrel")
             locreloff = tagUint32(fp, "locreloff")
             nlocrel = tagUint32(fp, "nlocrel")
-            print('[0x%X,0x%X) raw dysymtab_command' % \
-                (oCmd, fp.tell()))
+            emit(oCmd, fp.tell(), 'raw', 'dysymtab_command')
 
             if locreloff and nlocrel:
                 reloc_areas.append((locreloff, nlocrel, '(dysymtab)'))
         else:
-            print('[0x%X,0x%X) command %s' % \
-                (oCmd, oCmd+cmdSize, LOAD_COMMAND_TYPE(cmd).name))
+            emit(oCmd, oCmd+cmdSize, 'raw', 'command %s' % LOAD_COMMAND_TYPE(cmd).name)
             tag(fp, cmdSize-8, 'data')
 
     # post-command parsing
@@ -748,14 +741,14 @@ def analyze(fp):
         for i in range(symtab_amount):
             sym_name = tag_nlist(fp, cputype, symtab_strtab_offset)
             symtab_strings.append(sym_name)
-        print('[0x%X,0x%X) raw symbol table contents' % (symtab_offset, fp.tell()))
+        emit(symtab_offset, fp.tell(), 'raw', 'symbol table contents')
 
     # parse relocation areas referenced by sections
     for (reloff, nreloc, info) in reloc_areas:
         anchor = fp.tell()
         fp.seek(reloff)
         for i in range(nreloc):
-            tag_relocation_info(fp, cputype, [], info)
+            tag_relocation_info(fp, cputype, symtab_strings, section_strings, info)
         fp.seek(anchor)
 
 if __name__ == '__main__':
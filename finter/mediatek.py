@@ -57,7 +57,7 @@ def brom_layout_header(fp):
     tagUint32(fp, 'unused')
 
     length = fp.tell() - start
-    print(f'[0x{start:X},0x{start+length:X}) struct brom_layout_header')
+    emit(start, start+length, 'raw', 'struct brom_layout_header')
 
     return {'header_size': header_size, 'total_size': total_size}
 
@@ -87,7 +87,7 @@ def gen_boot_header(fp):
         tag(fp, pad, f'pad[0x{pad:X}]')
 
     length = fp.tell() - start
-    print(f'[0x{start:X},0x{start+length:X}) struct gen_boot_header')
+    emit(start, start+length, 'raw', 'struct gen_boot_header')
 
     return {'size': size}
 
@@ -124,7 +124,7 @@ def gen_device_header(fp):
         fp.read(space)
 
     length = fp.tell() - start
-    print(f'[0x{start:X},0x{start+length:X}) struct gen_device_header')
+    emit(start, start+length, 'raw', 'struct gen_device_header')
 
 def gfh_common_header(fp):
     start = fp.tell()
@@ -142,7 +142,7 @@ def gfh_common_header(fp):
     type_ = tagUint16(fp, 'type', comm)
 
     length = fp.tell() - start
-    print(f'[0x{start:X},0x{start+length:X}) struct gfh_common_header')
+    emit(start, start+length, 'raw', 'struct gfh_common_header')
 
     return {'size':size, 'type':type_}
 
@@ -205,7 +205,7 @@ def gfh_file_info(fp):
 
     length = fp.tell() - start
     #assert length == len_header
-    print(f'[0x{start:X},0x{start+length:X}) struct gfh_file_info')
+    emit(start, start+length, 'raw', 'struct gfh_file_info')
 
     return info
 
@@ -214,7 +214,7 @@ def gfh_bl_info(fp):
     info = gfh_common_header(fp)
     tagUint32(fp, 'attr')
     length = fp.tell() - start
-    print(f'[0x{start:X},0x{start+length:X}) struct gfh_bl_info')
+    emit(start, start+length, 'raw', 'struct gfh_bl_info')
 
     return info
 
@@ -250,7 +250,7 @@ def gfh_brom_cfg(fp):
     tagUint32(fp, 'usbdl_by_flag_timeout_ms')
     tagUint32(fp, 'pad')
     length = fp.tell() - start
-    print(f'[0x{start:X},0x{start+length:X}) struct gfh_brom_cfg')
+    emit(start, start+length, 'raw', 'struct gfh_brom_cfg')
 
     return info
 
@@ -263,7 +263,7 @@ def gfh_anti_clone(fp):
     tagUint32(fp, 'ac_offset')
     tagUint32(fp, 'ac_len')
     length = fp.tell() - start
-    print(f'[0x{start:X},0x{start+length:X}) struct gfh_anti_clone')
+    emit(start, start+length, 'raw', 'struct gfh_anti_clone')
 
     return info
 
@@ -282,7 +282,7 @@ def gfh_brom_sec_cfg(fp):
     tag(fp, 3, 'padding')
     tagUint32(fp, 'special') # if 0xC975E033 then USBDL is disabled
     length = fp.tell() - start
-    print(f'[0x{start:X},0x{start+length:X}) struct gfh_brom_sec_cfg')
+    emit(start, start+length, 'raw', 'struct gfh_brom_sec_cfg')
 
     return info
 
@@ -329,5 +329,5 @@ def sig_5_entry(fp):
     tag(fp, data_sz, f'data (0x{data_sz:X} bytes)')
 
     length = fp.tell() - start
-    print(f'[0x{start:X},0x{start+length:X}) struct sig_5_entry')
+    emit(start, start+length, 'raw', 'struct sig_5_entry')
 
@@ -9,12 +9,12 @@ from .helpers import *
 def pprint(el, values=True, out=sys.stdout, depth=0):
     if isinstance(el, ebmlite.core.Document):
         if el.size and depth < 3:
-            print("[0x%X,0x%X) %s (Document, type %s)\n" % (el.offset, el.offset + el.size, str(el.name), el.type))
+            emit(el.offset, el.offset + el.size, 'raw', "%s (Document, type %s)" % (str(el.name), el.type))
         for i in el:
             pprint(i, values, out, depth+1)
     else:
         if el.size and depth < 3:
-            print("[0x%X,0x%X) %s (ID: 0x%0X)" % (el.offset, el.offset + el.size, str(el.name), el.id))
+            emit(el.offset, el.offset + el.size, 'raw', "%s (ID: 0x%0X)" % (str(el.name), el.id))
         if isinstance(el, ebmlite.core.MasterElement):
             #print(": (master) %d subelements\n" % len(el.value))
             for i in el:
@@ -517,10 +517,13 @@ def is_at_header(fp):
 # "main"
 ###############################################################################
 
-def analyze(fp):
+# yields after each header so callers can consume intervals as they come, see dissect_file_iter()
+def analyze_iter(fp):
+    fp = reader(fp)
+
     setBigEndian()
 
-    while (not IsEof(fp)):
+    while not fp.eof():
         if not is_at_header(fp):
             break
 
@@ -547,9 +550,15 @@ def analyze(fp):
         else:
             tag_stream_header(fp)
 
+        yield
+
         if not is_at_header(fp):
             break
 
+def analyze(fp):
+    for _ in analyze_iter(fp):
+        pass
+
 if __name__ == '__main__':
     import sys
     with open(sys.argv[1], 'rb') as fp:
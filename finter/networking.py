@@ -100,7 +100,7 @@ class ARP_HARDWARE(Enum):
     ARPHRD_NONE = 0xFFFE
 
 def ethernet_ii(fp, length=None, descend=False):
-    print(f'// ethernet_ii(length={length}/0x{length:x})')
+    note(f'ethernet_ii(length={length}/0x{length:x})')
 
     endian = setBigEndian()
 
@@ -129,7 +129,7 @@ def ethernet_ii(fp, length=None, descend=False):
     setEndian(endian)
 
 def ethernet_802_3(fp, length=None, descend=False):
-    print('// ethernet_802_3()')
+    note('ethernet_802_3()')
 
     endian = setBigEndian()
 
@@ -152,7 +152,7 @@ def ethernet_802_3(fp, length=None, descend=False):
     setEndian(endian)
 
 def ethernet(fp, length=None, descend=False):
-    print('// ethernet()')
+    note('ethernet()')
 
     # there are multiple ethernet frames:
     # - Ethernet II
@@ -193,7 +193,7 @@ def ip2str(data):
     return f'%d.%d.%d.%d' % (data[0], data[1], data[2], data[3])
 
 def ipv4(fp, length=None, descend=False):
-    print(f'// ipv4(length={length}/0x{length:x}, descend={descend})')
+    note(f'ipv4(length={length}/0x{length:x}, descend={descend})')
 
     endian = setBigEndian()
 
@@ -260,7 +260,7 @@ def ipv4(fp, length=None, descend=False):
 
 # length: of data to follow, including udp header
 def udp(fp, length=None, descend=False):
-    print(f'// udp(length={length}/0x{length:x})')
+    note(f'udp(length={length}/0x{length:x})')
 
     endian = setBigEndian()
 
@@ -350,7 +350,7 @@ def tcp(fp, length, descend=False):
 
 # https://www.tcpdump.org/linktypes/LINKTYPE_LINUX_SLL2.html
 def linux_sll2(fp, length, descend=False):
-    print('// linux_sll2()')
+    note('linux_sll2()')
 
     endian = setBigEndian()
 
@@ -423,7 +423,7 @@ class TZSP_TAG_TYPE(Enum):
     WLAN_RADIO_HDR_SERIAL = 60
 
 def tzsp(fp, length=None, descend=False):
-    print(f'// tzsp(length={length}/0x{length:x})')
+    note(f'tzsp(length={length}/0x{length:x})')
 
     endian = setBigEndian()
 
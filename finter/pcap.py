@@ -13,9 +13,6 @@ from . import networking
 
 from enum import Enum, auto, unique
 
-frame_index = None
-link_type = None
-
 class BLOCK_TYPE(Enum):
     SECTION_HEADER = 0x0a0d0d0a
     INTERFACE_DESCRIPTION = 1
@@ -25,11 +22,14 @@ class BLOCK_TYPE(Enum):
 # "main"
 ###############################################################################
 
-linktype = None
+# what one run of analyze_iter() carries from record to record
+class Capture():
+    def __init__(self):
+        self.linktype = None
+        self.t0 = None # timestamp of the first record, the others are relative to it
+        self.packet_no = 1
 
 def tag_global_header(fp):
-    global linktype
-
     start = fp.tell()
     tagUint32(fp, 'magic', 'magic number')
     tagUint16(fp, 'version_major', 'major version number')
@@ -39,30 +39,46 @@ def tag_global_header(fp):
     tagUint32(fp, 'snaplen', 'max length of captured packets')
     linktype = tagUint32(fp, 'network', lambda x: enum_int_to_name(networking.LINKTYPE, x))
     tagFromPosition(fp, start, 'pcap_hdr_t')
+    return linktype
 
-t0 = None
-def tag_record_header(fp):
-    global t0
-
+def tag_record_header(fp, capture):
     start = fp.tell()
     ts_sec = tagUint32(fp, 'ts_sec')
     ts_usec = tagUint32(fp, 'ts_usec')
 
     timestamp = round(ts_sec + .000001*ts_usec, 6)
-    if t0 is None:
-        t0 = timestamp
+    if capture.t0 is None:
+        capture.t0 = timestamp
 
-    delta = round(timestamp - t0, 6)
+    delta = round(timestamp - capture.t0, 6)
 
     length = tagUint32(fp, 'incl_len')
     tagUint32(fp, 'orig_len')
     tagFromPosition(fp, start, 'pcaprec_hdr_s', f't={delta}')
     return length
 
-packet_no = 1
-def analyze(fp):
-    global linktype
-    global packet_no
+# step over a record that can't overlap the query window, False if it might
+def skip_record(fp, capture):
+    mark = fp.tell()
+    (ts_sec, ts_usec, incl_len) = unpack(context.get().fmtu32[0] + 'III', peek(fp, 12))
+    end = mark + 16 + incl_len
+    if overlaps(mark, end):
+        return False
+
+    # the first record still sets the time base
+    if capture.t0 is None:
+        capture.t0 = round(ts_sec + .000001*ts_usec, 6)
+
+    capture.packet_no += 1
+    fp.seek(end)
+    return True
+
+# yields after each record so callers can consume intervals as they come, see dissect_file_iter()
+def analyze_iter(fp):
+    fp = reader(fp)
+
+    # numbering and the time base start over with every file
+    capture = Capture()
 
     setLittleEndian()
 
@@ -74,22 +90,32 @@ def analyze(fp):
     else:
         return
 
-    tag_global_header(fp)
+    capture.linktype = tag_global_header(fp)
+
+    while not fp.eof():
+        if pastWindow(fp.tell()):
+            break
+        if skip_record(fp, capture):
+            continue
 
-    while not IsEof(fp):
         mark = fp.tell()
 
-        length = tag_record_header(fp)
+        length = tag_record_header(fp, capture)
 
-        if linktype == networking.LINKTYPE.LINUX_SLL2.value:
+        if capture.linktype == networking.LINKTYPE.LINUX_SLL2.value:
             networking.linux_sll2(fp, length, True)
-        elif linktype == networking.LINKTYPE.ETHERNET.value:
+        elif capture.linktype == networking.LINKTYPE.ETHERNET.value:
             networking.ethernet(fp, length, True)
         else:
             tag(fp, length, 'packet data', f'({length:d} bytes)')
 
-        tagFromPosition(fp, mark, f'Record (num:{packet_no})')
-        packet_no += 1
+        tagFromPosition(fp, mark, f'Record (num:{capture.packet_no})')
+        capture.packet_no += 1
+        yield
+
+def analyze(fp):
+    for _ in analyze_iter(fp):
+        pass
 
 if __name__ == '__main__':
     import sys
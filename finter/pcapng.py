@@ -18,8 +18,6 @@ from . import networking
 
 from enum import Enum, auto, unique
 
-frame_index = None
-link_type = None
 
 class BLOCK_TYPE(Enum):
     SECTION_HEADER = 0x0a0d0d0a
@@ -37,6 +35,12 @@ class LINKTYPE(Enum):
 # "main"
 ###############################################################################
 
+# what one run of analyze_iter() carries from block to block
+class Capture():
+    def __init__(self):
+        self.frame_index = 1
+        self.link_type = None
+
 def tag_block_header(fp):
     global VERIFY_2ND_TOTALBLOCKLENGTH
 
@@ -72,13 +76,11 @@ def tag_section_header_block(fp, BlockTotalLength):
 
     tagFromPosition(fp, start, 'SectionHeaderBlock')
 
-def tag_interface_description_block(fp, BlockTotalLength):
-    global link_type
-
+def tag_interface_description_block(fp, BlockTotalLength, capture):
     start = fp.tell()
     tag_block_header(fp)
 
-    link_type = tagUint16(fp, 'LinkType', lambda x: enum_int_to_name(LINKTYPE, x))
+    capture.link_type = tagUint16(fp, 'LinkType', lambda x: enum_int_to_name(LINKTYPE, x))
     tagUint16(fp, 'Reserved')
     tagUint32(fp, 'SnapLen')
     tag(fp, BlockTotalLength -4 -4 -2 -2 -4 -4, 'Options')
@@ -87,11 +89,8 @@ def tag_interface_description_block(fp, BlockTotalLength):
 
     tagFromPosition(fp, start, 'InterfaceDescriptionBlock')
 
-def tag_enhanced_packet_block(fp, BlockTotalLength):
-    print('// tag_enhanced_packet_block()')
-
-    global frame_index
-    global link_type
+def tag_enhanced_packet_block(fp, BlockTotalLength, capture):
+    note('tag_enhanced_packet_block()')
 
     start = fp.tell()
     tag_block_header(fp)
@@ -105,7 +104,7 @@ def tag_enhanced_packet_block(fp, BlockTotalLength):
     packetDataLength = 4 * ((capturedPacketLength+3) // 4)
 
     mark = fp.tell()
-    if link_type is not None and LINKTYPE(link_type) == LINKTYPE.ETHERNET:
+    if capture.link_type is not None and LINKTYPE(capture.link_type) == LINKTYPE.ETHERNET:
         networking.ethernet(fp, packetDataLength, descend=True)
     else:
         tag(fp, packetDataLength, f'packetData ({packetDataLength}/0x{packetDataLength:x} bytes)')
@@ -123,11 +122,9 @@ def tag_enhanced_packet_block(fp, BlockTotalLength):
 
     tagUint32(fp, 'TotalLength (repeated)')
 
-    tagFromPosition(fp, start, 'Block', f'EnhancedPacketBlock (index: {frame_index})')
-
-def tag_block(fp):
-    global frame_index
+    tagFromPosition(fp, start, 'Block', f'EnhancedPacketBlock (index: {capture.frame_index})')
 
+def tag_block(fp, capture):
     start = fp.tell()
 
     extra = ''
@@ -144,24 +141,33 @@ def tag_block(fp):
         tag_section_header_block(fp, BlockTotalLength)
     # interface description block
     elif BlockType == 1:
-        tag_interface_description_block(fp, BlockTotalLength)
+        tag_interface_description_block(fp, BlockTotalLength, capture)
     # enahnced packet block
     elif BlockType == 6:
-        tag_enhanced_packet_block(fp, BlockTotalLength)
-        frame_index += 1
-        extra = f' (index: {frame_index})'
+        if overlaps(start, start + BlockTotalLength):
+            tag_enhanced_packet_block(fp, BlockTotalLength, capture)
+        else:
+            fp.seek(start + BlockTotalLength)
+        capture.frame_index += 1
+        extra = f' (index: {capture.frame_index})'
     else:
         body = tag(fp, BlockTotalLength, f'Block (type:{BlockType}) body{extra}')
         #tagUint32(fp, 'TotalLength (repeated)')
 
-def analyze(fp):
-    global frame_index
+# yields after each block so callers can consume intervals as they come, see dissect_file_iter()
+def analyze_iter(fp):
+    fp = reader(fp)
 
     setLittleEndian()
 
-    frame_index = 1
-    while not IsEof(fp):
-        tag_block(fp)
+    capture = Capture()
+    while not fp.eof() and not pastWindow(fp.tell()):
+        tag_block(fp, capture)
+        yield
+
+def analyze(fp):
+    for _ in analyze_iter(fp):
+        pass
 
 if __name__ == '__main__':
     import sys
@@ -65,51 +65,55 @@ class COMIMAGE_FLAGS(Enum):
     NATIVE_ENTRYPOINT = 16
     TRACKDEBUGDATA = 0x10000
 
-def idFile(fp):
-    fpos = fp.tell()
-
-    # get file size
-    fp.seek(0, os.SEEK_END)
-    fileSize = fp.tell()
-    #print "fileSize: 0x%X (%d)" % (fileSize, fileSize)
-
+# "pe64", "pe32" or "unknown" (other machines) if a file of <size> bytes is a
+# PE, else False; at(offset, length) returns the file's bytes, also used by
+# finter/identify.py
+def idImage(size, at):
     # file large enough to hold IMAGE_DOS_HEADER ?
-    if fileSize < 0x40:
+    if size < 0x40:
         #print "file too small to hold IMAGE_DOS_HEADER"
-        fp.seek(fpos)
         return False
 
     # is IMAGE_DOS_HEADER.e_magic == "MZ" ?
-    fp.seek(0)
-    if fp.read(2) != b'MZ':
+    if at(0, 2) != b'MZ':
         #print "missing MZ identifier"
-        fp.seek(fpos)
         return False
 
     # get IMAGE_DOS_HEADER.e_lfanew
-    fp.seek(0x3C)
-    e_lfanew = unpack('<I', fp.read(4))[0]
+    e_lfanew = unpack('<I', at(0x3C, 4))[0]
 
     # is file large enough to hold IMAGE_NT_HEADERS ?
-    if fileSize < (e_lfanew + 0x108):
+    if size < (e_lfanew + 0x108):
         #print "file too small to hold IMAGE_NT_HEADERS"
-        fp.seek(fpos)
         return False
 
     # does IMAGE_NT_HEADERS.signature == "PE" ?
-    fp.seek(e_lfanew)
-    if fp.read(4) != b'PE\x00\x00':
+    if at(e_lfanew, 4) != b'PE\x00\x00':
         #print "missing PE identifier"
-        fp.seek(fpos)
         return False
 
     #
     result = "unknown"
-    (machine,) = unpack('<H', fp.read(2))
+    (machine,) = unpack('<H', at(e_lfanew + 4, 2))
     if machine in [IMAGE_FILE_MACHINE.AMD64.value, IMAGE_FILE_MACHINE.ARM64.value]:
         result = "pe64"
     if machine in [IMAGE_FILE_MACHINE.I386.value]:
         result = "pe32"
+    return result
+
+def idFile(fp):
+    fpos = fp.tell()
+
+    # get file size
+    fp.seek(0, os.SEEK_END)
+    fileSize = fp.tell()
+    #print "fileSize: 0x%X (%d)" % (fileSize, fileSize)
+
+    def at(offset, length):
+        fp.seek(offset)
+        return fp.read(length)
+
+    result = idImage(fileSize, at)
     fp.seek(fpos)
     return result
 
@@ -134,14 +138,13 @@ def tagReloc(fp, size, machine=''):
 
         # peek on VirtualAddress and SizeOfBlock
         if uint64(fp, True) == 0:
-            print('[0x%X,0x%X) raw reloc block NULL' % (oBlockStart, oBlockStart+8))
+            emit(oBlockStart, oBlockStart+8, 'raw', 'reloc block NULL')
             break;
 
         VirtualAddress = tagUint32(fp, "VirtualAddress")
         SizeOfBlock = tagUint32(fp, "SizeOfBlock")
         nEntries = (SizeOfBlock-8)//2
-        print('[0x%X,0x%X) raw reloc block 0x%X (%d entries)' % \
-          (oBlockStart, oBlockStart+SizeOfBlock, VirtualAddress, nEntries))
+        emit(oBlockStart, oBlockStart+SizeOfBlock, 'raw', 'reloc block 0x%X (%d entries)' % (VirtualAddress, nEntries))
 
         for i in range(nEntries):
             toto = uint16(fp, True)
@@ -150,62 +153,63 @@ def tagReloc(fp, size, machine=''):
             roffs = toto&0xFFF
             tag(fp, 2, "reloc entry %d=%s offset=0x%X" % (rtype,rtypeStr,roffs))
 
+RUNTIME_FUNCTION = StructLayout(
+    ('I', 'BeginAddress'),
+    ('I', 'EndAddress'),
+    ('I', 'UnwindInfoAddress'))
+
 def tagPdata(fp, size, machine=''):
     if machine=='x64':
         # struct RUNTIME_FUNCTION is 4+4+4 (begin addr, end addr, unwind info)
         assert size % 12 == 0, 'size was 0x%X (%d) and is not divisible by 12' % (size, size)
-        current = 0
         total = size // 12
-        while current < total:
-            tag(fp, 12, "struct RUNTIME_FUNCTION %d/%d" % (current+1, total), True)
-            tagUint32(fp, 'BeginAddress')
-            tagUint32(fp, 'EndAddress')
-            tagUint32(fp, 'UnwindInfoAddress')
-            current += 1
+        tagArray(fp, RUNTIME_FUNCTION, total,
+            lambda table: ["struct RUNTIME_FUNCTION %d/%d" % (i+1, total) for i in range(total)])
+
+IMAGE_DOS_HEADER = StructLayout(
+    ('2s', 'e_magic'),
+    ('H', 'e_cblp'),
+    ('H', 'e_cp'),
+    ('H', 'e_crlc'),
+    ('H', 'e_cparhdr'),
+    ('H', 'e_minalloc'),
+    ('H', 'e_maxalloc'),
+    ('H', 'e_ss'),
+    ('H', 'e_sp'),
+    ('H', 'e_csum'),
+    ('H', 'e_eip'),
+    ('H', 'e_cs'),
+    ('H', 'e_lfarlc'),
+    ('H', 'e_ovno'),
+    ('8s', 'e_res'),
+    ('H', 'e_oemid'),
+    ('H', 'e_oeminfo'),
+    ('20s', 'e_res2'),
+    ('I', 'e_lfanew'))
 
 def tag_image_dos_header(fp):
-    result = {}
-
     oHdr = fp.tell()
-    e_magic = tag(fp, 2, "e_magic")
-    assert e_magic == b'MZ'
-    tagUint16(fp, "e_cblp")
-    tagUint16(fp, "e_cp")
-    tagUint16(fp, "e_crlc")
-    tagUint16(fp, "e_cparhdr")
-    tagUint16(fp, "e_minalloc")
-    tagUint16(fp, "e_maxalloc")
-    tagUint16(fp, "e_ss")
-    tagUint16(fp, "e_sp")
-    tagUint16(fp, "e_csum")
-    tagUint16(fp, "e_eip")
-    tagUint16(fp, "e_cs")
-    tagUint16(fp, "e_lfarlc")
-    tagUint16(fp, "e_ovno")
-    tag(fp, 8, "e_res");
-    tagUint16(fp, "e_oemid")
-    tagUint16(fp, "e_oeminfo")
-    tag(fp, 20, "e_res2");
-    result['e_lfanew'] = tagUint32(fp, "e_lfanew")
-    print("[0x%X,0x%X) raw image_dos_header" % \
-        (oHdr, fp.tell()))
+    result = tagStruct(fp, IMAGE_DOS_HEADER)
+    assert result['e_magic'] == b'MZ'
+    emit(oHdr, fp.tell(), 'raw', "image_dos_header")
     return result
 
 # https://learn.microsoft.com/en-us/windows/win32/api/winnt/ns-winnt-image_file_header
+IMAGE_FILE_HEADER = StructLayout(
+    ('H', 'Machine', lambda x: '(%s)' % enum_int_to_name(IMAGE_FILE_MACHINE, x)),
+    ('H', 'NumberOfSections'),
+    ('I', 'TimeDateStamp'),
+    ('I', 'PointerToSymbolTable'),
+    ('I', 'NumberOfSymbols'),
+    ('H', 'SizeOfOptionalHeader'),
+    ('H', 'Characteristics'))
+
 def tag_image_file_header(fp, bits):
     assert bits in {32, 64}
 
-    result = {}
-
     start = fp.tell()
 
-    result['Machine'] = tagUint16(fp, "Machine", lambda x: '(%s)' % enum_int_to_name(IMAGE_FILE_MACHINE, x))
-    result['NumberOfSections'] = tagUint16(fp, 'NumberOfSections')
-    result['TimeDateStamp'] = tagUint32(fp, 'TimeDateStamp')
-    result['PointerToSymbolTable'] = tagUint32(fp, 'PointerToSymbolTable')
-    result['NumberOfSymbols'] = tagUint32(fp, 'NumberOfSymbols')
-    result['SizeOfOptionalHeader'] = tagUint16(fp, 'SizeOfOptionalHeader')
-    result['Characteristics'] = tagUint16(fp, 'Characteristics')
+    result = tagStruct(fp, IMAGE_FILE_HEADER)
 
     tagFromPosition(fp, start, f'image_file_header{bits}')
 
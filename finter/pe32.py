@@ -38,7 +38,7 @@ def analyze(fp):
             fp.seek(o)
             pe.tagReloc(fp, n)
         else:
-            print("[0x%X,0x%X) section \"%s\" contents" % (o, o+n, name))
+            emit(o, o+n, 'raw', "section \"%s\" contents" % name)
 
     # If data directory entry 14 (COM_DESCRIPTOR) looks like it points to a ClrHeader/IMAGE_COR20_HEADER
     # this is a .NET executable.
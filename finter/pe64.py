@@ -40,11 +40,14 @@ def analyze(fp):
         if name == '.reloc':
             fp.seek(o)
             pe.tagReloc(fp, n)
-        elif name == 'pdata':
+        elif name == '.pdata':
+            emit(o, o+n, 'raw', "section \"%s\" contents" % name)
+            # raw data is padded to the file alignment, the table is VirtualSize long
+            size = min(n, hdr['VirtualSize'])
             fp.seek(o)
-            pe.tagPdata(fp, n)
+            pe.tagPdata(fp, size - size % 12, 'x64')
         else:
-            print("[0x%X,0x%X) section \"%s\" contents" % (o, o+n, name))
+            emit(o, o+n, 'raw', "section \"%s\" contents" % name)
 
 if __name__ == '__main__':
     import sys
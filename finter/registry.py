@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+#
+# dissector name -> module, without importing anything until it's used
+#
+# the built-in dissectors are the modules listed in finter/__init__.py, their
+# signatures are in finter/identify.py
+#
+# other packages can add dissectors through entry points, eg: in setup.py
+#
+#   entry_points={
+#       'finter.dissectors': ['foo = mypackage.foo'],         # module with analyze(fp)
+#       'finter.signatures': ['foo = mypackage.foo_magic'],   # module calling finter.identify.register()
+#   }
+#
+# reading entry points is slow (it scans every installed package) so it only
+# happens when the built-ins can't answer
+
+import sys
+import importlib
+
+import finter
+from finter import identify
+
+# name -> module path
+dissectors = {name: 'finter.' + name for name in finter.__all__}
+
+plugins_loaded = False
+
+def register(name, module_path):
+    dissectors[name] = module_path
+
+def load_plugins():
+    global plugins_loaded
+    if plugins_loaded:
+        return
+    plugins_loaded = True
+
+    from importlib.metadata import entry_points
+
+    for ep in entry_points(group='finter.dissectors'):
+        dissectors.setdefault(ep.name, ep.value)
+
+    # these modules register their signatures when imported
+    for ep in entry_points(group='finter.signatures'):
+        ep.load()
+
+def names():
+    load_plugins()
+    return sorted(dissectors)
+
+# 'pe32' -> the finter.pe32 module, imported now if it wasn't already
+def get_module(name):
+    if not name in dissectors:
+        load_plugins()
+    if module_path := dissectors.get(name):
+        module = importlib.import_module(module_path)
+        # profiling wraps functions of modules as they're loaded
+        if (instrument := sys.modules.get('finter.instrument')) and instrument.enabled:
+            instrument.install()
+        return module
+
+def get_analyze(name):
+    if module := get_module(name):
+        return getattr(module, 'analyze', None)
+
+# [(confidence, name), ...] best first, see identify.identify()
+def identify_file(fpath, offset=0):
+    if candidates := identify.identify(fpath, offset):
+        return candidates
+
+    if not plugins_loaded:
+        load_plugins()
+        return identify.identify(fpath, offset)
+
+    return []
@@ -12,13 +12,15 @@ from struct import unpack
 from .helpers import *
 
 def analyze(fp):
+    fp = reader(fp)
+
     sample = fp.read(4).decode('utf-8')
     if not re.match(r'[XDQ][HL][234]\x0a', sample):
         return
 
     fp.seek(0)
 
-    while not IsEof(fp):
+    while not fp.eof():
         line = dataUntil(fp, b'\x0a', 1).decode('utf-8')
        
         m = re.match(r'^([XDQ])([HL])([234])', line)
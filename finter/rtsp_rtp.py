@@ -98,9 +98,11 @@ def tag_rtsp(fp):
 ###############################################################################
 
 def analyze(fp):
+    fp = reader(fp)
+
     setBigEndian()
 
-    while not IsEof(fp):
+    while not fp.eof():
         tag_rtsp(fp)
 
 if __name__ == '__main__':
@@ -57,6 +57,8 @@ def tag_subchunk_data(fp, n_channels, bits_per_sample):
         sample_num += 1
         
 def analyze(fp):
+    fp = reader(fp)
+
     base = fp.tell()
 
     ok = False
@@ -76,7 +78,7 @@ def analyze(fp):
     tagString(fp, 4, 'Format')
 
     # parse subchunks
-    while not IsEof(fp):
+    while not fp.eof():
         subchunk_id = peek(fp, 4)
         if subchunk_id == b'fmt ':
             n_chans, bits_per_sample = tag_subchunk_fmt(fp)
@@ -112,13 +112,15 @@ def tag_tlv(fp):
 ###############################################################################
 
 def analyze(fp):
+    fp = reader(fp)
+
     # start with type SEQUENCE, EXTENDED 2-byte length
     if peek(fp, 2) != b'\x30\x82':
         return
 
     setLittleEndian()
 
-    while not IsEof(fp):
+    while not fp.eof():
         tag_tlv(fp)
 
 if __name__ == '__main__':
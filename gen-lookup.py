@@ -1,53 +1,61 @@
 #!/usr/bin/env python
+#
+# generate a lookup from address to the description of what's there
+#
+# usage: gen-lookup.py [--binary PATH] <file> [shift]
+#
+#   shift           hex amount added to every address, eg: a load address
+#   --binary PATH   write a LookupTable (see helpers.py) to PATH instead,
+#                   LookupTable.load() memory maps it
+#
+# eg: ./gen-lookup.py ./hello > hello_lookup.py
+#     python -c 'import hello_lookup; print(hello_lookup.lookup(0x1040))'
+#
+# the generated module is sorted segment boundaries and a string table, see
+# LookupTable, with a bisect lookup(addr) returning None outside the file
 
 import sys
-from helpers import dissect_file, intervals_to_tree
+from helpers import dissect_file, intervals_to_tree, LookupTable, pop_option
+
+# tuples of constants compile to a single constant, cheap to import
+def print_tuple(name, values, fmt='%d', per_line=8):
+    print('%s = (' % name)
+    for i in range(0, len(values), per_line):
+        print('    ' + ', '.join(fmt % v for v in values[i:i+per_line]) + ',')
+    print(')')
+
+def print_module(table, source):
+    print('# generated by gen-lookup.py from %s' % source)
+    print('')
+    print('from bisect import bisect_right')
+    print('')
+    print_tuple('STARTS', table.starts, '0x%X')
+    print_tuple('ENDS', table.ends, '0x%X')
+    print_tuple('DEPTHS', table.depths, per_line=16)
+    print_tuple('DESCRIPTIONS', table.descriptions, per_line=16)
+    print_tuple('STRINGS', table.strings, '%r', per_line=1)
+    print('')
+    print('def lookup(addr):')
+    print('    i = bisect_right(STARTS, addr) - 1')
+    print('    if i >= 0 and addr < ENDS[i]:')
+    print('        return STRINGS[DESCRIPTIONS[i]]')
 
-def get_descr(hnode):
-    result = hnode.data if hnode.data != 'root' else ''
-    #if ' ' in result:
-    #    result = result.replace(' ', '_')
-    #if '=' in result:
-    #    result = result[0:result.find('=')]
-
-    if hnode.parent:
-        tmp = get_descr(hnode.parent)
-        result = tmp + (', ' if tmp else '') + result
-
-    return result
-
-def print_recur(hnode, depth=0):
-    if hnode.data == 'fragment':
-        return ''
-
-    indent = depth*'    '
-
-    length = hnode.end - hnode.begin
-    length_str = '%d'%length if length < 16 else '0x%X'%length
-
-    descr = get_descr(hnode)
-
-    print('%sif addr >= 0x%X and addr < 0x%X:' % (indent, hnode.begin, hnode.end))
-
-    for child in sorted(hnode.children, key=lambda x: x.begin):
-        print_recur(child, depth+1)
+if __name__ == '__main__':
+    binary_path = pop_option('binary')
 
-    print('%sreturn \'%s\'' % (indent+'    ', descr))
+    if not sys.argv[1:]:
+        print('usage: %s [--binary PATH] <file> [shift]' % sys.argv[0])
+        sys.exit(-1)
 
-if __name__ == '__main__':
-    shift_amount = None
+    shift_amount = 0
     if sys.argv[2:]:
         shift_amount = int(sys.argv[2], 16)
 
     tree = dissect_file(sys.argv[1])
     root = intervals_to_tree(tree)
+    table = LookupTable.from_tree(root, shift_amount)
 
-    if shift_amount:
-        def all_nodes(n):
-            return [n] + sum([all_nodes(c) for c in n.children], [])
-
-        for node in all_nodes(root):
-            node.begin += shift_amount
-            node.end += shift_amount
-
-    print_recur(root)
+    if binary_path:
+        table.save(binary_path)
+    else:
+        print_module(table, sys.argv[1])
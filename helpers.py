@@ -4,10 +4,22 @@ import io
 import os
 import re
 import sys
+import mmap
+import array
+import bisect
+import struct
+import atexit
+import shutil
+import collections
+import hashlib
 from subprocess import Popen, PIPE
 
-from finter import *
-import algorithm
+import numpy as np
+
+import client
+import finter
+from finter import registry, instrument
+from finter.helpers import ListSink, WindowSink, Context, use_context, reader
 
 def shellout(cmd):
     process = Popen(cmd, stdout=PIPE, stderr=PIPE)
@@ -32,6 +44,7 @@ class Interval:
     def __len__(self):
         return self.end - self.begin
 
+@instrument.phased('parse')
 def intervals_from_text(lines):
     """ convert list of "[0 5] blah" lines to intervals """
 
@@ -62,6 +75,177 @@ def intervals_from_text(lines):
 
     return intervals
 
+# columnar storage for many intervals
+# - .begin and .end are uint64 arrays
+# - .type_code indexes .types, the distinct type strings
+# - .comment_id indexes .comments, the interned comment strings
+#
+# selecting rows gives a new table sharing the same string pools
+class IntervalTable:
+    def __init__(self, begin, end, type_code, comment_id, types, comments):
+        self.begin = np.asarray(begin, dtype=np.uint64)
+        self.end = np.asarray(end, dtype=np.uint64)
+        self.type_code = np.asarray(type_code, dtype=np.uint16)
+        self.comment_id = np.asarray(comment_id, dtype=np.uint32)
+        self.types = types
+        self.comments = comments
+
+    @classmethod
+    def from_intervals(cls, intervals):
+        sink = TableSink()
+        for i in intervals:
+            sink.interval(i.begin, i.end, i.type_, i.comment)
+        return sink.table()
+
+    def __len__(self):
+        return len(self.begin)
+
+    def __getitem__(self, i):
+        return Interval(int(self.begin[i]), int(self.end[i]), self.types[self.type_code[i]],
+            self.comments[self.comment_id[i]])
+
+    def __iter__(self):
+        return (Interval(*r) for r in self.records())
+
+    # rows as (begin, end, type_, comment) tuples
+    def records(self):
+        types, comments = self.types, self.comments
+        return [(b, e, types[t], comments[c]) for (b, e, t, c) in zip(self.begin.tolist(),
+            self.end.tolist(), self.type_code.tolist(), self.comment_id.tolist())]
+
+    # new table from a boolean mask or an index array
+    def select(self, which):
+        return IntervalTable(self.begin[which], self.end[which], self.type_code[which],
+            self.comment_id[which], self.types, self.comments)
+
+    def append(self, begin, end, type_, comment):
+        types, comments = self.types, self.comments
+        if not type_ in types:
+            types = types + [type_]
+        if not comment in comments:
+            comments = comments + [comment]
+        return IntervalTable(np.append(self.begin, np.uint64(begin)), np.append(self.end, np.uint64(end)),
+            np.append(self.type_code, types.index(type_)), np.append(self.comment_id, comments.index(comment)),
+            types, comments)
+
+    def lengths(self):
+        return self.end - self.begin
+
+    #
+    # filters
+    #
+
+    # intervals sharing at least one byte with [lo, hi)
+    def overlapping(self, lo, hi):
+        return self.select((self.begin < np.uint64(hi)) & (self.end > np.uint64(lo)))
+
+    # intervals that envelope [lo, hi)
+    def containing(self, lo, hi=None):
+        if hi is None:
+            hi = lo + 1
+        return self.select((self.begin <= np.uint64(lo)) & (self.end >= np.uint64(hi)))
+
+    # intervals enveloped by [lo, hi)
+    def contained_in(self, lo, hi):
+        return self.select((self.begin >= np.uint64(lo)) & (self.end <= np.uint64(hi)))
+
+    def of_type(self, type_):
+        if not type_ in self.types:
+            return self.select(np.zeros(len(self), dtype=bool))
+        return self.select(self.type_code == self.types.index(type_))
+
+    # the prefix test runs once per distinct comment, not once per interval
+    def with_comment_prefix(self, prefix):
+        hit = np.fromiter((c.startswith(prefix) for c in self.comments), dtype=bool,
+            count=len(self.comments))
+        return self.select(hit[self.comment_id])
+
+    #
+    # sorting
+    #
+
+    # order that visits every interval after all intervals enveloping it, see
+    # intervals_to_tree()
+    def nesting_order(self):
+        index = np.arange(len(self), dtype=np.int64)
+        return np.lexsort((-index, ~self.end, self.begin))
+
+    def sorted(self):
+        return self.select(self.nesting_order())
+
+    #
+    # storage
+    #
+
+    # columns as-is, the string pools as one utf-8 blob each plus end offsets
+    # - path may also be a binary file object, eg: io.BytesIO
+    def save(self, path):
+        if not hasattr(path, 'write'):
+            with open(path, 'wb') as fp:
+                return self.save(fp)
+
+        (types, types_ends) = pack_strings(self.types)
+        (comments, comments_ends) = pack_strings(self.comments)
+        np.savez(path, begin=self.begin, end=self.end, type_code=self.type_code,
+            comment_id=self.comment_id, types=types, types_ends=types_ends,
+            comments=comments, comments_ends=comments_ends)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['begin'], data['end'], data['type_code'], data['comment_id'],
+                unpack_strings(data['types'], data['types_ends']),
+                unpack_strings(data['comments'], data['comments_ends']))
+
+def pack_strings(strings):
+    blob = ''.join(strings).encode('utf-8', 'surrogatepass')
+    ends = np.cumsum([len(s) for s in strings], dtype=np.uint64)
+    return (np.frombuffer(blob, dtype=np.uint8), ends)
+
+def unpack_strings(blob, ends):
+    text = blob.tobytes().decode('utf-8', 'surrogatepass')
+    ends = ends.tolist()
+    return [text[a:b] for (a, b) in zip([0] + ends[:-1], ends)]
+
+# sink that accumulates intervals straight into IntervalTable columns
+class TableSink():
+    def __init__(self):
+        self.begin = array.array('Q')
+        self.end = array.array('Q')
+        self.type_code = array.array('H')
+        self.comment_id = array.array('I')
+        self.types = {}
+        self.comments = {}
+
+    def interval(self, begin, end, type_, comment):
+        # null intervals would be filtered out anyway
+        if end <= begin:
+            return
+
+        if (code := self.types.get(type_)) is None:
+            code = self.types[type_] = len(self.types)
+        if (cid := self.comments.get(comment)) is None:
+            cid = self.comments[comment] = len(self.comments)
+
+        self.begin.append(begin)
+        self.end.append(end)
+        self.type_code.append(code)
+        self.comment_id.append(cid)
+
+    def intervals(self, records):
+        for (begin, end, type_, comment) in records:
+            self.interval(begin, end, type_, comment)
+
+    def note(self, text):
+        pass
+
+    def table(self):
+        return IntervalTable(np.frombuffer(self.begin, dtype=np.uint64),
+            np.frombuffer(self.end, dtype=np.uint64),
+            np.frombuffer(self.type_code, dtype=np.uint16),
+            np.frombuffer(self.comment_id, dtype=np.uint32),
+            list(self.types), list(self.comments))
+
 # minimum idea of "node"
 class FinterNode():
     def __init__(self, begin, end, type_, comment):
@@ -71,46 +255,77 @@ class FinterNode():
         self.comment = comment
         self.children = []
         self.parent = None
+        # children are in order and gaps filled, see finalize_tree()
+        self.sorted = False
 
     def __len__(self):
         return self.end - self.begin
 
     def __str__(self, depth=0):
-        result = '  '*depth
-        result += '[0x%x,0x%x) %s %s\n' % (self.begin, self.end, self.type_, self.comment)
-        for c in sorted(self.children, key=lambda x: x.begin):
-            result += c.__str__(depth+1)
-        return result
+        return ''.join('%s[0x%x,0x%x) %s %s\n' % ('  '*d, n.begin, n.end, n.type_, n.comment)
+            for (n, d) in walk(self, depth))
 
-def sort_and_create_fragments(node, NodeClass=FinterNode):
-    result = []
+# sort each node's children by begin (once, nodes already .sorted are left as
+# they are), fill the gaps between them with fragments and mark the node
+# .sorted; everything walking the tree afterwards relies on the order
+#
+# iterative, so deep trees (nested DER, tunnelled packets) can't reach the
+# recursion limit
+def finalize_tree(root, NodeClass=FinterNode):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if not node.children or getattr(node, 'sorted', False):
+            continue
 
-    if not node.children:
-        return
+        result = []
 
-    # fill gaps ahead of each child
-    current = node.begin
-    for child in sorted(node.children, key=lambda ch: ch.begin):
-        if current < child.begin:
-            frag = NodeClass(current, child.begin, 'raw', 'fragment')
+        # fill gaps ahead of each child
+        current = node.begin
+        for child in sorted(node.children, key=lambda ch: ch.begin):
+            if current < child.begin:
+                frag = NodeClass(current, child.begin, 'raw', 'fragment')
+                frag.parent = node
+                result.append(frag)
+            result.append(child)
+            current = child.end
+
+        # fill possible gap after last child
+        if current != node.end:
+            frag = NodeClass(current, node.end, 'raw', 'fragment')
             frag.parent = node
             result.append(frag)
-        result.append(child)
-        current = child.end
 
-    # fill possible gap after last child
-    if current != node.end:
-        frag = NodeClass(current, node.end, 'raw', 'fragment')
-        frag.parent = node
-        result.append(frag)
+        # replace children with list that includes gaps
+        node.children = result
+        node.sorted = True
+
+        stack.extend(result)
 
-    # replace children with list that includes gaps
-    node.children = result
+    return root
 
-    # recur on children
-    for child in node.children:
-        sort_and_create_fragments(child, NodeClass)
+# (node, depth) for <root> and all beneath it, parents before their children,
+# children in order; skip(node) true leaves out node and its subtree
+def walk(root, depth=0, skip=None):
+    if skip and skip(root):
+        return
+    yield (root, depth)
+
+    # iterators over the children of each node on the way down from root
+    stack = [iter(root.children)]
+    while stack:
+        for node in stack[-1]:
+            if skip and skip(node):
+                continue
+            yield (node, depth + len(stack))
+            if node.children:
+                stack.append(iter(node.children))
+                break
+        else:
+            stack.pop()
 
+# convert algorithm.build() output (anodes with .item holding Interval) to
+# NodeClass, intervals_to_tree() no longer uses it but the benchmarks do
 def intervals_to_tree_worker(anode, NodeClass):
     if anode.root:
         result = NodeClass(0, 0, '', 'root')
@@ -122,98 +337,702 @@ def intervals_to_tree_worker(anode, NodeClass):
 
     return result
 
+@instrument.phased('tree build')
 def intervals_to_tree(intervals, NodeClass=FinterNode):
-    # define relation R: (x,y) \in R iff x envelopes y
-    def relation(x:Interval, y:Interval):
-        return x.begin <= y.begin and x.end >= y.end
+    # visit intervals so that every interval comes after all intervals that
+    # envelope it: by begin ascending, then by end descending (wider first)
+    #
+    # among identical intervals the one emitted last is visited first and ends
+    # up outermost, as algorithm.build() would have placed it
+    if isinstance(intervals, IntervalTable):
+        records = intervals.sorted().records()
+    else:
+        order = sorted(range(len(intervals)),
+            key=lambda i: (intervals[i].begin, -intervals[i].end, -i))
+        records = [(intervals[i].begin, intervals[i].end, intervals[i].type_, intervals[i].comment) for i in order]
 
-    atree = algorithm.build(intervals, relation)
+    # single pass keeping the chain of open ancestors on a stack: anything on
+    # the stack that ends before the current interval can't contain it
+    roots = []
+    stack = []
+    for record in records:
+        node = NodeClass(*record)
 
-    # the whole-file interval should have been placed just below root
-    assert len(atree.children) == 1
-    atree = atree.children[0]
+        while stack and stack[-1].end < node.end:
+            stack.pop()
+
+        if stack:
+            node.parent = stack[-1]
+            stack[-1].children.append(node)
+        else:
+            roots.append(node)
 
-    # convert the algorithm's output (anodes with .item holding Interval) to
-    # the requested NodeClass
+        stack.append(node)
 
-    hnRoot = intervals_to_tree_worker(atree, NodeClass)
+    # the whole-file interval should be the only top level interval
+    assert len(roots) == 1
+    hnRoot = roots[0]
 
-    # create fragments
-    sort_and_create_fragments(hnRoot, NodeClass)
+    # order children, create fragments
+    finalize_tree(hnRoot, NodeClass)
 
     # done
     return hnRoot
 
+class TreeBuilder():
+    """ nest intervals as they're emitted, handing back finished subtrees of
+        the root [begin, end) in order, so a tree can be consumed while the
+        file is still being dissected
+
+        dissectors emit parents shortly after their children (tagFromPosition)
+        so a subtree is finished once <window> intervals have arrived since one
+        started at or beyond its end; only the unfinished ones are held """
+
+    def __init__(self, begin, end, type_='raw', comment='file', window=1024, NodeClass=FinterNode):
+        self.root = NodeClass(begin, end, type_, comment)
+        self.NodeClass = NodeClass
+        self.window = window
+        # unfinished top level subtrees, by begin, finished ones leave from the left
+        self.pending = collections.deque()
+        # everything before this was handed back
+        self.cursor = begin
+        # the furthest begin seen, as it was for each of the last <window> intervals
+        self.frontier = begin
+        self.history = collections.deque(maxlen=window)
+        self.started = False
+        # intervals that arrived after the subtree they belong to was handed back
+        self.late = 0
+
+    # take an interval, return the subtrees (and fragments between them) now finished
+    def add(self, begin, end, type_, comment):
+        # the root is named by whichever interval covering it arrives last, until output starts
+        if begin == self.root.begin and end == self.root.end:
+            if not self.started:
+                (self.root.type_, self.root.comment) = (type_, comment)
+            return []
+
+        node = self.NodeClass(begin, end, type_, comment)
+
+        if begin < self.cursor:
+            self.late += 1
+            node.parent = self.root
+            return [node]
+
+        self.insert(self.pending, node, self.root)
+
+        self.frontier = max(self.frontier, begin)
+        self.history.append(self.frontier)
+        if len(self.history) < self.window:
+            return []
+        return self.ready(self.history[0])
+
+    # hand back whatever is left
+    def finish(self):
+        result = self.ready(self.root.end)
+        if self.started and self.cursor < self.root.end:
+            result.append(self.fragment(self.cursor, self.root.end))
+        return result
+
+    def insert(self, siblings, node, parent):
+        # siblings are disjoint and sorted, only the last one starting at or
+        # before node can enclose it, and most intervals land near the end
+        for sibling in reversed(siblings):
+            if sibling.begin <= node.begin:
+                if node.end <= sibling.end and (sibling.begin, sibling.end) != (node.begin, node.end):
+                    return self.insert(sibling.children, node, sibling)
+                break
+
+        # node takes the siblings it encloses as children, of those starting
+        # at or after it (taken off the end, siblings may be a deque)
+        i = len(siblings)
+        while i and siblings[i-1].begin >= node.begin:
+            i -= 1
+        after = [siblings.pop() for _ in range(len(siblings) - i)][::-1]
+        node.children = [s for s in after if s.end <= node.end]
+        for child in node.children:
+            child.parent = node
+        siblings.append(node)
+        siblings.extend(s for s in after if s.end > node.end)
+        node.parent = parent
+
+    # finish the pending subtrees that end by <limit>
+    def ready(self, limit):
+        result = []
+        while self.pending and self.pending[0].end <= limit:
+            node = self.pending.popleft()
+            if self.cursor < node.begin:
+                result.append(self.fragment(self.cursor, node.begin))
+            finalize_tree(node, self.NodeClass)
+            result.append(node)
+            self.cursor = max(self.cursor, node.end)
+            self.started = True
+        return result
+
+    def fragment(self, begin, end):
+        frag = self.NodeClass(begin, end, 'raw', 'fragment')
+        frag.parent = self.root
+        return frag
+
+#------------------------------------------------------------------------------
+# lookup tables
+#------------------------------------------------------------------------------
+
+# address -> description of the deepest interval containing it, written by
+# gen-lookup.py
+#
+# the tree is flattened into disjoint [start, end) segments sorted by start,
+# each with the depth of its deepest interval and an index into a table of
+# descriptions ("outer, ..., inner" comments), so a lookup is one bisect
+#
+# binary form (little endian), memory mapped by load():
+#
+# header: b'FINL' version (uint32), count num_strings len(blob) (uint64)
+# then:   starts, ends (uint64 x count), string ends (uint64 x num_strings),
+#         descriptions (uint32 x count), depths (uint16 x count), blob (utf-8)
+
+LOOKUP_MAGIC = b'FINL'
+LOOKUP_VERSION = 1
+LOOKUP_HEADER = '<4sIQQQ'
+
+class LookupTable():
+    def __init__(self, starts, ends, depths, descriptions, strings):
+        self.starts = starts
+        self.ends = ends
+        self.depths = depths
+        self.descriptions = descriptions
+        self.strings = strings
+
+    # flatten a tree from intervals_to_tree(), fragments take their parent's description
+    @classmethod
+    def from_tree(cls, root, shift=0):
+        (starts, ends, depths, descriptions) = (array.array('Q'), array.array('Q'), array.array('H'), array.array('I'))
+        strings = {}
+
+        def segment(begin, end, depth, descr):
+            if begin >= end:
+                return
+            # adjacent segments that would answer the same merge
+            if starts and ends[-1] == begin + shift and depths[-1] == depth and descriptions[-1] == descr:
+                ends[-1] = end + shift
+                return
+            starts.append(begin + shift)
+            ends.append(end + shift)
+            depths.append(depth)
+            descriptions.append(descr)
+
+        # a node being flattened: [its remaining children, where its next
+        # segment starts, where it's visible until, depth, description index, text];
+        # <node> is visible in [lo, hi), where earlier siblings it overlaps aren't
+        def enter(node, lo, hi, depth, prefix):
+            text = prefix + (', ' if prefix else '') + node.comment
+            if (descr := strings.get(text)) is None:
+                descr = strings[text] = len(strings)
+            return [iter(node.children), lo, hi, depth, descr, text]
+
+        stack = [enter(root, root.begin, root.end, 0, '')]
+        while stack:
+            frame = stack[-1]
+            (children, current, hi, depth, descr, text) = frame
+            for child in children:
+                if child.comment == 'fragment' or child.end <= current or child.begin >= hi:
+                    continue
+                segment(current, max(current, child.begin), depth, descr)
+                current = max(current, child.begin)
+                # resume after the child once it's done
+                frame[1] = min(child.end, hi)
+                stack.append(enter(child, current, min(child.end, hi), depth+1, text))
+                break
+            else:
+                segment(current, hi, depth, descr)
+                stack.pop()
+
+        return cls(starts, ends, depths, descriptions, list(strings))
+
+    def __len__(self):
+        return len(self.starts)
+
+    # index of the segment holding <addr>, or None
+    def find(self, addr):
+        i = bisect.bisect_right(self.starts, addr) - 1
+        if i >= 0 and addr < self.ends[i]:
+            return i
+
+    def lookup(self, addr):
+        if (i := self.find(addr)) is not None:
+            return self.strings[self.descriptions[i]]
+
+    def depth(self, addr):
+        if (i := self.find(addr)) is not None:
+            return self.depths[i]
+
+    # descriptions for many addresses at once, None where nothing contains one
+    def lookup_many(self, addrs):
+        if not len(self):
+            return [None] * len(addrs)
+        starts = np.frombuffer(self.starts, dtype=np.uint64)
+        addrs = np.asarray(addrs, dtype=np.uint64)
+        index = np.searchsorted(starts, addrs, side='right').astype(np.int64) - 1
+        hit = (index >= 0) & (addrs < np.frombuffer(self.ends, dtype=np.uint64)[np.maximum(index, 0)])
+        descriptions = np.frombuffer(self.descriptions, dtype=np.uint32)[np.maximum(index, 0)]
+        strings = self.strings
+        return [strings[d] if h else None for (d, h) in zip(descriptions.tolist(), hit.tolist())]
+
+    def save(self, path):
+        encoded = [text.encode('utf-8', 'surrogatepass') for text in self.strings]
+        string_ends = np.cumsum([len(e) for e in encoded], dtype=np.uint64)
+        with open(path, 'wb') as fp:
+            fp.write(struct.pack(LOOKUP_HEADER, LOOKUP_MAGIC, LOOKUP_VERSION, len(self), len(encoded), int(string_ends[-1]) if encoded else 0))
+            for (column, dtype) in [(self.starts, '<u8'), (self.ends, '<u8'), (string_ends, '<u8'),
+              (self.descriptions, '<u4'), (self.depths, '<u2')]:
+                fp.write(np.asarray(column, dtype=dtype).tobytes())
+            fp.write(b''.join(encoded))
+
+    # columns are views of the mapped file, nothing is read until looked up
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as fp:
+            data = memoryview(mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ))
+
+        (magic, version, count, num_strings, blob_size) = struct.unpack_from(LOOKUP_HEADER, data)
+        if magic != LOOKUP_MAGIC or version != LOOKUP_VERSION:
+            raise ValueError(f'{path} is not a version {LOOKUP_VERSION} lookup table')
+
+        columns = []
+        offset = struct.calcsize(LOOKUP_HEADER)
+        for (fmt, n) in [('Q', count), ('Q', count), ('Q', num_strings), ('I', count), ('H', count), ('B', blob_size)]:
+            size = n * struct.calcsize(fmt)
+            column = data[offset:offset+size].cast(fmt)
+            if sys.byteorder != 'little' and fmt != 'B':
+                column = array.array(fmt, column)
+                column.byteswap()
+            columns.append(column)
+            offset += size
+
+        (starts, ends, string_ends, descriptions, depths, blob) = columns
+        return cls(starts, ends, depths, descriptions, MappedStrings(blob, string_ends))
+
+# the string table of a loaded LookupTable, decoded as strings are asked for
+class MappedStrings():
+    def __init__(self, blob, ends):
+        self.blob = blob
+        self.ends = ends
+        self.decoded = {}
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __getitem__(self, i):
+        if (text := self.decoded.get(i)) is None:
+            begin = self.ends[i-1] if i else 0
+            text = self.decoded[i] = bytes(self.blob[begin:self.ends[i]]).decode('utf-8', 'surrogatepass')
+        return text
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+#------------------------------------------------------------------------------
+# binary interval stream
+#------------------------------------------------------------------------------
+
+# compact alternative to the text protocol, written by raw.py --binary
+#
+# header: b'FINB' version file_size len(dissector) dissector
+# blocks: count len(numbers) numbers
+#         num_new_types num_new_comments len(lengths) lengths len(blob) blob
+#
+# - every integer is a LEB128 varint
+# - numbers are four per interval: zigzag(begin - previous begin),
+#   zigzag(end - begin), type ref and comment ref
+# - a ref of 0 takes the next of the block's new strings, n refers to string
+#   n-1 of those seen so far
+# - lengths are of the block's new types then new comments (in characters),
+#   blob is all of them as utf-8, like IntervalTable.save()
+
+BINARY_MAGIC = b'FINB'
+BINARY_VERSION = 1
+
+def varint(n):
+    result = bytearray()
+    while n >= 0x80:
+        result.append((n & 0x7F) | 0x80)
+        n >>= 7
+    result.append(n)
+    return bytes(result)
+
+def read_varint(data, pos):
+    (result, shift) = (0, 0)
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return (result, pos)
+        shift += 7
+
+# uint64 array -> varint bytes, all at once
+def encode_varints(values):
+    values = np.asarray(values, dtype=np.uint64)
+    nbytes = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while np.any(rest):
+        nbytes += rest > 0
+        rest >>= np.uint64(7)
+
+    owner = np.repeat(np.arange(len(values)), nbytes)
+    index = np.arange(len(owner)) - np.repeat(np.cumsum(nbytes) - nbytes, nbytes)
+    out = ((values[owner] >> (np.uint64(7) * index.astype(np.uint64))) & np.uint64(0x7F)).astype(np.uint8)
+    out[index < nbytes[owner] - 1] |= 0x80
+    return out.tobytes()
+
+# uint8 array of varints -> uint64 array, all at once
+def decode_varints(buf):
+    buf = np.asarray(buf, dtype=np.uint8)
+    last = np.flatnonzero(buf < 0x80)
+    if not len(last):
+        return np.zeros(0, dtype=np.uint64)
+    first = np.concatenate(([0], last[:-1] + 1))
+    shift = (np.arange(len(buf)) - np.repeat(first, last - first + 1)) * 7
+    parts = (buf & 0x7F).astype(np.uint64) << shift.astype(np.uint64)
+    return np.bitwise_or.reduceat(parts, first)
+
+def zigzag(values):
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+def unzigzag(values):
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+# sink writing the binary stream to a binary file object, call .close() at the end
+class BinarySink():
+    def __init__(self, fp, file_size=0, dissector='', block_size=1<<16):
+        self.fp = fp
+        self.block_size = block_size
+        self.types = {}
+        self.comments = {}
+        self.prev_begin = 0
+
+        name = dissector.encode('utf-8')
+        fp.write(BINARY_MAGIC + varint(BINARY_VERSION) + varint(file_size) + varint(len(name)) + name)
+        self.start_block()
+
+    def start_block(self):
+        self.begin = array.array('q')
+        self.end = array.array('q')
+        self.type_ref = array.array('Q')
+        self.comment_ref = array.array('Q')
+        self.new_types = []
+        self.new_comments = []
+
+    def interval(self, begin, end, type_, comment):
+        if (ref := self.types.get(type_)) is None:
+            self.types[type_] = len(self.types)
+            self.new_types.append(type_)
+            self.type_ref.append(0)
+        else:
+            self.type_ref.append(ref + 1)
+
+        if (ref := self.comments.get(comment)) is None:
+            self.comments[comment] = len(self.comments)
+            self.new_comments.append(comment)
+            self.comment_ref.append(0)
+        else:
+            self.comment_ref.append(ref + 1)
+
+        self.begin.append(begin)
+        self.end.append(end)
+
+        if len(self.begin) >= self.block_size:
+            self.flush()
+
+    def intervals(self, records):
+        for (begin, end, type_, comment) in records:
+            self.interval(begin, end, type_, comment)
+
+    def note(self, text):
+        pass
+
+    def flush(self):
+        if not self.begin:
+            return
+
+        begin = np.frombuffer(self.begin, dtype=np.int64)
+        end = np.frombuffer(self.end, dtype=np.int64)
+        numbers = np.column_stack((zigzag(np.diff(begin, prepend=self.prev_begin)), zigzag(end - begin),
+            np.frombuffer(self.type_ref, dtype=np.uint64), np.frombuffer(self.comment_ref, dtype=np.uint64)))
+        numbers = encode_varints(numbers.ravel())
+
+        (blob, ends) = pack_strings(self.new_types + self.new_comments)
+        lengths = encode_varints(np.diff(ends, prepend=np.uint64(0)))
+        blob = blob.tobytes()
+
+        self.fp.write(b''.join([varint(len(begin)), varint(len(numbers)), numbers,
+            varint(len(self.new_types)), varint(len(self.new_comments)),
+            varint(len(lengths)), lengths, varint(len(blob)), blob]))
+
+        self.prev_begin = int(begin[-1])
+        self.start_block()
+
+    def close(self):
+        self.flush()
+        self.fp.flush()
+
+# return (version, file_size, dissector, offset of first block)
+def binary_header(data):
+    if bytes(data[0:4]) != BINARY_MAGIC:
+        raise Exception('not a binary interval stream')
+    (version, pos) = read_varint(data, 4)
+    if version != BINARY_VERSION:
+        raise Exception(f'unsupported binary interval stream version {version}')
+    (file_size, pos) = read_varint(data, pos)
+    (length, pos) = read_varint(data, pos)
+    dissector = bytes(data[pos:pos+length]).decode('utf-8')
+    return (version, file_size, dissector, pos+length)
+
+# refs of a block to codes into <pool>, which the block's <new> strings are added to
+def resolve_refs(refs, pool, new):
+    codes = refs.astype(np.int64) - 1
+    is_new = refs == 0
+    codes[is_new] = len(pool) + np.arange(np.count_nonzero(is_new))
+    pool.extend(new)
+    return codes
+
+@instrument.phased('parse')
+def intervals_from_binary(data):
+    """ convert a binary interval stream (bytes or a memory map) to an IntervalTable """
+
+    (_, _, _, pos) = binary_header(data)
+    buf = np.frombuffer(data, dtype=np.uint8)
+
+    (types, comments) = ([], [])
+    columns = []
+    prev_begin = 0
+    while pos < len(buf):
+        (count, pos) = read_varint(data, pos)
+        (size, pos) = read_varint(data, pos)
+        numbers = decode_varints(buf[pos:pos+size]).reshape(count, 4)
+        pos += size
+
+        (num_types, pos) = read_varint(data, pos)
+        (num_comments, pos) = read_varint(data, pos)
+        (size, pos) = read_varint(data, pos)
+        ends = np.cumsum(decode_varints(buf[pos:pos+size]), dtype=np.uint64)
+        pos += size
+        (size, pos) = read_varint(data, pos)
+        strings = unpack_strings(buf[pos:pos+size], ends)
+        pos += size
+
+        begin = prev_begin + np.cumsum(unzigzag(numbers[:, 0]))
+        end = begin + unzigzag(numbers[:, 1])
+        type_code = resolve_refs(numbers[:, 2], types, strings[:num_types])
+        comment_id = resolve_refs(numbers[:, 3], comments, strings[num_types:])
+        columns.append((begin, end, type_code, comment_id))
+        prev_begin = int(begin[-1])
+
+    if not columns:
+        return IntervalTable([], [], [], [], types, comments)
+
+    (begin, end, type_code, comment_id) = (np.concatenate(c) for c in zip(*columns))
+    return IntervalTable(begin, end, type_code, comment_id, types, comments)
+
+#------------------------------------------------------------------------------
+# leaf values
+#------------------------------------------------------------------------------
+
+# the file's bytes for slicing by offset, mapped rather than read
+def map_file(fp):
+    # mmap can't map an empty file
+    if not os.fstat(fp.fileno()).st_size:
+        return b''
+    return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+# nodes without children beneath (and including) <root>, in file order
+def tree_leaves(root):
+    return [node for (node, _) in walk(root) if not node.children]
+
+def decode_uleb128(data):
+    value = 0
+    for (i, byte) in enumerate(data):
+        value |= (byte & 0x7F) << (7*i)
+    return value
+
+# give every leaf beneath <root> a .value from <data> (see map_file()), in one
+# pass in file order:
+# - numbers (types that are struct formats) decoded by a struct compiled once per type
+# - 'uleb128' an int, 'string' a str, 'none' None
+# - everything else, or a number whose length is off, a memoryview of its bytes
+def extract_values(root, data):
+    view = memoryview(data)
+
+    # type -> struct.Struct, or None for types that aren't numbers
+    formats = {}
+
+    for leaf in tree_leaves(root):
+        (type_, begin, end) = (leaf.type_, leaf.begin, leaf.end)
+        if (fmt := formats.get(type_, False)) is False:
+            fmt = formats[type_] = struct.Struct(finter_type_to_struct_fmt(type_)) if STRUCT_TYPE.fullmatch(type_) else None
+
+        if fmt:
+            leaf.value = fmt.unpack_from(view, begin)[0] if end - begin == fmt.size else view[begin:end]
+        elif type_ == 'none':
+            leaf.value = None
+        elif type_ == 'string':
+            leaf.value = bytes(view[begin:end]).rstrip(b'\x00').decode('utf-8', 'replace')
+        elif type_ == 'uleb128':
+            leaf.value = decode_uleb128(view[begin:end])
+        else:
+            leaf.value = view[begin:end]
+
+# names of <children> (their .name), where several share a name they get a
+# numeric distinguisher appended in order (data0, data1, ...), skipping names in use
+def unique_names(children):
+    counts = collections.Counter(ch.name for ch in children)
+    taken = set(counts)
+    suffix = {}
+
+    result = []
+    for ch in children:
+        name = ch.name
+        if counts[name] > 1:
+            n = suffix.get(name, 0)
+            while f'{name}{n}' in taken:
+                n += 1
+            suffix[name] = n + 1
+            name = f'{name}{n}'
+            taken.add(name)
+        result.append(name)
+    return result
+
+#------------------------------------------------------------------------------
+# interval cache
+#------------------------------------------------------------------------------
+
+# dissect_file() saves its IntervalTable keyed by file content, dissector module
+# and the finter sources, so a repeat run on the same file skips dissection
+# - FINTER_CACHE_DIR picks the directory, default ~/.cache/finter
+# - FINTER_CACHE_SIZE bounds it (bytes), least recently used entries go first
+# - FINTER_NO_CACHE=1, --no-cache or dissect_file(..., cache=False) turn it off
+
+CACHE_FORMAT = 1
+
+def cache_dir():
+    if path := os.environ.get('FINTER_CACHE_DIR'):
+        return path
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'finter')
+
+def cache_enabled():
+    return os.environ.get('FINTER_NO_CACHE', '') in ('', '0')
+
+# any edit to any dissector (or the helpers they share) invalidates old entries
+source_hash = None
+def finter_source_hash():
+    global source_hash
+    if source_hash is None:
+        h = hashlib.blake2b(digest_size=16)
+        directory = os.path.dirname(finter.__file__)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.py'):
+                with open(os.path.join(directory, name), 'rb') as fp:
+                    h.update(name.encode() + b'\x00' + fp.read())
+        source_hash = h.hexdigest()
+    return source_hash
+
+def cache_key(fpath, initial_offset, module_name):
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f'{CACHE_FORMAT} {module_name} {finter_source_hash()} {initial_offset}\n'.encode())
+    with open(fpath, 'rb') as fp:
+        while chunk := fp.read(1<<20):
+            h.update(chunk)
+    return h.hexdigest()
+
+@instrument.phased('cache')
+def cache_load(key):
+    path = os.path.join(cache_dir(), key + '.npz')
+    try:
+        table = IntervalTable.load(path)
+        # mark most recently used
+        os.utime(path)
+    except (OSError, ValueError, KeyError):
+        # missing, or damaged by an interrupted write
+        return None
+    return table
+
+@instrument.phased('cache')
+def cache_store(key, table):
+    directory = cache_dir()
+    path = os.path.join(directory, key + '.npz')
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(directory, exist_ok=True)
+        table.save(tmp)
+        os.replace(tmp, path)
+        cache_evict(directory, int(os.environ.get('FINTER_CACHE_SIZE', 1<<30)))
+    except OSError as e:
+        # a cache that can't be written just means no caching
+        print(f'WARNING: unable to cache intervals: {e}', file=sys.stderr)
+
+# remove least recently used entries until the directory is under limit bytes
+def cache_evict(directory, limit):
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith('.npz'):
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+
+    total = sum(size for (_, size, _) in entries)
+    for (_, size, path) in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # another process got to it first
+            pass
+        total -= size
+
 #------------------------------------------------------------------------------
 # convenience stuff
 #------------------------------------------------------------------------------
 
+# only consulted when no registered signature matches, and if `file` is installed
+sig2analyze = [
+    (r'GPG symmetrically encrypted data', 'gpg'),
+    (r'ELF 32-bit (LSB|MSB)', 'elf32'),
+    (r'ELF 64-bit (LSB|MSB)', 'elf64'),
+    (r'PE32 executable .* 80386', 'pe32'),
+    (r'PE32\+ executable .* x86-64', 'pe64'),
+    (r'Dalvik dex file', 'dex'),
+    (r'MS-DOS executable', 'exe'),
+    (r'Mach-O ', 'macho'),
+    (r'RIFF \(little-endian\) data, WAVE audio', 'wav'),
+    (r'^COMBO_BOOT', 'combo_boot'),
+    (r'u-boot legacy uImage', 'uboot'),
+    (r'pcapng capture file', 'pcapng'),
+    (r'pcap capture file', 'pcap'),
+    (r'Certificate, Version=3', 'x509_der'),
+    (r'ar archive', 'ar')
+]
+
+@instrument.phased('identify')
 def find_dissector(fpath, offset=0, failure_actions=[]):
     """ given a file path, return a dissector function """
 
-    # TECHNIQUE 1: match on output of `file`
-    #
-    sig2analyze = [
-        (r'GPG symmetrically encrypted data', gpg.analyze),
-        (r'ELF 32-bit (LSB|MSB)', elf32.analyze),
-        (r'ELF 64-bit (LSB|MSB)', elf64.analyze),
-        (r'PE32 executable .* 80386', pe32.analyze),
-        (r'PE32\+ executable .* x86-64', pe64.analyze),
-        (r'Dalvik dex file', dex.analyze),
-        (r'MS-DOS executable', exe.analyze),
-        (r'Mach-O ', macho.analyze),
-        (r'RIFF \(little-endian\) data, WAVE audio', wav.analyze),
-        (r'^COMBO_BOOT', combo_boot.analyze),
-        (r'u-boot legacy uImage', uboot.analyze),
-        (r'pcapng capture file', pcapng.analyze),
-        (r'pcap capture file', pcap.analyze),
-        (r'Certificate, Version=3', x509_der.analyze),
-        (r'ar archive', ar.analyze)
-    ]
-
-    (file_str, _) = shellout(['file', fpath])
     analyze = None
-    for (sig, dissector) in sig2analyze:
-        if re.search(sig, file_str):
-            #print('matched on %s' % sig)
-            analyze = dissector
-            break
 
-    # TECHNIQUE 2: sample some bytes from the file
+    # TECHNIQUE 1: signatures on a sample of the file, in process
     #
-    if not analyze:
-        with open(fpath, 'rb') as fp:
-            fp.seek(offset)
-            sample = fp.read(32)
-
-        if sample.startswith(b'COMBO_BOOT\x00\x00'):
-            analyze = combo_boot.analyze
-        elif sample.startswith(b'AVB0'):
-            analyze = avb.analyze
-        elif sample[4:8] == b'\x01\x00\x41\x54':
-            analyze = atags.analyze
-        elif sample.startswith(b'\xd0\x0d\xfe\xed'):
-            analyze = fdt.analyze
-        elif sample.startswith(b'<SALEAE>'):
-            analyze = saleae_bin.analyze
-        elif sample.startswith(b'SFDP'):
-            analyze = sfdp.analyze
-
-    # TECHNIQUE 3: guess based on file extension
+    if candidates := registry.identify_file(fpath, offset):
+        (confidence, name) = candidates[0]
+        analyze = lookup_analyze_function(name)
+
+    # TECHNIQUE 2: match on output of `file`
     #
-    if not analyze:
-        if fpath.endswith('.rel'):
-            if re.match(r'[XDQ][HL][234]\x0a', sample.decode('utf-8')):
-                analyze = rel.analyze
-        elif fpath.endswith('.ihx'):
-            analyze = ihx.analyze
-        elif fpath.endswith('.mkv'):
-            analyze = mkv.analyze
-        elif fpath.endswith('.pcapng'):
-            analyze = pcapng.analyze
-        elif fpath.endswith('.der') or fpath.endswith('.cer'):
-            if sample[0:2] == b'\x30\x82':
-                analyze = x509_der.analyze
+    if not analyze and shutil.which('file'):
+        (file_str, _) = shellout(['file', fpath])
+        for (sig, name) in sig2analyze:
+            if re.search(sig, file_str):
+                analyze = lookup_analyze_function(name)
+                break
 
     if not analyze:
         if 'print' in failure_actions:
@@ -223,73 +1042,255 @@ def find_dissector(fpath, offset=0, failure_actions=[]):
 
     return analyze
 
-# 'pe32' -> finter.pe32.analyze
+# 'pe32' -> finter.pe32.analyze, importing finter.pe32 on first use
 def lookup_analyze_function(dissector_name, failure_actions=[]):
-    if module := sys.modules.get('finter.' + dissector_name):
-        return module.analyze
+    if analyze := registry.get_analyze(dissector_name):
+        return analyze
 
     if 'print' in failure_actions:
         print(f'ERROR: unable to locate dissector module "{dissector_name}"', file=sys.stderr)
     if 'exit' in failure_actions:
         sys.exit(-1)
 
-def dissect_file(fpath, initial_offset=0, dissector_name=''):
-    """ identify file, call dissector """
-
-    # find analyze function
-    analyze = None
-
+# the analyze function named by dissector_name, or identified from the file
+def resolve_analyze(fpath, initial_offset=0, dissector_name=''):
     # if user says analyze with "pe32", try to get module 'finter.pe32' .analyze
     if dissector_name:
-        if (analyze := lookup_analyze_function(dissector_name, ['print'])) is None:
-            return
+        return lookup_analyze_function(dissector_name, ['print'])
 
     # else try to infer dissector from file
-    if not analyze:
-        analyze = find_dissector(fpath, initial_offset)
+    return find_dissector(fpath, initial_offset)
 
-    if not analyze:
+def dissect_file(fpath, initial_offset=0, dissector_name='', as_table=False, window=None, cache=True):
+    """ identify file, call dissector, return list of Interval (or an
+        IntervalTable if as_table)
+
+        window=(lo, hi) keeps only intervals overlapping [lo, hi), and lets
+        dissectors skip whatever can't overlap it
+
+        cache=False skips the interval cache (see cache_dir()) and the
+        daemon's (see daemon.py), which does the work if it's running """
+
+    if (body := client.dissect(fpath, initial_offset, dissector_name, window, cache)) is not None:
+        table = IntervalTable.load(io.BytesIO(body))
+        return table if as_table else list(table)
+
+    if not (analyze := resolve_analyze(fpath, initial_offset, dissector_name)):
         return
 
-    fsize = os.path.getsize(fpath)
+    key = None
+    if cache and cache_enabled():
+        key = cache_key(fpath, initial_offset, analyze.__module__)
 
-    # capture stdout to StringIO
-    buf = io.StringIO()
-    old_stdout = sys.stdout
-    sys.stdout = buf
+    table = cache_load(key) if key else None
+    if table is None:
+        table = dissect_table(fpath, initial_offset, analyze, window)
+        # windowed results are partial, only whole-file ones are worth keeping
+        if key and not window:
+            cache_store(key, table)
+    elif window:
+        table = table.overlapping(*window)
 
-    # call analyzer
-    lines = ''
-    with open(fpath, 'rb') as fp:
+    return table if as_table else list(table)
+
+def dissect_file_iter(fpath, initial_offset=0, dissector_name='', window=None, cache=True):
+    """ like dissect_file(), but yield each Interval as the dissector emits it
+
+        dissectors with an analyze_iter() generator run one record at a time
+        between the intervals being consumed, so memory stays bounded by the
+        largest record; the rest run to completion first
+
+        cached intervals are used if present, but nothing is stored """
+
+    if not (analyze := resolve_analyze(fpath, initial_offset, dissector_name)):
+        return
+
+    yield from dissection(fpath, initial_offset, analyze, window, cache)
+
+def dissect_file_stream(fpath, initial_offset=0, dissector_name='', window=None, cache=True, reorder=1024, NodeClass=FinterNode):
+    """ yield the root of the file's tree, without children, then its top
+        level subtrees (and fragments between them) in order, each complete
+
+        intervals from an analyze_iter() dissector are nested by a TreeBuilder
+        as they arrive; other dissections (and cached ones) are whole from the
+        start, in the order they were emitted rather than file order, and are
+        nested by intervals_to_tree(), giving the tree dissect_file() would """
+
+    if not (analyze := resolve_analyze(fpath, initial_offset, dissector_name)):
+        return
+
+    intervals = dissection(fpath, initial_offset, analyze, window, cache)
+
+    if isinstance(intervals, IntervalTable):
+        if not len(intervals):
+            return
+        root = intervals_to_tree(intervals, NodeClass)
+        yield NodeClass(root.begin, root.end, root.type_, root.comment)
+        for child in root.children:
+            if not window or (child.begin < window[1] and child.end > window[0]):
+                yield child
+        return
+
+    builder = TreeBuilder(0, os.path.getsize(fpath), window=reorder, NodeClass=NodeClass)
+
+    def finished():
+        for interval in intervals:
+            yield from builder.add(interval.begin, interval.end, interval.type_, interval.comment)
+        yield from builder.finish()
+
+    try:
+        for (i, node) in enumerate(finished()):
+            # named by now, see TreeBuilder.add()
+            if i == 0:
+                yield builder.root
+            yield node
+    finally:
+        # stops the dissector too, when the consumer stopped early
+        intervals.close()
+
+    if builder.late:
+        print(f'WARNING: {builder.late} intervals arrived too late to nest, try a larger --reorder', file=sys.stderr)
+
+# an IntervalTable if the whole dissection is at hand (it was cached, or the
+# dissector has no analyze_iter()), else a generator of Intervals as they're emitted
+def dissection(fpath, initial_offset, analyze, window, cache):
+    if cache and cache_enabled():
+        if (table := cache_load(cache_key(fpath, initial_offset, analyze.__module__))) is not None:
+            return table.overlapping(*window) if window else table
+
+    if not (analyze_iter := getattr(sys.modules[analyze.__module__], 'analyze_iter', None)):
+        return dissect_table(fpath, initial_offset, analyze, window)
+
+    return dissect_steps(fpath, initial_offset, analyze_iter, window)
+
+# run <analyze_iter> a step at a time, yielding the Intervals of each step
+def dissect_steps(fpath, initial_offset, analyze_iter, window):
+    collector = ListSink()
+    fsize = os.path.getsize(fpath)
+    (count, whole_file) = (0, False)
+
+    with reader(open(fpath, 'rb')) as fp:
         fp.seek(initial_offset)
-        analyze(fp)
-        lines = buf.getvalue()
+        steps = analyze_iter(fp)
+
+        # the dissector's context is only in place while it runs, so the
+        # consumer (maybe dissecting something else) has its own between steps
+        ctx = Context(WindowSink(collector, *window) if window else collector, window)
+        finished = False
+        while not finished:
+            old = use_context(ctx)
+            try:
+                with instrument.phase('dissect'):
+                    finished = next(steps, StopIteration) is StopIteration
+            finally:
+                use_context(old)
+
+            (records, collector.records) = (collector.records, [])
+            for (begin, end, type_, comment) in records:
+                # null intervals are dropped, like TableSink does
+                if end <= begin:
+                    continue
+                count += 1
+                whole_file = whole_file or end - begin == fsize
+                yield Interval(begin, end, type_, comment)
+
+    # add interval for whole file if there isn't one already
+    if count and not whole_file:
+        yield Interval(0, fsize, 'raw', 'file')
 
-    # uncapture stdout
-    buf.close()
-    sys.stdout = old_stdout
+# call analyze on the file, collecting its intervals in an IntervalTable
+@instrument.phased('dissect')
+def dissect_table(fpath, initial_offset, analyze, window=None):
+    collector = TableSink()
+    # a fresh context, so nothing (eg: byte order) leaks in from an earlier
+    # file or out to other dissections in this thread
+    old = use_context(Context(WindowSink(collector, *window) if window else collector, window))
 
-    # lines to intervals
-    if not lines:
-        return []
-    lines = lines.split('\n')
-    intervals = intervals_from_text(lines)
+    # call analyzer
+    try:
+        with reader(open(fpath, 'rb')) as fp:
+            fp.seek(initial_offset)
+            analyze(fp)
+    finally:
+        use_context(old)
 
-    # filter out null intervals
-    intervals = [i for i in intervals if i.end > i.begin]
+    # null intervals were already dropped by the sink
+    table = collector.table()
+    if not len(table):
+        return table
 
     # add interval for whole file if there isn't one already
     fsize = os.path.getsize(fpath)
-    if not [i for i in intervals if i.end-i.begin == fsize]:
-        intervals.append(Interval(0, fsize, 'raw', 'file'))
+    if not np.any(table.lengths() == fsize):
+        table = table.append(0, fsize, 'raw', 'file')
 
-    return intervals
+    return table
+
+# types that are the struct format of one number, eg: '<I', '>h', 'd'
+STRUCT_TYPE = re.compile(r'[<>=!@]?[bBhHiIlLqQefd?]')
 
 def finter_type_to_struct_fmt(type_):
     # currently they're 1:1
-    assert type_ in {'B', '<B', '>B', 'H', '<H', '>H', 'W', '<W', '>W', 'I', '<I', '>I', 'Q', '<Q', '>Q'}
+    assert STRUCT_TYPE.fullmatch(type_), f'{type_} is not a number type'
     return type_
 
+# --profile reports where the time went (to stderr, at exit), --profile-json <path>
+# also dumps it, see finter/instrument.py
+def profile_from_argv():
+    json_path = pop_option('profile-json')
+    if not (pop_flag('profile') or json_path):
+        return False
+
+    instrument.enable()
+
+    # the dissection has to happen in this process to be measured
+    client.enabled = False
+
+    def finish():
+        instrument.report()
+        if json_path:
+            instrument.dump(json_path)
+    atexit.register(finish)
+    return True
+
+# remove "--<name> <value>" from sys.argv, returning the converted value or default
+def pop_option(name, convert=str, default=None):
+    flag = '--' + name
+    if not flag in sys.argv:
+        return default
+
+    i = sys.argv.index(flag)
+    if i+1 >= len(sys.argv):
+        print(f'ERROR: {flag} needs a value')
+        sys.exit(-1)
+
+    value = sys.argv[i+1]
+    del sys.argv[i:i+2]
+    try:
+        return convert(value)
+    except ValueError as e:
+        print(f'ERROR: {flag} {value}: {e}')
+        sys.exit(-1)
+
+# remove "--<name>" from sys.argv, returning whether it was there
+def pop_flag(name):
+    flag = '--' + name
+    if not flag in sys.argv:
+        return False
+    sys.argv.remove(flag)
+    return True
+
+# "lo:hi" in hex, like the offset argument, to a (lo, hi) tuple
+# eg: "1000:2000" or "0x1000:0x2000"
+def parse_range(string):
+    if string.count(':') != 1:
+        raise ValueError('expected lo:hi')
+    (lo, hi) = string.split(':')
+    (lo, hi) = (int(lo, 16), int(hi, 16))
+    if not lo < hi:
+        raise ValueError('empty range')
+    return (lo, hi)
+
 def handle_argv_common_utility():
     def is_hex_int(string):
         try:
@@ -1,11 +1,28 @@
 #!/usr/bin/env python
 #
 # display given file as offset, hex, ascii (OHA)
+#
+# usage: oha.py [--range lo:hi] [--depth N] [--max-lines N] [--stream [--reorder N]] [--no-cache] [dissector] <file> [offset]
+#
+#   --range lo:hi   only the intervals overlapping [lo, hi), and only their bytes within it
+#   --depth N       nodes N deep (0 is the top) show all their bytes instead of their children
+#   --max-lines N   stop after N lines of output
+#   --stream        show subtrees as the dissector finishes them, rather than after
+#                   dissecting the whole file, see tree.py --stream
+#   --reorder N     intervals --stream waits for before a subtree is finished, default 1024
+
+import client
+if __name__ == '__main__':
+    # a running daemon.py does the whole run, without this process importing the rest
+    client.run_remotely()
 
 import os
 import re
 import sys
-from helpers import dissect_file, intervals_from_text, intervals_to_tree, FinterNode, handle_argv_common_utility
+import bisect
+import itertools
+from helpers import dissect_file, dissect_file_stream, intervals_from_text, intervals_to_tree, FinterNode, map_file, walk, handle_argv_common_utility, pop_option, pop_flag, parse_range, profile_from_argv
+from finter import instrument
 
 RED = '\x1B[31m'
 GREEN = '\x1B[32m'
@@ -22,98 +39,198 @@ class OHANode(FinterNode):
     def __init__(self, begin, end, type_, comment):
         super().__init__(begin, end, type_, comment)
         self.fp = None
+        # reach[i] is the furthest end among children[0..i], see overlapping()
+        self.reach = None
 
+    # <fp> is anything sliceable by file offset, eg: the file mmap'd
     def set_fp(self, fp):
-        self.fp = fp
-        for child in self.children:
-            child.set_fp(fp)
-
-    def pretty_print(self, depth=0):
-        comment = '  '*depth + self.comment
-
-        if self.children:
-            oha_comment(self.begin, comment)
-            for child in sorted(self.children, key=lambda c: c.begin):
-                child.pretty_print(depth+1)
-        else:
-            self.fp.seek(self.begin)
-            data = self.fp.read(self.end - self.begin)
-            oha(data, self.begin, comment)
+        for (node, _) in walk(self):
+            node.fp = fp
+
+    # children sharing a byte with [lo, hi), found by bisection instead of
+    # visiting all of them; children are sorted by begin (see finalize_tree())
+    # but may overlap, so search the running max of ends
+    def overlapping(self, lo, hi):
+        if self.reach is None:
+            self.reach = list(itertools.accumulate((c.end for c in self.children), max))
+        i = bisect.bisect_right(self.reach, lo)
+        j = bisect.bisect_left(self.children, hi, lo=i, key=lambda c: c.begin)
+        return self.children[i:j]
+
+    # window=(lo, hi) skips nodes outside [lo, hi) and clips the bytes of those straddling it
+    # max_depth=N shows the bytes of nodes N deep instead of their children
+    def pretty_print(self, depth=0, window=None, out=None, max_depth=None):
+        # iterators over the nodes being shown on each level on the way down
+        stack = [iter([self])]
+        while stack:
+            for node in stack[-1]:
+                if window and not (node.begin < window[1] and node.end > window[0]):
+                    continue
+
+                level = depth + len(stack) - 1
+                comment = '  '*level + node.comment
+
+                if node.children and (max_depth is None or level < max_depth):
+                    oha_comment(node.begin, comment, out)
+                    stack.append(iter(node.overlapping(*window) if window else node.children))
+                    break
+
+                (begin, end) = (node.begin, node.end)
+                if window:
+                    (begin, end) = (max(begin, window[0]), min(end, window[1]))
+                oha(node.fp[begin:end], begin, comment, out)
+            else:
+                stack.pop()
 
     def __str__(self):
         return f'[0x{self.begin:X} 0x{self.end:X}) {self.comment}'
 
-def oha_comment(addr, comment):
-    print(75*' '+CYAN+comment+NORMAL)
-
-def oha(data, addr, comment=None):
+def oha_comment(addr, comment, out=None):
+    (out or sys.stdout).write(75*' '+CYAN+comment+NORMAL+'\n')
+
+# raised by LimitedOutput once it has written its lines
+class OutputDone(Exception):
+    pass
+
+# file-like passing the first <max_lines> lines on to <out>, then raising OutputDone
+class LimitedOutput():
+    def __init__(self, out, max_lines):
+        self.out = out
+        self.remaining = max_lines
+
+    def write(self, text):
+        lines = text.count('\n')
+        if lines < self.remaining:
+            self.remaining -= lines
+            self.out.write(text)
+            return
+
+        end = -1
+        for i in range(self.remaining):
+            end = text.index('\n', end+1)
+        self.out.write(text[0:end+1])
+        self.remaining = 0
+        raise OutputDone()
+
+    def flush(self):
+        self.out.flush()
+
+# printable ascii as itself, everything else as '.'
+ASCII = bytes(x if (x > 31 and x < 127) else ord('.') for x in range(256))
+
+COMMENT_MARGIN = re.compile(r'^(\s*)(.*)')
+
+# lines rendered per write, so a huge interval isn't held as text all at once
+BLOCK_LINES = 4096
+
+# hex and ascii lines for <chunk> starting at 16 byte aligned <va>, with
+# <pad_lo> and <pad_hi> blank bytes before and after it
+def oha_lines(chunk, va, pad_lo, pad_hi):
+    hex_str = '   '*pad_lo + chunk.hex(' ').upper() + ' ' + '   '*pad_hi
+    ascii_str = ' '*pad_lo + chunk.translate(ASCII).decode('ascii') + ' '*pad_hi
+    if len(ascii_str) == 16:
+        return [f'{YELLOW}{va:08X}{NORMAL} {hex_str} {PURPLE}{ascii_str}{NORMAL}']
+    return [f'{YELLOW}{va+i:08X}{NORMAL} {hex_str[i*3:i*3+48]} {PURPLE}{ascii_str[i:i+16]}{NORMAL}'
+        for i in range(0, len(ascii_str), 16)]
+
+def oha(data, addr, comment=None, out=None):
     """ offset, hex, ascii (OHA) of data """
 
-    result = []
-    va_last_printed = None
-    va_lo = addr
-    va_hi = addr + len(data)
-
-    va = va_lo & 0xFFFFFFF0
-    while va < va_hi:
-        hex_str = ''
-        ascii_str = ''
-
-        if va == va_last_printed:
-            addr_str = '        '
-        else:
-            addr_str = '%08X' % va
-            va_last_printed = va
-
-        for i in range(16):
-            if va+i >= va_lo and va+i < va_hi:
-                x = data[va+i - va_lo]
-                hex_str += '%02X ' % x
-                ascii_str += chr(x) if (x > 31 and x < 127) else '.'
-            else:
-                hex_str += '   '
-                ascii_str += ' '
-
-        if comment:
-            (cmargin, comment) = re.match(r'^(\s*)(.*)', comment).group(1, 2)
-            comment = comment.split('\\n')
-            print('%s%s%s %s %s%s%s %s%s%s%s' % \
-                (YELLOW, addr_str, NORMAL, hex_str, PURPLE, ascii_str, NORMAL, CYAN, cmargin, comment[0], NORMAL))
-            for c in comment[1:]:
-                print('%s%s%s' % (CYAN, 75*' '+cmargin + c, NORMAL))
-            comment = ''
-        else:
-            print('%s%s%s %s %s%s%s' % (YELLOW, addr_str, NORMAL, hex_str, PURPLE, ascii_str, NORMAL))
-
-        va += 16
-
-    return '\n'.join(result)
+    out = out or sys.stdout
+    if not data:
+        return ''
+
+    # pad out to whole 16 byte lines
+    va_lo = addr & ~0xF
+    lead = addr - va_lo
+    trail = -(addr + len(data)) & 0xF
+
+    # the first block carries the comment
+    first = min(len(data), 16*BLOCK_LINES - lead)
+    lines = oha_lines(data[0:first], va_lo, lead, trail if first == len(data) else 0)
+
+    if comment:
+        (cmargin, comment) = COMMENT_MARGIN.match(comment).group(1, 2)
+        comment = comment.split('\\n')
+        lines[0] += f' {CYAN}{cmargin}{comment[0]}{NORMAL}'
+        lines[1:1] = [f'{CYAN}{75*" "}{cmargin}{c}{NORMAL}' for c in comment[1:]]
+
+    out.write('\n'.join(lines) + '\n')
+
+    for lo in range(first, len(data), 16*BLOCK_LINES):
+        hi = min(lo + 16*BLOCK_LINES, len(data))
+        lines = oha_lines(data[lo:hi], addr + lo, 0, trail if hi == len(data) else 0)
+        out.write('\n'.join(lines) + '\n')
+
+    return ''
+
+# show subtrees as the dissector finishes them, flushing each so a pager
+# has something to show right away
+def print_streaming(fpath, offset, dissector, window, cache, reorder, out, fp, max_depth):
+    # rendering is interleaved with dissection here, only the dissector steps are timed apart
+    nodes = dissect_file_stream(fpath, offset, dissector, window=window, cache=cache, reorder=reorder, NodeClass=OHANode)
+    try:
+        # the root, like the whole tree's, isn't shown
+        next(nodes, None)
+        for node in nodes:
+            node.set_fp(fp)
+            node.pretty_print(0, window, out, max_depth)
+            out.flush()
+    finally:
+        # stops the dissector too, when the output ended early
+        nodes.close()
 
 if __name__ == '__main__':
+    window = pop_option('range', parse_range)
+    max_depth = pop_option('depth', int)
+    max_lines = pop_option('max-lines', int)
+    # profiling wants to see the dissection, not a cache hit
+    cache = not pop_flag('no-cache') and not profile_from_argv()
+    stream = pop_flag('stream')
+    reorder = pop_option('reorder', int, 1024)
     dissector, fpath, offset = handle_argv_common_utility()
 
     if not fpath or not os.path.isfile(fpath):
         print(f'ERROR: unable to locate file {fpath}')
         sys.exit(-1)
 
-    #print(f'dissector: {dissector}')
-    intervals = dissect_file(fpath, offset, dissector)
-    if not intervals:
-        print(f'ERROR: dissector produced no data')
-        sys.exit(-1)
-
-    root = intervals_to_tree(intervals, OHANode)
-
-    sorted_children = sorted(root.children, key=lambda x: x.begin)
-
-    # debug?
-    if 0:
-        graph(root)
-        sys.exit(-1)
+    # one large buffer for all of the output rather than a write per line
+    out = open(sys.stdout.fileno(), 'w', buffering=1<<20, encoding=sys.stdout.encoding,
+        errors=sys.stdout.errors, closefd=False)
+    if max_lines is not None:
+        out = LimitedOutput(out, max_lines)
 
     with open(fpath, 'rb') as fp:
-        root.set_fp(fp)
-
-        for child in sorted_children:
-            child.pretty_print()
-
+        data = map_file(fp)
+
+        try:
+            if stream:
+                print_streaming(fpath, offset, dissector, window, cache, reorder, out, data, max_depth)
+                out.flush()
+                sys.exit(0)
+
+            #print(f'dissector: {dissector}')
+            intervals = dissect_file(fpath, offset, dissector, as_table=True, window=window, cache=cache)
+            if not intervals:
+                print(f'ERROR: dissector produced no data')
+                sys.exit(-1)
+
+            root = intervals_to_tree(intervals, OHANode)
+
+            # debug?
+            if 0:
+                graph(root)
+                sys.exit(-1)
+
+            with instrument.phase('render'):
+                sys.stdout.flush()
+                root.set_fp(data)
+
+                for child in (root.overlapping(*window) if window else root.children):
+                    child.pretty_print(0, window, out, max_depth)
+                out.flush()
+        except OutputDone:
+            out.flush()
+        except BrokenPipeError:
+            # the pager (or head) quit, what's left to write goes nowhere
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
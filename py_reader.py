@@ -7,62 +7,60 @@ import sys
 import struct
 import binascii
 
-from helpers import dissect_file, intervals_from_text, intervals_to_tree, FinterNode, finter_type_to_struct_fmt, handle_argv_common_utility
+from helpers import dissect_file, intervals_from_text, intervals_to_tree, FinterNode, finter_type_to_struct_fmt, extract_values, map_file, unique_names, handle_argv_common_utility
 
 class MyNode(FinterNode):
     def __init__(self, begin, end, type_, comment):
         super().__init__(begin, end, type_, comment)
         self.name = re.split('[^0-9a-zA-Z_]', self.comment)[0]
 
-        # needed
-        self.fp = None
-
-    def set_fp(self, fp):
-        self.fp = fp
-        for child in self.children:
-            child.set_fp(fp)
-
-    def go(self, comma=False, depth=0):
-        indent = '    '*depth
-
-        # if we have child children, do not emit our "value" (the bytes we tag)
-        # instead, return a dict with named children
-        if self.children:
-            # get the requested names of each child
-            names = [ch.name for ch in self.children]
-
-            # resolve conflicts by appending a numeric distinguisher
-            suffix = {}
-            for ch in self.children:
-                name = ch.name
-                if names.count(name) > 1:
-                    if name in suffix:
-                        ch.name = f'{ch.name}{suffix[ch.name]}'
-                        suffix[name] += 1
-                    else:
-                        ch.name = f'{ch.name}0'
-                        suffix[name] = 1
-
-            # print recursively
-            print(f'{indent}\'{self.name}\': ' + '{')
-            for i,ch in enumerate(self.children):
-                last = (i == len(self.children)-1)
-                ch.go(not last, depth+1)
-            print(f'{indent}' + '}' + (',' if comma else ''))
-
-        # we have no children: emit code to read ourselves from file pointer
+        # set by extract_values()
+        self.value = None
+
+    def go(self, name, comma=False, depth=0):
+        # dicts being printed: [their remaining (name, child, comma) entries, their depth, comma after them]
+        stack = []
+
+        entry = (name, self, comma)
+        while entry:
+            (name, node, comma) = entry
+            indent = '    '*depth
+
+            # if we have child children, do not emit our "value" (the bytes we tag)
+            # instead, return a dict with named children
+            if node.children:
+                print(f'{indent}\'{name}\': ' + '{')
+                names = unique_names(node.children)
+                last = len(node.children) - 1
+                stack.append([iter([(names[i], ch, i != last) for (i, ch) in enumerate(node.children)]), depth, comma])
+            else:
+                node.print_leaf(name, comma, indent)
+
+            # on to the next entry, closing the dicts that have none left
+            entry = None
+            while stack and not entry:
+                (entries, parent_depth, parent_comma) = stack[-1]
+                if entry := next(entries, None):
+                    depth = parent_depth + 1
+                else:
+                    print('    '*parent_depth + '}' + (',' if parent_comma else ''))
+                    stack.pop()
+
+    # we have no children: emit code to read ourselves from file pointer
+    def print_leaf(self, name, comma, indent):
+        extra = ',' if comma else ''
+
+        # how extract_values() could decode it says how to read it
+        if self.type_ == 'none':
+            print(f'{indent}\'{name}\': None{extra}')
+            return
+        elif type(self.value) is memoryview:
+            fmt = 'raw'
+        elif self.type_ in ('string', 'uleb128'):
+            fmt = self.type_
         else:
-            self.fp.seek(self.begin)
-            data = self.fp.read(self.end - self.begin)
-            extra = ',' if comma else ''
-
-            match self.type_:
-                case 'none': print(f'{indent}\'{self.name}\' = null' + extra)
-                case 'raw':
-                    print(f'{indent}\'{self.name}\': slurp(0x{self.begin:X}, 0x{self.end:X}, \'raw\'){extra}')
-                case _:
-                    fmt = finter_type_to_struct_fmt(self.type_)
-                    print(f'{indent}\'{self.name}\': slurp(0x{self.begin:X}, 0x{self.end:X}, \'{fmt}\'){extra}')
+            fmt = finter_type_to_struct_fmt(self.type_)
+        print(f'{indent}\'{name}\': slurp(0x{self.begin:X}, 0x{self.end:X}, \'{fmt}\'){extra}')
 
 if __name__ == '__main__':
     dissector, fpath, offset = handle_argv_common_utility()
@@ -86,14 +84,16 @@ def read(fp):
         match fmt:
             case 'raw': return data
             case 'none': return None
+            case 'string': return data.rstrip(b'\\x00').decode('utf-8', 'replace')
+            case 'uleb128': return sum((b & 0x7F) << (7*i) for (i, b) in enumerate(data))
             case _: return struct.unpack(fmt, data)[0]
 ''')
 
     with open(fpath, 'rb') as fp:
-        root.set_fp(fp)
+        extract_values(root, map_file(fp))
 
         print('    return {')
-        for i,ch in enumerate(root.children):
+        for (i, (name, ch)) in enumerate(zip(unique_names(root.children), root.children)):
             last = i == len(root.children)-1
-            ch.go(not last, 2)
+            ch.go(name, not last, 2)
         print('    }')
@@ -1,11 +1,27 @@
 #!/usr/bin/env python
 
+import client
+if __name__ == '__main__':
+    # a running daemon.py does the whole run, without this process importing the rest
+    client.run_remotely()
+
+import os
 import sys
 import helpers
+from finter.helpers import TextSink, setSink, reader
 
 if __name__ == '__main__':
+    binary = helpers.pop_flag('binary')
+    helpers.profile_from_argv()
     dissector_name, fpath, offset = helpers.handle_argv_common_utility()
 
+    # run by daemon.py (see run_remotely() above), whose cache may have exactly
+    # what the code below would print; otherwise there's no daemon to ask
+    if fpath and client.inside_daemon and \
+      (body := client.dissect(fpath, offset, dissector_name, format_='binary' if binary else 'text')) is not None:
+        sys.stdout.buffer.write(body)
+        sys.exit(0)
+
     # if user says analyze with "pe32", try to get module 'finter.pe32' .analyze
     if dissector_name:
         analyze = helpers.lookup_analyze_function(dissector_name, ['print', 'exit'])
@@ -15,7 +31,18 @@ if __name__ == '__main__':
     if not analyze:
         raise Exception('no dissector found')
 
-    with open(fpath, 'rb') as fp:
-        fp.seek(offset)
-        analyze(fp)
+    # relay intervals to stdout in the text protocol, or the binary stream (see helpers.BinarySink)
+    if binary:
+        sink = helpers.BinarySink(sys.stdout.buffer, os.path.getsize(fpath), analyze.__module__.removeprefix('finter.'))
+    else:
+        sink = TextSink()
+    setSink(sink)
+
+    try:
+        with reader(open(fpath, 'rb')) as fp, helpers.instrument.phase('dissect'):
+            fp.seek(offset)
+            analyze(fp)
+    finally:
+        if binary:
+            sink.close()
 
@@ -2,7 +2,7 @@
 
 import os
 import sys
-from helpers import dissect_file, intervals_to_tree, Interval
+from helpers import dissect_file, intervals_to_tree, Interval, walk
 
 index2descr = {}
 
@@ -19,17 +19,12 @@ class sankeyNode():
         return self.end - self.begin
 
     def assign_index(self, curr=0):
-        self.index = curr
-        descr = f'[{self.begin}, {self.end}) {self.comment}'
-        print('%s took index %d' % (descr, self.index))
-        index2descr[self.index] = self.comment
-
-        curr += 1
-        if not self.children:
-            return curr
-
-        for c in self.children:
-            curr = c.assign_index(curr)
+        for (node, _) in walk(self):
+            node.index = curr
+            descr = f'[{node.begin}, {node.end}) {node.comment}'
+            print('%s took index %d' % (descr, node.index))
+            index2descr[node.index] = node.comment
+            curr += 1
         return curr
 
     def sdata(self):
@@ -37,20 +32,13 @@ class sankeyNode():
         target = []
         value = []
 
-        if self.children:
-            # add our sdata
-            for c in sorted(self.children, key=lambda x: x.begin):
-                source.append(self.index)
+        # each node's links to its children, depth first
+        for (node, _) in walk(self):
+            for c in node.children:
+                source.append(node.index)
                 target.append(c.index)
                 value.append(len(c))
 
-            # collect their sdata (depth first)
-            for c in sorted(self.children, key=lambda x: x.begin):
-                [a,b,c] = c.sdata()
-                source += a
-                target += b
-                value += c
-
         # done!
         return [source, target, value]
 
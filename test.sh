@@ -34,6 +34,14 @@ FPATH=$HOME/repos/lwerdna/filesamples
 ./oha.py $FPATH/pkcs7_cms.der
 ./oha.py $FPATH/rsa_private_key.der
 
+# --stream shows the same tree
+for f in ls-x86_64 hello-windows-x64.pe64.exe simple_http.pcap; do
+    diff <(./tree.py --no-cache $FPATH/$f) <(./tree.py --no-cache --stream $FPATH/$f)
+    diff <(./tree.py $FPATH/$f) <(./tree.py --stream $FPATH/$f)
+    diff <(./oha.py $FPATH/$f) <(./oha.py --stream $FPATH/$f)
+    diff <(./oha.py --range 0x40:0x1200 $FPATH/$f) <(./oha.py --stream --range 0x40:0x1200 $FPATH/$f)
+done
+
 #FPATH=$HOME/fdumps/filesamples
 #
 ##./raw.py $FPATH/lena.gif
@@ -1,22 +1,46 @@
 #!/usr/bin/env python
 
+import client
+if __name__ == '__main__':
+    # a running daemon.py does the whole run, without this process importing the rest
+    client.run_remotely()
+
 import sys
-from helpers import dissect_file, intervals_to_tree, handle_argv_common_utility
+from helpers import dissect_file, dissect_file_stream, intervals_to_tree, walk, handle_argv_common_utility, pop_option, pop_flag, parse_range, profile_from_argv
+from finter import instrument
+
+def print_recur(hnode, depth=0, window=None):
+    outside = (lambda n: not (n.begin < window[1] and n.end > window[0])) if window else None
 
-def print_recur(hnode, depth=0):
-    indent = depth*'  '
+    for (node, depth) in walk(hnode, depth, outside):
+        indent = depth*'  '
 
-    length = hnode.end - hnode.begin
-    lengthStr = '%d'%length if length < 16 else '0x%X'%length
-    print('[%08X, %08X) %s(len=%s type=%s) %s' % (hnode.begin, hnode.end, indent, lengthStr, hnode.type_, hnode.comment))
+        length = node.end - node.begin
+        lengthStr = '%d'%length if length < 16 else '0x%X'%length
+        print('[%08X, %08X) %s(len=%s type=%s) %s' % (node.begin, node.end, indent, lengthStr, node.type_, node.comment))
 
-    for child in sorted(hnode.children, key=lambda x: x.begin):
-        print_recur(child, depth+1)
+# print subtrees as the dissector finishes them, memory follows depth instead of file size
+def print_streaming(fpath, offset, dissector, window, cache, reorder):
+    # rendering is interleaved with dissection here, only the dissector steps are timed apart
+    nodes = dissect_file_stream(fpath, offset, dissector, window=window, cache=cache, reorder=reorder)
+    for (i, node) in enumerate(nodes):
+        print_recur(node, min(i, 1), window)
 
 if __name__ == '__main__':
+    window = pop_option('range', parse_range)
+    # profiling wants to see the dissection, not a cache hit
+    cache = not pop_flag('no-cache') and not profile_from_argv()
+    stream = pop_flag('stream')
+    reorder = pop_option('reorder', int, 1024)
     dissector, fpath, offset = handle_argv_common_utility()
     if not fpath:
         sys.exit(-1)
-    intervals = dissect_file(fpath, offset, dissector)
+
+    if stream:
+        print_streaming(fpath, offset, dissector, window, cache, reorder)
+        sys.exit(0)
+
+    intervals = dissect_file(fpath, offset, dissector, as_table=True, window=window, cache=cache)
     root = intervals_to_tree(intervals)
-    print_recur(root)
+    with instrument.phase('render'):
+        print_recur(root, 0, window)